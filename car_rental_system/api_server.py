@@ -0,0 +1,325 @@
+"""HTTP/JSON-сервис базы автопроката для нескольких терминалов.
+
+Запуск из каталога car_rental_system:
+    python api_server.py --port 8080 [--db путь]
+
+GET /cars, /clients, /rentals                  страницы списков (?after=<next>&limit=)
+GET /clients/search?q=                         поиск клиентов
+GET /cars/available?start=&end=[&category_id=] свободные автомобили со стоимостью
+GET /quote?car_id=&start=&end=[&services=1,2]  расчет стоимости аренды
+GET /reports/income?from=&to=, /reports/popular-cars?from=&to=[&limit=],
+    /reports/active-rentals[?limit=], /reports/maintenance,
+    /reports/debtors[?min=&limit=], /reports/utilization?from=&to=[&limit=]
+
+Списки и поиск отдаются с ETag - последним seq журнала изменений. Запрос
+с If-None-Match того же seq получает 304 без чтения таблиц, а тела
+ответов кэшируются в памяти процесса до следующего изменения данных.
+Соединения только для чтения берутся из пула (WAL: читатели не ждут писателей).
+"""
+import argparse
+import base64
+import json
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from database import queries
+from database.availability import find_available_cars
+from database.balances import DEBTORS_LIMIT, clients_with_debt
+from database.changelog import current_seq
+from database.client_search import SEARCH_LIMIT, search_clients
+from database.connection import get_read_connection
+from database.pagination import PAGE_SIZE, fetch_page
+from database.pool import PoolTimeoutError
+from database.pricing import RentalPricingEngine
+from database.utilization import UtilizationEngine
+
+MAX_LIMIT = 1000
+CACHE_SIZE = 512  # Ответов списков в памяти
+POPULAR_CARS_LIMIT = 20
+ACTIVE_RENTALS_LIMIT = 500
+UTILIZATION_CARS_LIMIT = 20
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _rows(rows):
+    return [dict(zip(row.keys(), row)) for row in rows]
+
+
+def _encode_after(after):
+    if after is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(after).encode()).decode()
+
+
+def _decode_after(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Неверный параметр after") from None
+
+
+class Params:
+    """Параметры строки запроса с проверкой типов"""
+
+    def __init__(self, query):
+        self._values = {name: values[-1] for name, values in parse_qs(query).items()}
+
+    def get(self, name, default=None, convert=str):
+        value = self._values.get(name)
+        if value is None or value == '':
+            if default is None:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Нужен параметр {name}")
+            return default
+        try:
+            return convert(value)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Неверный параметр {name}: {value}") from None
+
+    def optional(self, name, convert=str):
+        value = self._values.get(name)
+        return self.get(name, convert=convert) if value else None
+
+    def limit(self, default):
+        return min(max(self.get('limit', default, int), 1), MAX_LIMIT)
+
+    def date(self, name, default=None):
+        return self.get(name, default, lambda value: date.fromisoformat(value).isoformat())
+
+    def canonical(self):
+        """Строка запроса с отсортированными параметрами - ключ кэша"""
+        return urlencode(sorted(self._values.items()))
+
+
+class ResponseCache:
+    """Тела ответов по ключу запроса, действительные для одного seq журнала"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # ключ -> (seq, тело)
+
+    def get(self, key, seq):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != seq:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, seq, body):
+        with self._lock:
+            self._items[key] = (seq, body)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class CarRentalApi:
+    """Обработчики запросов; один экземпляр на процесс, общий для всех потоков"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.pricing = RentalPricingEngine()
+        self.cache = ResponseCache()
+        self.utilization = None  # UtilizationEngine при первом запросе (нужен NumPy)
+        self._utilization_lock = threading.Lock()
+        # путь -> (обработчик(conn, params), ответ зависит только от таблиц журнала изменений)
+        self.routes = {
+            '/cars': (self.page('cars'), True),
+            '/clients': (self.page('clients'), True),
+            '/rentals': (self.page('rentals'), True),
+            '/clients/search': (self.search_clients, True),
+            '/cars/available': (self.available_cars, False),
+            '/quote': (self.quote, False),
+            '/reports/income': (self.income_report, False),
+            '/reports/popular-cars': (self.popular_cars_report, False),
+            '/reports/active-rentals': (self.active_rentals_report, False),
+            '/reports/maintenance': (self.maintenance_report, False),
+            '/reports/debtors': (self.debtors_report, False),
+            '/reports/utilization': (self.utilization_report, False),
+        }
+
+    def handle(self, path, query, if_none_match=None):
+        """Возвращает (статус, заголовки, тело в байтах)"""
+        route = self.routes.get(path.rstrip('/') or '/')
+        if route is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Нет ресурса {path}")
+        handler, cacheable = route
+        params = Params(query)
+        conn = get_read_connection(self.db_path)
+        try:
+            if not cacheable:
+                return HTTPStatus.OK, {}, self._encode(handler(conn, params))
+            # Один снимок WAL: ETag точно соответствует содержимому ответа
+            conn.execute('BEGIN')
+            etag = f'"{current_seq(conn)}"'
+            if if_none_match == etag:
+                return HTTPStatus.NOT_MODIFIED, {'ETag': etag}, b''
+            key = f'{path}?{params.canonical()}'
+            body = self.cache.get(key, etag)
+            if body is None:
+                body = self._encode(handler(conn, params))
+                self.cache.put(key, etag, body)
+            return HTTPStatus.OK, {'ETag': etag, 'Cache-Control': 'no-cache'}, body
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _encode(data):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    # ========== Списки ==========
+    def page(self, name):
+        def handler(conn, params):
+            after = params.optional('after', _decode_after)
+            try:
+                page = fetch_page(conn, name, after, params.limit(PAGE_SIZE))
+            except (sqlite3.ProgrammingError, TypeError):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Неверный параметр after") from None
+            return {'items': _rows(page.rows), 'next': _encode_after(page.after)}
+        return handler
+
+    def search_clients(self, conn, params):
+        return {'items': _rows(search_clients(conn, params.get('q'), params.limit(SEARCH_LIMIT)))}
+
+    # ========== Аренда ==========
+    def available_cars(self, conn, params):
+        start, end = params.date('start'), params.date('end')
+        cars = find_available_cars(conn, start, end, params.optional('category_id', int))
+        quotes = self.pricing.quote_many(conn, [(car[0], start, end, ()) for car in cars])
+        return {'items': [{**row, 'total_cost': quote.total_cost}
+                          for row, quote in zip(_rows(cars), quotes)]}
+
+    def quote(self, conn, params):
+        services = params.optional('services', lambda value: [int(s) for s in value.split(',') if s]) or []
+        quote = self.pricing.quote(conn, params.get('car_id', convert=int),
+                                   params.date('start'), params.date('end'), services)
+        return quote._asdict()
+
+    # ========== Отчеты ==========
+    @staticmethod
+    def _period(params):
+        today = date.today()
+        return {'date_from': params.date('from', (today - timedelta(days=365)).isoformat()),
+                'date_to': params.date('to', today.isoformat())}
+
+    def income_report(self, conn, params):
+        rows = conn.execute(queries.REPORT_INCOME_BY_MONTH, self._period(params))
+        return {'items': [{'month': month, 'category': category, 'amount': amount, 'payments': payments}
+                          for month, category, amount, payments in rows]}
+
+    def popular_cars_report(self, conn, params):
+        rows = conn.execute(queries.REPORT_POPULAR_CARS,
+                            {**self._period(params), 'limit': params.limit(POPULAR_CARS_LIMIT)})
+        return {'items': _rows(rows)}
+
+    def active_rentals_report(self, conn, params):
+        total = conn.execute(queries.REPORT_ACTIVE_RENTALS_COUNT).fetchone()[0]
+        rows = conn.execute(queries.REPORT_ACTIVE_RENTALS, {'limit': params.limit(ACTIVE_RENTALS_LIMIT)})
+        return {'total': total, 'items': _rows(rows)}
+
+    def maintenance_report(self, conn, params):
+        rows = conn.execute(queries.REPORT_MAINTENANCE_CARS)
+        return {'items': [{'car_id': car_id, 'brand': brand, 'model': model, 'license_plate': plate,
+                           'last_service_date': last_service, 'open_damages': damages,
+                           'repair_cost': repair_cost}
+                          for car_id, brand, model, plate, last_service, damages, repair_cost in rows]}
+
+    def debtors_report(self, conn, params):
+        debtors = clients_with_debt(conn, params.get('min', 0.0, float), params.limit(DEBTORS_LIMIT))
+        return {'items': [debtor._asdict() for debtor in debtors]}
+
+    def utilization_report(self, conn, params):
+        with self._utilization_lock:
+            if self.utilization is None:
+                try:
+                    self.utilization = UtilizationEngine()
+                except RuntimeError as e:
+                    raise ApiError(HTTPStatus.NOT_IMPLEMENTED, str(e)) from None
+        period = self._period(params)
+        result = self.utilization.report(conn, period['date_from'], period['date_to'])
+        return {**result._asdict(),
+                'cars': [car._asdict() for car in result.cars[:params.limit(UTILIZATION_CARS_LIMIT)]],
+                'categories': [group._asdict() for group in result.categories],
+                'brands': [group._asdict() for group in result.brands],
+                'daily': [day._asdict() for day in result.daily]}
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Постоянные соединения терминалов
+    disable_nagle_algorithm = True  # Заголовки и тело пишутся отдельно: без этого +40 мс на ответ
+    api = None  # CarRentalApi, задается в make_server
+    quiet = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, headers, body = self.api.handle(url.path, url.query,
+                                                    self.headers.get('If-None-Match'))
+        except ApiError as e:
+            status, headers, body = e.status, {}, self._error(str(e))
+        except ValueError as e:
+            status, headers, body = HTTPStatus.BAD_REQUEST, {}, self._error(str(e))
+        except PoolTimeoutError as e:
+            status, headers, body = HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}, self._error(str(e))
+        except sqlite3.Error as e:
+            status, headers, body = HTTPStatus.INTERNAL_SERVER_ERROR, {}, self._error(f"Ошибка базы данных: {e}")
+
+        self.send_response(status)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _error(message):
+        return json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8080, db_path=None, quiet=True):
+    """HTTP-сервер (еще не запущенный); port=0 - любой свободный порт"""
+    handler = type('Handler', (ApiRequestHandler,), {'api': CarRentalApi(db_path), 'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--db', help='файл базы (по умолчанию - база приложения)')
+    parser.add_argument('--verbose', action='store_true', help='журнал запросов в stderr')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.db, quiet=not args.verbose)
+    print(f"Сервис автопроката: http://{server.server_address[0]}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Нагрузочный клиент HTTP/JSON-сервиса автопроката (api_server.py).
+
+Несколько терминалов (потоков) с постоянными соединениями запрашивают
+списки, поиск, свободные автомобили и расчет стоимости; пишется
+задержка p50/p95/p99 по видам запросов и общая пропускная способность.
+Запуск из каталога car_rental_system:
+    python benchmarks/api_load.py --tier 10k --terminals 8 --requests 500
+    python benchmarks/api_load.py --url http://127.0.0.1:8080 --no-etag
+Без --url сервер запускается в этом же процессе на базе уровня --tier.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from random import Random
+from urllib.parse import quote, urlsplit
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from api_server import make_server
+from benchmarks.data_paths import percentile
+from benchmarks.datasets import DEFAULT_WORKDIR, REFERENCE_DATE, get_dataset
+
+SEARCH_WORDS = ['Иван', 'Петр', 'Смирн', 'Кузнец', '912', 'Ольга']
+
+
+def make_request(rnd, max_car):
+    """(вид запроса, путь) в пропорциях работы стойки выдачи"""
+    kind = rnd.choices(['cars', 'rentals', 'clients', 'search', 'available', 'quote'],
+                       weights=[20, 25, 10, 20, 10, 15])[0]
+    start = REFERENCE_DATE + timedelta(days=rnd.randint(0, 30))
+    end = start + timedelta(days=rnd.randint(1, 14))
+    if kind in ('cars', 'rentals', 'clients'):
+        return kind, f'/{kind}?limit=200'
+    if kind == 'search':
+        return kind, f'/clients/search?q={quote(rnd.choice(SEARCH_WORDS))}'
+    if kind == 'available':
+        return kind, f'/cars/available?start={start}&end={end}'
+    return kind, f'/quote?car_id={rnd.randint(1, max_car)}&start={start}&end={end}'
+
+
+def terminal(host, port, requests, seed, use_etag, max_car, results):
+    """Один терминал: постоянное соединение и свой кэш ETag"""
+    rnd = Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    etags = {}
+    timings, not_modified, errors = {}, 0, 0
+    for _ in range(requests):
+        kind, path = make_request(rnd, max_car)
+        headers = {'If-None-Match': etags[path]} if use_etag and path in etags else {}
+        started = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        timings.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+        if response.status == 304:
+            not_modified += 1
+        elif response.status != 200:
+            errors += 1
+        elif response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    conn.close()
+    results.append((timings, not_modified, errors))
+
+
+def run_load(url, terminals, requests, use_etag, max_car, seed):
+    parts = urlsplit(url)
+    results = []
+    threads = [threading.Thread(target=terminal, args=(parts.hostname, parts.port, requests,
+                                                       seed + i, use_etag, max_car, results))
+               for i in range(terminals)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timings = {}
+    for terminal_timings, _, _ in results:
+        for kind, values in terminal_timings.items():
+            timings.setdefault(kind, []).extend(values)
+    total = sum(len(values) for values in timings.values())
+    report = {
+        'terminals': terminals,
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(total / elapsed, 1),
+        'not_modified': sum(r[1] for r in results),
+        'errors': sum(r[2] for r in results),
+        'operations': {},
+    }
+    for kind, values in sorted(timings.items()):
+        values.sort()
+        report['operations'][kind] = {
+            'runs': len(values),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='адрес запущенного сервиса (по умолчанию - встроенный)')
+    parser.add_argument('--tier', default='10k', help='уровень базы для встроенного сервера')
+    parser.add_argument('--workdir', default=str(DEFAULT_WORKDIR))
+    parser.add_argument('--terminals', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='запросов на терминал')
+    parser.add_argument('--no-etag', action='store_true', help='не отправлять If-None-Match')
+    parser.add_argument('--max-car', type=int, default=None, help='наибольший car_id для расчета')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл JSON с результатами')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    max_car = args.max_car
+    if url is None:
+        db_path = get_dataset(args.tier, args.workdir, args.seed)
+        server = make_server(port=0, db_path=db_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        if max_car is None:
+            import sqlite3
+            with sqlite3.connect(db_path) as conn:
+                max_car = conn.execute('SELECT MAX(car_id) FROM cars').fetchone()[0]
+    try:
+        report = run_load(url, args.terminals, args.requests, not args.no_etag, max_car or 100, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print(f"{report['requests']} запросов за {report['elapsed_s']} с: {report['requests_per_s']} запр/с, "
+          f"304: {report['not_modified']}, ошибок: {report['errors']}")
+    for kind, stats in report['operations'].items():
+        print(f"  {kind:<10} p50={stats['p50_ms']:>9.3f} мс  p95={stats['p95_ms']:>9.3f} мс"
+              f"  p99={stats['p99_ms']:>9.3f} мс")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Бенчмарк путей данных интерфейса автопроката на базах разного масштаба.
+
+Выполняет тот же SQL, что и методы CarRentalApp (database/queries.py),
+без Tk, и пишет задержки p50/p95/p99 в JSON. Запуск из каталога car_rental_system:
+    python benchmarks/data_paths.py --tiers 10k 100k --output results.json
+    python benchmarks/data_paths.py --tiers 10k --baseline baseline.json
+Записи выполняются в транзакции, которая откатывается, поэтому базы
+уровней переиспользуются между запусками без изменений.
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.datasets import DEFAULT_WORKDIR, REFERENCE_DATE, TIERS, get_dataset
+from database import queries
+from database.availability import find_available_cars, sync_car_status
+from database.checkin import check_in_rentals
+from database.client_search import search_clients
+from database.damages import DamageRow, import_damages
+from database.pagination import estimate_count, fetch_page
+from database.pricing import RentalPricingEngine
+from database.profiles import apply_profile
+from database.reservations import CarUnavailableError, try_reserve
+
+CHECK_IN_BATCH = 200  # Возвратов за вечер в одном филиале
+DAMAGE_BATCH = 500  # Находок одного осмотра парка
+
+
+def percentile(sorted_values, pct):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Workload:
+    """Случайные, но воспроизводимые параметры для операций"""
+
+    def __init__(self, conn, seed):
+        self.rnd = Random(seed)
+        self.max_car = conn.execute('SELECT MAX(car_id) FROM cars').fetchone()[0]
+        self.max_client = conn.execute('SELECT MAX(client_id) FROM clients').fetchone()[0]
+        self.max_rental = conn.execute('SELECT MAX(rental_id) FROM rentals').fetchone()[0]
+        self.service_ids = [row[0] for row in conn.execute('SELECT service_id FROM services')]
+        self.active = [row[0] for row in conn.execute(
+            "SELECT rental_id FROM rentals WHERE status = 'active' LIMIT 1000")]
+        self.reserved = [row[0] for row in conn.execute(
+            "SELECT rental_id FROM rentals WHERE status = 'reserved' LIMIT 1000")]
+        self.completed = [row[0] for row in conn.execute(
+            "SELECT rental_id FROM rentals WHERE status = 'completed' LIMIT 5000")]
+        self.last_names = [row[0] for row in conn.execute(
+            'SELECT DISTINCT last_name FROM clients LIMIT 50')]
+        self.pricing = RentalPricingEngine()
+
+    def car_id(self):
+        return self.rnd.randint(1, self.max_car)
+
+    def client_id(self):
+        return self.rnd.randint(1, self.max_client)
+
+
+# ========== Операции: тот же SQL, что и в gui.py ==========
+def op_load_cars(conn, w):
+    estimate_count(conn, 'cars')
+    fetch_page(conn, 'cars')
+
+
+def op_load_clients(conn, w):
+    estimate_count(conn, 'clients')
+    fetch_page(conn, 'clients')
+
+
+def op_search_clients(conn, w):
+    # Префикс фамилии или фрагмент телефона из середины номера
+    if w.rnd.random() < 0.5:
+        search_clients(conn, w.rnd.choice(w.last_names)[:4])
+    else:
+        search_clients(conn, str(w.rnd.randint(1000, 9999)))
+
+
+def op_load_rentals(conn, w):
+    estimate_count(conn, 'rentals')
+    fetch_page(conn, 'rentals')
+
+
+def op_scroll_rentals(conn, w):
+    # Подгрузка страницы с произвольной глубины списка
+    rental_id, start_date = conn.execute(
+        'SELECT rental_id, start_date FROM rentals WHERE rental_id >= ? LIMIT 1',
+        (w.rnd.randint(1, w.max_rental),)).fetchone()
+    fetch_page(conn, 'rentals', {'start_date': start_date, 'rental_id': rental_id})
+
+
+def op_new_rental_dialog(conn, w):
+    conn.execute(queries.RENTAL_CLIENTS).fetchall()
+    conn.execute(queries.CATEGORIES_LIST).fetchall()
+    op_find_available_cars(conn, w)
+    conn.execute(queries.SERVICES_LIST).fetchall()
+
+
+def op_find_available_cars(conn, w):
+    start = REFERENCE_DATE + timedelta(days=w.rnd.randint(-10, 30))
+    end = start + timedelta(days=7)
+    cars = find_available_cars(conn, start, end)
+    w.pricing.quote_many(conn, [(c[0], start, end, ()) for c in cars])
+
+
+def op_create_rental(conn, w):
+    services = w.rnd.sample(w.service_ids, 2)
+    try:
+        try_reserve(conn, w.client_id(), w.car_id(), '2025-07-01', '2025-07-08', services, w.pricing)
+    except CarUnavailableError:
+        pass  # Автомобиль занят на этот период - проверка выполнена, вставки нет
+
+
+def op_complete_rental(conn, w):
+    check_in_rentals(conn, [(w.rnd.choice(w.active), '2025-07-10')], w.pricing)
+
+
+def op_check_in_dialog(conn, w):
+    rental_ids = w.rnd.sample(w.active, min(CHECK_IN_BATCH, len(w.active)))
+    check_in_rentals(conn, [(rental_id, '2025-07-10') for rental_id in rental_ids], w.pricing)
+
+
+def op_report_damage(conn, w):
+    import_damages(conn, [DamageRow(1, w.rnd.choice(w.completed), 'Царапина', 3000.0, None)])
+
+
+def op_import_damages(conn, w):
+    rental_ids = w.rnd.sample(w.completed, min(DAMAGE_BATCH, len(w.completed)))
+    import_damages(conn, [DamageRow(line, rental_id, 'Скол на лобовом стекле', w.rnd.uniform(1000, 20000), None)
+                          for line, rental_id in enumerate(rental_ids, 1)])
+
+
+def op_cancel_rental(conn, w):
+    rental_id = w.rnd.choice(w.reserved)
+    car_id = conn.execute(queries.RENTAL_CAR, (rental_id,)).fetchone()[0]
+    conn.execute(queries.RENTAL_CANCEL, (rental_id,))
+    sync_car_status(conn, [car_id])
+
+
+# (имя метода CarRentalApp, функция, полная выборка таблицы, запись)
+OPERATIONS = [
+    ('load_cars', op_load_cars, False, False),
+    ('load_clients', op_load_clients, False, False),
+    ('search_clients_dialog', op_search_clients, False, False),
+    ('load_rentals', op_load_rentals, False, False),
+    ('scroll_rentals', op_scroll_rentals, False, False),
+    ('new_rental_dialog', op_new_rental_dialog, True, False),
+    ('find_available_cars', op_find_available_cars, False, False),
+    ('create_rental', op_create_rental, False, True),
+    ('complete_rental', op_complete_rental, False, True),
+    ('check_in_dialog', op_check_in_dialog, False, True),
+    ('cancel_rental', op_cancel_rental, False, True),
+    ('report_damage_dialog', op_report_damage, False, True),
+    ('import_damages_dialog', op_import_damages, False, True),
+]
+
+
+def run_operation(conn, workload, func, runs, write):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(conn, workload)
+        timings.append((time.perf_counter() - started) * 1000)
+        if write:
+            conn.rollback()
+    timings.sort()
+    return {
+        'runs': runs,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+    }
+
+
+def run_tier(db_path, args):
+    conn = sqlite3.connect(db_path)
+    apply_profile(conn, args.profile)
+    workload = Workload(conn, args.seed)
+    results = {}
+    try:
+        for name, func, full_scan, write in OPERATIONS:
+            if args.operations and name not in args.operations:
+                continue
+            if name == 'complete_rental' and not workload.active:
+                continue
+            if name == 'cancel_rental' and not workload.reserved:
+                continue
+            if name in ('report_damage_dialog', 'import_damages_dialog') and not workload.completed:
+                continue
+            runs = args.heavy_runs if full_scan else args.runs
+            results[name] = run_operation(conn, workload, func, runs, write)
+            print(f"  {name:<24} p50={results[name]['p50_ms']:>10.3f} мс"
+                  f"  p95={results[name]['p95_ms']:>10.3f} мс"
+                  f"  p99={results[name]['p99_ms']:>10.3f} мс")
+    finally:
+        conn.rollback()
+        conn.close()
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """Возвращает список регрессий p95 относительно базовой линии"""
+    regressions = []
+    for tier, operations in results.items():
+        for name, current in operations.items():
+            previous = baseline.get('results', {}).get(tier, {}).get(name)
+            if not previous or not previous['p95_ms']:
+                continue
+            ratio = current['p95_ms'] / previous['p95_ms']
+            marker = 'РЕГРЕССИЯ' if ratio > threshold else ''
+            print(f"  {tier:<5} {name:<24} p95 {previous['p95_ms']:>10.3f} -> "
+                  f"{current['p95_ms']:>10.3f} мс  x{ratio:.2f} {marker}")
+            if ratio > threshold:
+                regressions.append((tier, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiers', nargs='*', default=['10k', '100k'],
+                        help=f"уровни: {', '.join(TIERS)} или число аренд")
+    parser.add_argument('--operations', nargs='*', help='только указанные операции')
+    parser.add_argument('--runs', type=int, default=200, help='повторы точечных операций')
+    parser.add_argument('--heavy-runs', type=int, default=10, help='повторы полных выборок')
+    parser.add_argument('--profile', default=None, help='профиль PRAGMA')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=str(DEFAULT_WORKDIR))
+    parser.add_argument('--output', help='файл JSON с результатами')
+    parser.add_argument('--baseline', help='JSON предыдущего запуска для сравнения')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='допустимый рост p95 относительно базовой линии')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'profile': args.profile,
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    for tier in args.tiers:
+        db_path = get_dataset(tier, args.workdir, args.seed)
+        print(f"Уровень {tier}: {db_path}")
+        report['results'][tier] = run_tier(db_path, args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2),
+                                     encoding='utf-8')
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        print("Сравнение с базовой линией:")
+        regressions = compare_with_baseline(report['results'], baseline, args.threshold)
+        if regressions:
+            print(f"Регрессий: {len(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Наборы данных для бенчмарков: базы нескольких масштабов.
+
+Базы создаются генератором database.seed и переиспользуются между запусками.
+"""
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.connection import get_db_connection, get_pool
+from database.migrations import migrate
+from database.models import create_tables
+from database.seed import generate_data
+
+# Уровни масштаба: число аренд
+TIERS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / 'car_rental_bench'
+
+# Фиксированная дата, чтобы базы одного уровня совпадали между запусками
+REFERENCE_DATE = date(2025, 6, 1)
+
+
+def tier_sizes(rentals):
+    """Размеры справочников, пропорциональные числу аренд"""
+    return {
+        'cars': max(50, min(5000, rentals // 200)),
+        'clients': max(100, rentals // 20),
+        'rentals': rentals,
+    }
+
+
+def build_db(path, rentals, seed=42):
+    """Создает базу заданного масштаба"""
+    path = str(path)
+    conn = get_db_connection(path)
+    try:
+        create_tables(conn)
+        migrate(conn)
+    finally:
+        conn.close()
+    generate_data(path, seed=seed, today=REFERENCE_DATE, **tier_sizes(rentals))
+    get_pool(path, 'bulk-load').close()
+    get_pool(path).close()
+    return path
+
+
+def get_dataset(tier, workdir=DEFAULT_WORKDIR, seed=42):
+    """Путь к базе уровня tier (создается при первом обращении)"""
+    rentals = TIERS[tier] if tier in TIERS else int(tier)
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    path = workdir / f'rentals_{tier}_seed{seed}.db'
+    if not path.exists():
+        print(f"Создание базы {path.name}...")
+        tmp = path.with_suffix('.tmp')
+        for leftover in workdir.glob(tmp.name + '*'):
+            leftover.unlink()
+        build_db(tmp, rentals, seed)
+        tmp.rename(path)
+    else:
+        # База могла быть создана до новых миграций
+        conn = get_db_connection(path)
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+            get_pool(path).close()
+    return str(path)
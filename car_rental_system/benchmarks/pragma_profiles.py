@@ -0,0 +1,133 @@
+"""Пропускная способность чтения/записи для каждого профиля PRAGMA.
+
+Запуск из каталога car_rental_system:
+    python benchmarks/pragma_profiles.py --rentals 200000
+"""
+import argparse
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.datasets import build_db
+from database.profiles import PROFILES, apply_profile
+
+
+# Настройки SQLite по умолчанию (как было до профилей) для сравнения
+SQLITE_DEFAULTS = "sqlite-default"
+
+
+def _open(path, profile):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if profile == SQLITE_DEFAULTS:
+        conn.execute("PRAGMA journal_mode = DELETE")
+    else:
+        apply_profile(conn, profile)
+    return conn
+
+
+def bench_writes(path, profile, count, cars, clients):
+    """Одна аренда = одна транзакция, как в create_rental"""
+    conn = _open(path, profile)
+    started = time.perf_counter()
+    for i in range(count):
+        conn.execute(
+            'INSERT INTO rentals (client_id, car_id, start_date, end_date, total_cost, '
+            'deposit_amount, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (i % clients + 1, i % cars + 1, '2025-01-01', '2025-01-08', 10000, 5000, 'reserved'))
+        conn.commit()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return count / elapsed
+
+
+def bench_reads(path, profile, count, cars):
+    """Точечные выборки автомобиля с тарифом, как в calculate_cost"""
+    conn = _open(path, profile)
+    started = time.perf_counter()
+    for i in range(count):
+        conn.execute('''
+            SELECT cat.daily_rate, cat.deposit_amount
+            FROM cars c JOIN categories cat ON c.category_id = cat.category_id
+            WHERE c.car_id = ?''', (i % cars + 1,)).fetchone()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return count / elapsed
+
+
+def bench_mixed(path, profile, seconds, cars, clients):
+    """Читатель сканирует аренды, пока писатель фиксирует транзакции"""
+    stop = threading.Event()
+    counters = {"reads": 0, "writes": 0, "busy": 0}
+
+    def reader():
+        conn = _open(path, profile)
+        while not stop.is_set():
+            conn.execute('''
+                SELECT status, COUNT(*), SUM(total_cost) FROM rentals
+                GROUP BY status''').fetchall()
+            counters["reads"] += 1
+        conn.close()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    conn = _open(path, profile)
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        try:
+            conn.execute(
+                'INSERT INTO rentals (client_id, car_id, start_date, end_date, total_cost, '
+                'deposit_amount, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (i % clients + 1, i % cars + 1, '2025-02-01', '2025-02-08', 10000, 5000, 'reserved'))
+            conn.commit()
+            counters["writes"] += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            counters["busy"] += 1
+        i += 1
+    stop.set()
+    thread.join()
+    conn.close()
+    return counters["reads"] / seconds, counters["writes"] / seconds, counters["busy"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rentals", type=int, default=100000)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--mixed-seconds", type=float, default=3.0)
+    parser.add_argument("--profiles", nargs="*", default=[SQLITE_DEFAULTS, *PROFILES])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "scaled.db"
+        print(f"Создание базы: {args.rentals} аренд...")
+        build_db(source, args.rentals)
+        conn = sqlite3.connect(source)
+        cars, clients = conn.execute(
+            'SELECT (SELECT MAX(car_id) FROM cars), (SELECT MAX(client_id) FROM clients)').fetchone()
+        conn.close()
+
+        print(f"{'Профиль':<16}{'запись, tx/s':>14}{'чтение, q/s':>14}"
+              f"{'смеш. чтение':>14}{'смеш. запись':>14}{'busy':>6}")
+        for profile in args.profiles:
+            path = str(Path(tmp) / f"{profile}.db")
+            shutil.copyfile(source, path)
+            writes = bench_writes(path, profile, args.writes, cars, clients)
+            reads = bench_reads(path, profile, args.reads, cars)
+            mixed_reads, mixed_writes, busy = bench_mixed(
+                path, profile, args.mixed_seconds, cars, clients)
+            print(f"{profile:<16}{writes:>14.0f}{reads:>14.0f}"
+                  f"{mixed_reads:>14.1f}{mixed_writes:>14.0f}{busy:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Проверка: бронирования остаются быстрыми, пока строится тяжелый отчет.
+
+Терминал с постоянным темпом оформляет аренды (reserve_car, как
+CarRentalApp.new_rental_dialog) и периодически запускает отчет с полным
+проходом по платежам. Задержка бронирования считается от постановки
+в очередь до фиксации в трех режимах:
+    alone     - только бронирования;
+    shared    - отчеты и бронирования в одной очереди на соединениях для
+                записи (как было в DbWorker до соединений только для чтения);
+    isolated  - отчеты в потоке чтения на ReadOnlyConnection, бронирования
+                в потоке записи (как в DbWorker сейчас).
+Отдельно проверяется, что соединение только для чтения не может писать
+и видит снимок на начало своей транзакции.
+
+Запуск из каталога car_rental_system (работает с копией базы уровня):
+    python benchmarks/report_isolation.py --tier 1m --duration 20
+Код возврата 1, если p95 бронирования в режиме isolated выходит за
+--budget-ms или запись через соединение только для чтения прошла.
+"""
+import argparse
+import queue
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.data_paths import Workload, percentile
+from benchmarks.datasets import DEFAULT_WORKDIR, get_dataset
+from database.connection import close_all_pools, get_db_connection, get_read_connection
+from database.reservations import CarUnavailableError, reserve_car
+
+PERIOD_START = date(2030, 1, 1)  # Брони бенчмарка почти не пересекаются с данными и друг с другом
+
+# Доход по месяцам и категориям прямым проходом по платежам (без сводных таблиц)
+HEAVY_REPORT = '''
+SELECT strftime('%Y-%m', p.payment_date) AS month, cat.name, SUM(p.amount), COUNT(*)
+FROM payments p
+JOIN rentals r ON r.rental_id = p.rental_id
+JOIN cars c ON c.car_id = r.car_id
+JOIN categories cat ON cat.category_id = c.category_id
+WHERE p.status = 'completed'
+GROUP BY month, cat.name
+'''
+
+
+def book(conn, w):
+    """Оформление аренды с фиксацией; False - автомобиль занят или в ремонте
+    (терминал показал бы предупреждение, попытка все равно учитывается)"""
+    start = PERIOD_START + timedelta(days=w.rnd.randrange(3650))
+    end = start + timedelta(days=7)
+    try:
+        reserve_car(conn, w.client_id(), w.car_id(), start.isoformat(), end.isoformat(),
+                    w.rnd.sample(w.service_ids, 2), w.pricing)
+    except CarUnavailableError:
+        return False
+    return True
+
+
+def report(conn, w):
+    return conn.execute(HEAVY_REPORT).fetchall()
+
+
+class Worker(threading.Thread):
+    """Поток с очередью задач (kind, func, время постановки) на соединениях connect()"""
+
+    def __init__(self, connect, workload, timings, errors):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.workload = workload
+        self.timings = timings  # kind -> [мс от постановки до завершения]
+        self.errors = errors
+        self.tasks = queue.Queue()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            kind, func, submitted = task
+            conn = self.connect()
+            try:
+                func(conn, self.workload)
+            except sqlite3.Error as e:
+                self.errors.append(f"{kind}: {e}")
+            finally:
+                conn.close()
+            self.timings.setdefault(kind, []).append((time.perf_counter() - submitted) * 1000)
+
+
+def run_mode(mode, db_path, args):
+    """Задержки бронирований и отчетов (мс) и ошибки за args.duration секунд"""
+    timings, errors = {}, []
+    conn = get_db_connection(db_path)
+    try:
+        workload = Workload(conn, args.seed)
+    finally:
+        conn.close()
+    writer = Worker(lambda: get_db_connection(db_path), workload, timings, errors)
+    reader = Worker(lambda: get_read_connection(db_path), workload, timings, errors)
+    queues = {'booking': writer.tasks, 'report': (reader if mode == 'isolated' else writer).tasks}
+    for worker in (writer, reader):
+        worker.start()
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    next_booking = started
+    next_report = started + args.booking_interval / 2 if mode != 'alone' else float('inf')
+    reports = 0
+    while (now := time.perf_counter()) < deadline:
+        if now >= next_booking:
+            queues['booking'].put(('booking', book, now))
+            next_booking += args.booking_interval
+        # Новый отчет запрашивается не раньше, чем готов предыдущий
+        if now >= next_report and len(timings.get('report', ())) == reports:
+            queues['report'].put(('report', report, now))
+            reports += 1
+            next_report = now + args.report_interval
+        elif now >= next_report:
+            next_report = now + args.booking_interval
+        time.sleep(max(0.0, min(next_booking, next_report, deadline) - time.perf_counter()))
+    for worker in (writer, reader):
+        worker.tasks.put(None)
+        worker.join()
+    return timings, errors
+
+
+def check_read_only(db_path):
+    """Запись через ReadOnlyConnection отклоняется, а чтение идет из снимка"""
+    reader = get_read_connection(db_path)
+    writer = get_db_connection(db_path)
+    try:
+        try:
+            reader.execute("UPDATE cars SET status = status WHERE car_id = 1")
+            return "запись через соединение только для чтения не отклонена"
+        except sqlite3.OperationalError:
+            reader.rollback()
+        reader.execute('BEGIN')
+        before = reader.execute('SELECT COUNT(*) FROM rentals').fetchone()[0]
+        workload = Workload(writer, 0)
+        while not book(writer, workload):  # Фиксируется, пока снимок читателя открыт
+            pass
+        if reader.execute('SELECT COUNT(*) FROM rentals').fetchone()[0] != before:
+            return "читатель увидел изменения, зафиксированные после начала его транзакции"
+        reader.rollback()
+        if reader.execute('SELECT COUNT(*) FROM rentals').fetchone()[0] != before + 1:
+            return "новая транзакция читателя не видит зафиксированную аренду"
+        return None
+    finally:
+        reader.close()
+        writer.close()
+
+
+def summary(values):
+    values = sorted(values)
+    return {'runs': len(values),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'max_ms': round(values[-1], 3) if values else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tier', default='100k', help='уровень базы')
+    parser.add_argument('--workdir', default=str(DEFAULT_WORKDIR))
+    parser.add_argument('--duration', type=float, default=15.0, help='секунд на режим')
+    parser.add_argument('--booking-interval', type=float, default=0.05, help='секунд между бронированиями')
+    parser.add_argument('--report-interval', type=float, default=2.0, help='пауза после готового отчета, с')
+    parser.add_argument('--modes', nargs='*', default=['alone', 'shared', 'isolated'])
+    parser.add_argument('--budget-ms', type=float, default=25.0,
+                        help='допустимый p95 бронирования во время отчетов')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    source = Path(get_dataset(args.tier, args.workdir, args.seed))
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        db_path = str(Path(tmp) / source.name)
+        shutil.copyfile(source, db_path)  # Бронирования фиксируются - база уровня не меняется
+        try:
+            problem = check_read_only(db_path)
+            print(f"Соединение только для чтения: {problem or 'запись отклонена, чтение из снимка'}")
+            results = {}
+            for mode in args.modes:
+                timings, errors = run_mode(mode, db_path, args)
+                results[mode] = {kind: summary(values) for kind, values in timings.items()}
+                print(f"{mode}:" + (f" ошибок {len(errors)}, первая: {errors[0]}" if errors else ""))
+                for kind, stats in sorted(results[mode].items()):
+                    print(f"  {kind:<8} n={stats['runs']:<5} p50={stats['p50_ms']:>9.3f} мс"
+                          f"  p95={stats['p95_ms']:>9.3f} мс  p99={stats['p99_ms']:>9.3f} мс"
+                          f"  max={stats['max_ms']:>9.3f} мс")
+                if errors:
+                    problem = problem or f"{mode}: {errors[0]}"
+        finally:
+            close_all_pools()
+
+    if 'isolated' in results:
+        isolated = results['isolated']['booking']['p95_ms']
+        if 'alone' in results:
+            alone = results['alone']['booking']['p95_ms']
+            print(f"p95 бронирования при отчетах: {isolated:.3f} мс против {alone:.3f} мс без отчетов")
+        if isolated > args.budget_ms:
+            problem = problem or f"p95 бронирования {isolated:.1f} мс больше {args.budget_ms} мс"
+    if problem:
+        print(f"ОШИБКА: {problem}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Конкурентное бронирование: пропускная способность и двойные брони.
+
+N процессов-терминалов одновременно бронируют несколько автомобилей
+на случайные пересекающиеся периоды 2030 года в двух режимах:
+    atomic  - database.reservations.reserve_car: проверка интервала и вставка
+              в одной транзакции BEGIN IMMEDIATE с повторами при занятой базе;
+    naive   - как new_rental_dialog раньше: проверка is_car_available,
+              затем отдельная транзакция вставки.
+После каждого прогона двойные брони (пересекающиеся занятые аренды одного
+автомобиля) считаются самосоединением rentals, а брони 2030 года удаляются.
+
+Запуск из каталога car_rental_system (работает с копией базы уровня):
+    python benchmarks/reservation_contention.py --tier 100k --writers 1 2 4 8
+Код возврата 1, если в режиме atomic найдена двойная бронь.
+"""
+import argparse
+import json
+import multiprocessing
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from random import Random
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.data_paths import percentile
+from benchmarks.datasets import DEFAULT_WORKDIR, get_dataset
+from database import queries
+from database.availability import BLOCKING_STATUSES, is_car_available, sync_car_status
+from database.connection import close_all_pools, get_db_connection
+from database.pricing import RentalPricingEngine
+from database.reservations import CarUnavailableError, reserve_car
+
+PERIOD_START = date(2030, 1, 1)  # Брони бенчмарка не пересекаются с данными уровня
+_STATUSES_SQL = ', '.join(f"'{status}'" for status in BLOCKING_STATUSES)
+
+DOUBLE_BOOKINGS = f'''
+SELECT COUNT(*) FROM rentals a
+JOIN rentals b ON b.car_id = a.car_id AND b.rental_id > a.rental_id
+WHERE a.start_date >= :period AND b.start_date >= :period
+  AND a.status IN ({_STATUSES_SQL}) AND b.status IN ({_STATUSES_SQL})
+  AND a.start_date < b.end_date AND b.start_date < a.end_date
+'''
+
+
+def naive_reserve(conn, client_id, car_id, start, end, service_ids, pricing):
+    """Проверка и вставка в разных транзакциях: между ними успевает другой терминал"""
+    if not is_car_available(conn, car_id, start, end):
+        raise CarUnavailableError(f"Автомобиль {car_id} уже забронирован на этот период")
+    quote = pricing.quote(conn, car_id, start, end, service_ids)
+    cursor = conn.execute(queries.RENTAL_INSERT, (client_id, car_id, start, end, quote.total_cost, quote.deposit))
+    conn.executemany(queries.RENTAL_SERVICE_INSERT, [(cursor.lastrowid, service_id) for service_id in service_ids])
+    sync_car_status(conn, [car_id])
+    conn.commit()
+
+
+def writer(db_path, mode, seed, cars, days, bookings, barrier):
+    """Процесс-терминал; возвращает задержки (мс) и счетчики исходов"""
+    rnd = Random(seed)
+    pricing = RentalPricingEngine()
+    conn = get_db_connection(db_path)
+    stats = {'latencies': [], 'booked': 0, 'conflicts': 0, 'retries': 0, 'failed': 0}
+    try:
+        max_client = conn.execute('SELECT MAX(client_id) FROM clients').fetchone()[0]
+        service_ids = [row[0] for row in conn.execute('SELECT service_id FROM services')]
+        barrier.wait()
+        begun = time.perf_counter()
+        for _ in range(bookings):
+            start = PERIOD_START + timedelta(days=rnd.randrange(days))
+            end = start + timedelta(days=rnd.randint(1, 5))
+            args = (rnd.randint(1, max_client), rnd.choice(cars), start.isoformat(), end.isoformat(),
+                    rnd.sample(service_ids, 1), pricing)
+            started = time.perf_counter()
+            try:
+                if mode == 'atomic':
+                    stats['retries'] += reserve_car(conn, *args).attempts - 1
+                else:
+                    naive_reserve(conn, *args)
+                stats['booked'] += 1
+            except CarUnavailableError:
+                stats['conflicts'] += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                stats['failed'] += 1  # База занята дольше busy_timeout и всех повторов
+            stats['latencies'].append((time.perf_counter() - started) * 1000)
+        stats['elapsed'] = time.perf_counter() - begun
+    finally:
+        conn.close()
+        close_all_pools()
+    return stats
+
+
+def cleanup(db_path, cars, statuses):
+    """Удаляет брони бенчмарка и возвращает статусы автомобилей"""
+    conn = get_db_connection(db_path)
+    try:
+        conn.execute('DELETE FROM rental_services WHERE rental_id IN '
+                     '(SELECT rental_id FROM rentals WHERE start_date >= ?)', (PERIOD_START.isoformat(),))
+        conn.execute('DELETE FROM rentals WHERE start_date >= ?', (PERIOD_START.isoformat(),))
+        conn.executemany(queries.CAR_SET_STATUS, [(statuses[car_id], car_id) for car_id in cars])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(db_path, mode, writers, args, cars):
+    barrier = multiprocessing.Manager().Barrier(writers)
+    tasks = [(db_path, mode, args.seed * 1000 + i, cars, args.days, args.bookings, barrier)
+             for i in range(writers)]
+    with multiprocessing.Pool(writers) as pool:
+        results = pool.starmap(writer, tasks)
+    elapsed = max(result['elapsed'] for result in results)  # Без запуска процессов
+
+    conn = get_db_connection(db_path)
+    try:
+        doubles = conn.execute(DOUBLE_BOOKINGS, {'period': PERIOD_START.isoformat()}).fetchone()[0]
+    finally:
+        conn.close()
+    latencies = sorted(value for result in results for value in result['latencies'])
+    totals = {key: sum(result[key] for result in results) for key in ('booked', 'conflicts', 'retries', 'failed')}
+    return {'mode': mode, 'writers': writers, **totals, 'double_bookings': doubles,
+            'bookings_per_s': round(totals['booked'] / elapsed, 1),
+            'attempts_per_s': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tier', default='10k', help='уровень базы')
+    parser.add_argument('--workdir', default=str(DEFAULT_WORKDIR))
+    parser.add_argument('--writers', type=int, nargs='*', default=[1, 2, 4, 8], help='числа процессов')
+    parser.add_argument('--modes', nargs='*', default=['atomic', 'naive'])
+    parser.add_argument('--bookings', type=int, default=200, help='попыток бронирования на процесс')
+    parser.add_argument('--cars', type=int, default=5, help='автомобилей, за которые идет борьба')
+    parser.add_argument('--days', type=int, default=180, help='дней 2030 года для начала брони')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл JSON с результатами')
+    args = parser.parse_args()
+
+    source = Path(get_dataset(args.tier, args.workdir, args.seed))
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        db_path = str(Path(tmp) / source.name)
+        shutil.copyfile(source, db_path)
+        conn = get_db_connection(db_path)
+        try:
+            statuses = dict(conn.execute("SELECT car_id, status FROM cars WHERE status != 'maintenance' "
+                                         "ORDER BY car_id LIMIT ?", (args.cars,)).fetchall())
+        finally:
+            conn.close()
+            close_all_pools()
+        cars = sorted(statuses)
+
+        for mode in args.modes:
+            for writers in args.writers:
+                result = run(db_path, mode, writers, args, cars)
+                cleanup(db_path, cars, statuses)
+                close_all_pools()
+                results.append(result)
+                print(f"{mode:<7} writers={writers:<3} брони={result['booked']:<5} "
+                      f"отказы={result['conflicts']:<5} повторы={result['retries']:<4} "
+                      f"сбои={result['failed']:<3} {result['bookings_per_s']:>8.1f} брон/с "
+                      f"p50={result['p50_ms']:>8.3f} мс p95={result['p95_ms']:>8.3f} мс "
+                      f"двойные брони: {result['double_bookings']}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    doubles = sum(r['double_bookings'] for r in results if r['mode'] == 'atomic')
+    if doubles:
+        print(f"ОШИБКА: двойных броней в режиме atomic: {doubles}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Поиск автомобилей, свободных в заданный период.
+
+Интервалы аренд, которые занимают автомобиль (reserved, active и
+невозвращенные overdue), хранятся в виртуальной таблице R*Tree
+rental_intervals и поддерживаются триггерами на rentals. Поиск пересечений
+с окном идет по R*Tree и не зависит от объема истории завершенных аренд.
+"""
+from datetime import date, datetime
+from sqlite3 import Connection
+
+from database.queries import AVAILABLE_CARS_FOR_PERIOD, CAR_INTERVAL_CONFLICTS, CAR_SYNC_STATUS
+
+# Статусы аренд, при которых автомобиль занят (overdue - пока не возвращен)
+BLOCKING_STATUSES = ('reserved', 'active', 'overdue')
+
+# Время хранится в минутах от 1970-01-01 (как strftime('%s') / 60).
+# Автомобиль - второе измерение R*Tree (car_min = car_max = car_id):
+# координаты читаются прямо из узлов дерева, без обращения к таблице.
+OPEN_END = 2 ** 31 - 1  # Автомобиль не возвращен - интервал открыт
+
+_EPOCH = datetime(1970, 1, 1)
+
+_STATUSES_SQL = ', '.join(f"'{status}'" for status in BLOCKING_STATUSES)
+
+
+def _interval_select(row):
+    """SELECT интервала аренды в минутах для строки row (NEW или таблица).
+    Просроченная аренда без даты возврата занимает автомобиль бессрочно,
+    возвращенная - не занимает."""
+    return f'''
+    SELECT {row}rental_id,
+           CAST(strftime('%s', {row}start_date) AS INTEGER) / 60,
+           CASE
+               WHEN {row}status = 'overdue' THEN {OPEN_END}
+               ELSE CAST(strftime('%s', {row}end_date) AS INTEGER) / 60
+           END,
+           {row}car_id, {row}car_id
+    ''', f'''
+    {row}status IN ({_STATUSES_SQL})
+      AND NOT ({row}status = 'overdue' AND {row}actual_end_date IS NOT NULL)
+    '''
+
+
+_NEW_COLUMNS, _NEW_BLOCKING = _interval_select('NEW.')
+_INTERVAL_ROW = f'{_NEW_COLUMNS} WHERE {_NEW_BLOCKING}'
+
+
+def create_interval_index(conn: Connection):
+    """Создает R*Tree интервалов, триггеры синхронизации и заполняет его"""
+    conn.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS rental_intervals
+    USING rtree_i32(rental_id, start_min, end_min, car_min, car_max)''')
+    create_interval_triggers(conn)
+    rebuild_interval_index(conn)
+
+
+def create_interval_triggers(conn: Connection):
+    """Триггеры, поддерживающие R*Tree при изменении аренд"""
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rental_intervals_ai AFTER INSERT ON rentals
+    BEGIN
+        INSERT INTO rental_intervals (rental_id, start_min, end_min, car_min, car_max) {_INTERVAL_ROW};
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rental_intervals_au
+    AFTER UPDATE OF car_id, start_date, end_date, actual_end_date, status ON rentals
+    BEGIN
+        DELETE FROM rental_intervals WHERE rental_id = OLD.rental_id;
+        INSERT INTO rental_intervals (rental_id, start_min, end_min, car_min, car_max) {_INTERVAL_ROW};
+    END''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS rental_intervals_ad AFTER DELETE ON rentals
+    BEGIN
+        DELETE FROM rental_intervals WHERE rental_id = OLD.rental_id;
+    END''')
+
+
+def drop_interval_triggers(conn: Connection):
+    """Отключает синхронизацию R*Tree на время массовой загрузки; возвращает True, если она была"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'rental\\_intervals\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+    return bool(names)
+
+
+def rebuild_interval_index(conn: Connection):
+    """Заполняет R*Tree заново одним INSERT ... SELECT по занятым арендам"""
+    conn.execute('DELETE FROM rental_intervals')
+    columns, blocking = _interval_select('')
+    conn.execute(f'''
+    INSERT INTO rental_intervals (rental_id, start_min, end_min, car_min, car_max)
+    {columns} FROM rentals WHERE {blocking}''')
+
+
+def to_minutes(value):
+    """Переводит дату/время или строку 'ГГГГ-ММ-ДД[ ЧЧ:ММ:СС]' в минуты"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return int((value - _EPOCH).total_seconds()) // 60
+
+
+def find_available_cars(conn: Connection, start, end, category_id=None):
+    """Автомобили без занятых аренд в периоде [start, end).
+
+    Возвращает строки (car_id, brand, model, category_name, daily_rate),
+    исключая автомобили в ремонте.
+    """
+    window_start, window_end = to_minutes(start), to_minutes(end)
+    if window_end <= window_start:
+        raise ValueError("Дата окончания должна быть позже даты начала")
+    return conn.execute(AVAILABLE_CARS_FOR_PERIOD, {
+        'window_start': window_start,
+        'window_end': window_end,
+        'category_id': category_id,
+    }).fetchall()
+
+
+def is_car_available(conn: Connection, car_id, start, end, exclude_rental_id=None):
+    """Проверяет, что у автомобиля нет занятых аренд, пересекающих период"""
+    row = conn.execute(CAR_INTERVAL_CONFLICTS, {
+        'car_id': car_id,
+        'window_start': to_minutes(start),
+        'window_end': to_minutes(end),
+        'exclude_rental_id': exclude_rental_id,
+    }).fetchone()
+    return row is None
+
+
+def sync_car_status(conn: Connection, car_ids):
+    """Пересчитывает статус автомобилей по их оставшимся арендам.
+
+    Автомобиль может держать несколько будущих броней, поэтому после отмены
+    или возврата одной из них он не обязательно свободен: rented - есть
+    невозвращенная аренда, reserved - есть бронь, иначе available.
+    """
+    conn.executemany(CAR_SYNC_STATUS, [(car_id,) for car_id in set(car_ids)])
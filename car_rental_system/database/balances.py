@@ -0,0 +1,276 @@
+"""Баланс расчетов по арендам и клиентам, поддерживаемый триггерами.
+
+Начислено по аренде - стоимость начавшейся аренды (active, overdue,
+completed) и стоимость ремонта по ее повреждениям; оплачено - сумма
+проведенных платежей, включая отрицательные возвраты депозита.
+Долг = начислено - оплачено: внесенный депозит дает отрицательный баланс
+(деньги клиента у нас), возврат депозита или удержание из него стоимости
+ремонта сводят баланс к нулю. rental_balances и client_balances
+изменяются триггерами на rentals, payments и damages, поэтому список
+должников читается по индексу idx_client_balances_debt без суммирования
+платежей. reconcile_balances сверяет их с полным пересчетом.
+
+Запуск из каталога car_rental_system:
+    python database/balances.py --debtors 10000   # должники с долгом больше 10000
+    python database/balances.py --reconcile [--fix]
+"""
+import argparse
+import sys
+from pathlib import Path
+from sqlite3 import Connection
+from typing import NamedTuple
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.queries import BALANCE_DEBTORS, BALANCE_RENTAL
+
+DEBTORS_LIMIT = 100
+# Суммы хранятся в REAL: расхождения меньше копейки - погрешность сложения
+EPSILON = 0.005
+
+_CHARGED_STATUSES = "('active', 'overdue', 'completed')"
+
+# Начисление аренды по строке rentals
+_RENTAL_CHARGE = "CASE WHEN {row}.status IN " + _CHARGED_STATUSES + " THEN {row}.total_cost ELSE 0 END"
+
+# Изменение начисленного (charged) или оплаченного (paid) по аренде и ее клиенту
+_ADJUST = '''
+    UPDATE rental_balances SET {column} = {column} + ({amount}) WHERE rental_id = {rental};
+    UPDATE client_balances SET {column} = {column} + ({amount})
+    WHERE client_id = (SELECT client_id FROM rental_balances WHERE rental_id = {rental});'''
+
+# Баланс аренды целиком добавляется клиенту (sign='') или вычитается (sign='-')
+_CLIENT_TOTALS = '''
+    INSERT INTO client_balances (client_id, charged, paid)
+    SELECT client_id, {sign}charged, {sign}paid FROM rental_balances WHERE rental_id = {rental}
+    ON CONFLICT (client_id) DO UPDATE SET
+        charged = charged + excluded.charged,
+        paid = paid + excluded.paid;'''
+
+# Полный пересчет балансов аренд (rebuild и сверка)
+_RENTAL_TOTALS = f'''
+SELECT r.rental_id, r.client_id,
+       {_RENTAL_CHARGE.format(row='r')} + COALESCE(d.cost, 0) AS charged,
+       COALESCE(p.paid, 0) AS paid
+FROM rentals r
+LEFT JOIN (SELECT rental_id, SUM(repair_cost) AS cost FROM damages GROUP BY rental_id) d
+    ON d.rental_id = r.rental_id
+LEFT JOIN (SELECT rental_id, SUM(amount) AS paid FROM payments
+           WHERE status = 'completed' GROUP BY rental_id) p
+    ON p.rental_id = r.rental_id'''
+
+
+def _payment(row):
+    return f"CASE WHEN {row}.status = 'completed' THEN {row}.amount ELSE 0 END"
+
+
+def _adjust(column, amount, rental):
+    return _ADJUST.format(column=column, amount=amount, rental=rental)
+
+
+def create_balances(conn: Connection):
+    """Создает таблицы балансов, триггеры и заполняет их по истории"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rental_balances (
+        rental_id INTEGER PRIMARY KEY,
+        client_id INTEGER NOT NULL,
+        charged REAL NOT NULL DEFAULT 0,
+        paid REAL NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS client_balances (
+        client_id INTEGER PRIMARY KEY,
+        charged REAL NOT NULL DEFAULT 0,
+        paid REAL NOT NULL DEFAULT 0
+    )''')
+    # Индекс выражения: список должников без прохода по всем клиентам
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_client_balances_debt ON client_balances(charged - paid)')
+    create_balance_triggers(conn)
+    rebuild_balances(conn)
+
+
+def create_balance_triggers(conn: Connection):
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_rentals_ai AFTER INSERT ON rentals
+    BEGIN
+        INSERT INTO rental_balances (rental_id, client_id, charged, paid)
+        VALUES (NEW.rental_id, NEW.client_id, {_RENTAL_CHARGE.format(row='NEW')}, 0);
+        {_CLIENT_TOTALS.format(sign='', rental='NEW.rental_id')}
+    END''')
+    # Перевод в overdue и другие смены статуса без смены начисления пропускаются
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_rentals_au
+    AFTER UPDATE OF client_id, total_cost, status ON rentals
+    WHEN OLD.client_id IS NOT NEW.client_id
+      OR {_RENTAL_CHARGE.format(row='OLD')} IS NOT {_RENTAL_CHARGE.format(row='NEW')}
+    BEGIN {_CLIENT_TOTALS.format(sign='-', rental='NEW.rental_id')}
+        UPDATE rental_balances SET
+            client_id = NEW.client_id,
+            charged = charged - ({_RENTAL_CHARGE.format(row='OLD')}) + ({_RENTAL_CHARGE.format(row='NEW')})
+        WHERE rental_id = NEW.rental_id;
+        {_CLIENT_TOTALS.format(sign='', rental='NEW.rental_id')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_rentals_ad AFTER DELETE ON rentals
+    BEGIN {_CLIENT_TOTALS.format(sign='-', rental='OLD.rental_id')}
+        DELETE FROM rental_balances WHERE rental_id = OLD.rental_id;
+    END''')
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_payments_ai AFTER INSERT ON payments
+    BEGIN {_adjust('paid', _payment('NEW'), 'NEW.rental_id')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_payments_au
+    AFTER UPDATE OF rental_id, amount, status ON payments
+    BEGIN {_adjust('paid', '-' + _payment('OLD'), 'OLD.rental_id')}
+          {_adjust('paid', _payment('NEW'), 'NEW.rental_id')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_payments_ad AFTER DELETE ON payments
+    BEGIN {_adjust('paid', '-' + _payment('OLD'), 'OLD.rental_id')}
+    END''')
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_damages_ai AFTER INSERT ON damages
+    BEGIN {_adjust('charged', 'NEW.repair_cost', 'NEW.rental_id')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_damages_au AFTER UPDATE OF rental_id, repair_cost ON damages
+    BEGIN {_adjust('charged', '-OLD.repair_cost', 'OLD.rental_id')}
+          {_adjust('charged', 'NEW.repair_cost', 'NEW.rental_id')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS balance_damages_ad AFTER DELETE ON damages
+    BEGIN {_adjust('charged', '-OLD.repair_cost', 'OLD.rental_id')}
+    END''')
+
+
+def drop_balance_triggers(conn: Connection):
+    """Отключает учет балансов на время массовой загрузки; возвращает True, если он был"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'balance\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+    return bool(names)
+
+
+def rebuild_balances(conn: Connection):
+    """Пересчитывает балансы аренд и клиентов по всей истории"""
+    conn.execute('DELETE FROM rental_balances')
+    conn.execute(f'INSERT INTO rental_balances (rental_id, client_id, charged, paid) {_RENTAL_TOTALS}')
+    conn.execute('DELETE FROM client_balances')
+    conn.execute('''
+    INSERT INTO client_balances (client_id, charged, paid)
+    SELECT client_id, SUM(charged), SUM(paid) FROM rental_balances GROUP BY client_id''')
+    # Без статистики по заполненной таблице планировщик сканирует clients
+    # и сортирует должников вместо чтения диапазона idx_client_balances_debt
+    conn.execute('ANALYZE rental_balances')
+    conn.execute('ANALYZE client_balances')
+
+
+def rental_balance(conn: Connection, rental_id):
+    """(начислено, оплачено, долг) по аренде или None, если аренды нет"""
+    row = conn.execute(BALANCE_RENTAL, (rental_id,)).fetchone()
+    return tuple(row) if row else None
+
+
+class Debtor(NamedTuple):
+    client_id: int
+    client: str
+    phone: str
+    charged: float
+    paid: float
+    debt: float
+
+
+def clients_with_debt(conn: Connection, min_debt=0.0, limit=DEBTORS_LIMIT):
+    """Клиенты с долгом больше min_debt по убыванию долга"""
+    rows = conn.execute(BALANCE_DEBTORS, {'min_debt': max(min_debt, EPSILON), 'limit': limit})
+    return [Debtor(*row) for row in rows]
+
+
+class Reconciliation(NamedTuple):
+    rentals: int  # проверено аренд
+    rental_mismatches: list  # [(rental_id, (charged, paid) в таблице, (charged, paid) по пересчету)]
+    client_mismatches: list  # [(client_id, в таблице, по пересчету)]
+
+    @property
+    def ok(self):
+        return not self.rental_mismatches and not self.client_mismatches
+
+
+def reconcile_balances(conn: Connection, limit=100):
+    """Сверяет балансы с полным пересчетом; возвращает до limit расхождений каждого вида"""
+    rentals = conn.execute('SELECT COUNT(*) FROM rentals').fetchone()[0]
+    rental_mismatches = [
+        (rental_id, (charged, paid), (expected_charged, expected_paid))
+        for rental_id, charged, paid, expected_charged, expected_paid in conn.execute(f'''
+        WITH expected AS ({_RENTAL_TOTALS})
+        SELECT e.rental_id, b.charged, b.paid, e.charged, e.paid
+        FROM expected e
+        LEFT JOIN rental_balances b ON b.rental_id = e.rental_id
+        WHERE b.rental_id IS NULL OR b.client_id != e.client_id
+           OR abs(b.charged - e.charged) > :eps OR abs(b.paid - e.paid) > :eps
+        UNION ALL
+        SELECT b.rental_id, b.charged, b.paid, NULL, NULL
+        FROM rental_balances b
+        WHERE NOT EXISTS (SELECT 1 FROM rentals r WHERE r.rental_id = b.rental_id)
+        LIMIT :limit''', {'eps': EPSILON, 'limit': limit})]
+    client_mismatches = [
+        (client_id, (charged, paid), (expected_charged, expected_paid))
+        for client_id, charged, paid, expected_charged, expected_paid in conn.execute(f'''
+        WITH expected AS (
+            SELECT client_id, SUM(charged) AS charged, SUM(paid) AS paid
+            FROM ({_RENTAL_TOTALS})
+            GROUP BY client_id
+        )
+        SELECT e.client_id, b.charged, b.paid, e.charged, e.paid
+        FROM expected e
+        LEFT JOIN client_balances b ON b.client_id = e.client_id
+        WHERE b.client_id IS NULL
+           OR abs(b.charged - e.charged) > :eps OR abs(b.paid - e.paid) > :eps
+        LIMIT :limit''', {'eps': EPSILON, 'limit': limit})]
+    return Reconciliation(rentals, rental_mismatches, client_mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='файл базы (по умолчанию - база приложения)')
+    parser.add_argument('--debtors', type=float, metavar='СУММА', help='должники с долгом больше суммы')
+    parser.add_argument('--limit', type=int, default=DEBTORS_LIMIT)
+    parser.add_argument('--reconcile', action='store_true', help='сверка с полным пересчетом')
+    parser.add_argument('--fix', action='store_true', help='пересчитать балансы при расхождениях')
+    args = parser.parse_args()
+
+    from database.connection import get_db_connection
+
+    conn = get_db_connection(args.db)
+    try:
+        if args.debtors is not None:
+            for debtor in clients_with_debt(conn, args.debtors, args.limit):
+                print(f"{debtor.client_id:>8} {debtor.client:<30} {debtor.phone or '':<18} "
+                      f"долг {debtor.debt:>12,.2f} руб.")
+        if not args.reconcile:
+            return 0
+        result = reconcile_balances(conn)
+        for kind, mismatches in (('аренда', result.rental_mismatches),
+                                 ('клиент', result.client_mismatches)):
+            for key, stored, expected in mismatches:
+                print(f"РАСХОЖДЕНИЕ {kind} {key}: в таблице {stored}, по пересчету {expected}")
+        print(f"Проверено аренд: {result.rentals}, расхождений: "
+              f"{len(result.rental_mismatches)} по арендам, {len(result.client_mismatches)} по клиентам")
+        if result.ok:
+            return 0
+        if args.fix:
+            rebuild_balances(conn)
+            conn.commit()
+            print("Балансы пересчитаны")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
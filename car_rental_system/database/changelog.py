@@ -0,0 +1,116 @@
+"""Журнал изменений строк для инкрементального обновления интерфейса.
+
+Триггеры на отслеживаемых таблицах записывают в changelog (таблица, id строки,
+операция) с возрастающим seq. Клиент запоминает последний увиденный seq и
+забирает только изменения после него - это дешевле, чем перечитывать списки,
+и позволяет другим терминалам замечать изменения опросом.
+"""
+import sys
+from pathlib import Path
+from sqlite3 import Connection
+from typing import NamedTuple
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.queries import (CHANGELOG_LAST_SEQ, CHANGELOG_MARK_RELOAD, CHANGELOG_MIN_SEQ,
+                              CHANGELOG_PRUNE, CHANGELOG_SINCE)
+
+# Таблица -> первичный ключ
+TRACKED_TABLES = {
+    'cars': 'car_id',
+    'clients': 'client_id',
+    'rentals': 'rental_id',
+    'categories': 'category_id',
+}
+
+MAX_CHANGES = 5000  # Больше изменений за раз - дешевле перечитать списки
+KEEP_CHANGES = 100000  # Сколько последних записей журнала хранить
+
+_EVENTS = {'INSERT': ('I', 'NEW'), 'UPDATE': ('U', 'NEW'), 'DELETE': ('D', 'OLD')}
+
+
+def create_changelog(conn: Connection):
+    """Создает журнал изменений и триггеры на отслеживаемых таблицах"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS changelog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL CHECK(op IN ('I', 'U', 'D', 'R')),
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    create_changelog_triggers(conn)
+
+
+def create_changelog_triggers(conn: Connection):
+    for table, key in TRACKED_TABLES.items():
+        for event, (op, row) in _EVENTS.items():
+            conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS changelog_{table}_{op.lower()} AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO changelog (table_name, row_id, op) VALUES ('{table}', {row}.{key}, '{op}');
+            END''')
+
+
+def drop_changelog_triggers(conn: Connection):
+    """Отключает журнал на время массовой загрузки; возвращает True, если он был включен"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'changelog\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+    return bool(names)
+
+
+def mark_full_reload(conn: Connection):
+    """Запись 'R': изменения не журналировались, клиенты должны перечитать списки"""
+    conn.execute(CHANGELOG_MARK_RELOAD)
+
+
+def current_seq(conn: Connection):
+    return conn.execute(CHANGELOG_LAST_SEQ).fetchone()[0]
+
+
+class ChangeSet(NamedTuple):
+    seq: int
+    full_reload: bool
+    changes: dict  # таблица -> {id строки: последняя операция 'I'/'U'/'D'}
+
+
+def changes_since(conn: Connection, seq, limit=MAX_CHANGES):
+    """Изменения после seq, схлопнутые до последней операции над каждой строкой.
+
+    full_reload=True, если часть журнала уже удалена, изменений слишком много
+    или была массовая загрузка.
+    """
+    min_seq = conn.execute(CHANGELOG_MIN_SEQ).fetchone()[0]
+    if min_seq is not None and seq < min_seq - 1:
+        return ChangeSet(current_seq(conn), True, {})
+
+    rows = conn.execute(CHANGELOG_SINCE, (seq, limit + 1)).fetchall()
+    if not rows:
+        return ChangeSet(seq, False, {})
+    if len(rows) > limit or any(op == 'R' for _, _, _, op in rows):
+        return ChangeSet(current_seq(conn), True, {})
+
+    changes = {}
+    for _, table, row_id, op in rows:
+        changes.setdefault(table, {})[row_id] = op
+    return ChangeSet(rows[-1][0], False, changes)
+
+
+def prune_changelog(conn: Connection, keep=KEEP_CHANGES):
+    """Удаляет старые записи журнала, оставляя последние keep (минимум одну)"""
+    cursor = conn.execute(CHANGELOG_PRUNE, (max(keep, 1),))
+    return cursor.rowcount
+
+
+if __name__ == "__main__":
+    from database.connection import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        print(f"Удалено записей журнала: {prune_changelog(conn)}")
+        conn.commit()
+    finally:
+        conn.close()
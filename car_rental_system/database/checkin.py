@@ -0,0 +1,110 @@
+"""Пакетный прием автомобилей (завершение аренд).
+
+Возвраты за смену - пары (rental_id, фактическая дата возврата) из CSV или
+из выделенных строк списка. Аренды читаются пакетами по первичному ключу,
+штрафы за опоздание считаются одним проходом по закэшированным тарифам,
+а аренды и автомобили обновляются executemany в одной транзакции.
+"""
+import csv
+from datetime import datetime
+from sqlite3 import Connection
+from typing import NamedTuple
+
+from database.availability import sync_car_status
+from database.pagination import IDS_CHUNK
+from database.queries import RENTAL_COMPLETE, RENTALS_FOR_CHECK_IN
+
+CHECK_IN_STATUSES = ('active', 'overdue')
+
+
+class CheckIn(NamedTuple):
+    rental_id: int
+    car_id: int
+    actual_end_date: str
+    extra_days: int
+    penalty: float
+    total_cost: float
+
+
+class CheckInResult(NamedTuple):
+    completed: list  # [CheckIn]
+    rejected: list  # [(rental_id, причина)]
+
+
+def _parse_date(value):
+    return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+
+
+def parse_returns(lines):
+    """Пары (rental_id, 'ГГГГ-ММ-ДД') из строк CSV 'id;дата' или 'id,дата'.
+
+    Строка заголовка пропускается. Возвращает (пары, [(номер строки, ошибка)]).
+    """
+    returns, errors = [], []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        fields = next(csv.reader([line], delimiter=';' if ';' in line else ','))
+        if number == 1 and not fields[0].strip().isdigit():
+            continue  # заголовок
+        try:
+            rental_id, actual_end_date = fields[:2]
+            returns.append((int(rental_id), _parse_date(actual_end_date).isoformat()))
+        except ValueError:
+            errors.append((number, f"ожидается 'номер аренды;ГГГГ-ММ-ДД': {line}"))
+    return returns, errors
+
+
+def _load_rentals(conn: Connection, ids):
+    rentals = {}
+    for start in range(0, len(ids), IDS_CHUNK):
+        chunk = ids[start:start + IDS_CHUNK]
+        sql = RENTALS_FOR_CHECK_IN.format(placeholders=', '.join('?' * len(chunk)))
+        rentals.update((row[0], tuple(row)) for row in conn.execute(sql, chunk))
+    return rentals
+
+
+def check_in_rentals(conn: Connection, returns, pricing):
+    """Завершает аренды по парам (rental_id, фактическая дата возврата).
+
+    Все изменения выполняются в одной транзакции, которую фиксирует
+    вызывающий (conn.commit()). Аренды, которые нельзя завершить,
+    попадают в rejected и не мешают остальным.
+    """
+    # Блокировка записи берется до чтения: аренду не завершат параллельно
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+
+    returns = list(returns)
+    rentals = _load_rentals(conn, list({rental_id for rental_id, _ in returns}))
+    accepted, rejected, seen = [], [], set()
+    for rental_id, actual_end_date in returns:
+        rental = rentals.get(rental_id)
+        if rental_id in seen:
+            rejected.append((rental_id, "повторяется в списке"))
+            continue
+        seen.add(rental_id)
+        if rental is None:
+            rejected.append((rental_id, "аренда не найдена"))
+            continue
+        _, car_id, start_date, end_date, planned_cost, status, returned = rental
+        actual = _parse_date(actual_end_date)
+        if status not in CHECK_IN_STATUSES or returned:
+            rejected.append((rental_id, f"аренда уже не активна ({status})"))
+        elif actual < _parse_date(start_date[:10]):
+            rejected.append((rental_id, "дата возврата раньше начала аренды"))
+        else:
+            extra_days = max((actual - _parse_date(end_date[:10])).days, 0)
+            accepted.append((rental_id, car_id, actual.isoformat(), extra_days, planned_cost))
+
+    penalties = pricing.late_penalties(conn, [(car_id, extra_days)
+                                              for _, car_id, _, extra_days, _ in accepted])
+    completed = [CheckIn(rental_id, car_id, actual_end_date, extra_days, penalty, planned_cost + penalty)
+                 for (rental_id, car_id, actual_end_date, extra_days, planned_cost), penalty
+                 in zip(accepted, penalties)]
+
+    conn.executemany(RENTAL_COMPLETE, [(c.actual_end_date, c.total_cost, c.rental_id) for c in completed])
+    # У автомобиля могут оставаться другие брони - статус по ним, а не 'available'
+    sync_car_status(conn, [c.car_id for c in completed])
+    return CheckInResult(completed, rejected)
@@ -0,0 +1,127 @@
+"""Полнотекстовый поиск клиентов (FTS5).
+
+clients_fts - индекс по словам ФИО, телефона, документов и email: поиск по
+префиксам слов с ранжированием bm25. clients_trigram - триграммный индекс
+телефона и документов без разделителей для поиска по фрагменту из середины
+номера. Оба индекса поддерживаются триггерами на clients.
+"""
+import re
+from sqlite3 import Connection
+
+from database.queries import CLIENTS_SEARCH_FTS, CLIENTS_SEARCH_TRIGRAM
+
+SEARCH_LIMIT = 200
+SEARCH_CANDIDATES = 2000  # Сколько лучших совпадений присоединять к clients
+
+# Столбцы индекса по словам (их веса в bm25 - в CLIENTS_SEARCH_FTS)
+_FTS_COLUMNS = ('last_name', 'first_name', 'phone', 'passport_number', 'driver_license', 'email')
+_TRIGRAM_COLUMNS = ('phone', 'passport_number', 'driver_license')
+
+# Разделители в номерах: '+7 (912) 345-67-89' и '4510 123456' индексируются без них
+_SEPARATORS = (' ', '-', '(', ')', '+')
+_SEPARATORS_RE = re.compile(r'[\s\-()+]')
+_WORD_RE = re.compile(r'\w+')
+
+
+def _compact_sql(expr):
+    for separator in _SEPARATORS:
+        expr = f"replace({expr}, '{separator}', '')"
+    return expr
+
+
+def _fts_values(row):
+    return ', '.join(f'{row}.{column}' for column in _FTS_COLUMNS)
+
+
+def _trigram_values(row):
+    return ', '.join(_compact_sql(f'{row}.{column}') for column in _TRIGRAM_COLUMNS)
+
+
+def create_client_search_index(conn: Connection):
+    """Создает индексы поиска клиентов, триггеры синхронизации и заполняет их"""
+    columns = ', '.join(_FTS_COLUMNS)
+    conn.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+        {columns},
+        content='clients', content_rowid='client_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''')
+    # Значения без разделителей не совпадают со столбцами clients,
+    # поэтому триграммный индекс хранит их сам
+    conn.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS clients_trigram USING fts5(
+        {', '.join(_TRIGRAM_COLUMNS)}, tokenize='trigram'
+    )''')
+    create_client_search_triggers(conn)
+    rebuild_client_search_index(conn)
+
+
+def create_client_search_triggers(conn: Connection):
+    columns = ', '.join(_FTS_COLUMNS)
+    trigram_columns = ', '.join(_TRIGRAM_COLUMNS)
+    delete_old = f'''
+        INSERT INTO clients_fts (clients_fts, rowid, {columns})
+        VALUES ('delete', OLD.client_id, {_fts_values('OLD')});
+        DELETE FROM clients_trigram WHERE rowid = OLD.client_id;'''
+    insert_new = f'''
+        INSERT INTO clients_fts (rowid, {columns}) VALUES (NEW.client_id, {_fts_values('NEW')});
+        INSERT INTO clients_trigram (rowid, {trigram_columns})
+        VALUES (NEW.client_id, {_trigram_values('NEW')});'''
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS clients_search_ai AFTER INSERT ON clients
+    BEGIN {insert_new}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS clients_search_au AFTER UPDATE OF {columns} ON clients
+    BEGIN {delete_old} {insert_new}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS clients_search_ad AFTER DELETE ON clients
+    BEGIN {delete_old}
+    END''')
+
+
+def drop_client_search_triggers(conn: Connection):
+    """Отключает синхронизацию на время массовой загрузки; возвращает True, если она была"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'clients\\_search\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+    return bool(names)
+
+
+def rebuild_client_search_index(conn: Connection):
+    """Перестраивает индексы по текущему содержимому clients"""
+    conn.execute("INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')")
+    conn.execute('DELETE FROM clients_trigram')
+    conn.execute(f'''
+    INSERT INTO clients_trigram (rowid, {', '.join(_TRIGRAM_COLUMNS)})
+    SELECT client_id, {_trigram_values('clients')} FROM clients''')
+    conn.execute("INSERT INTO clients_fts (clients_fts) VALUES ('optimize')")
+    conn.execute("INSERT INTO clients_trigram (clients_trigram) VALUES ('optimize')")
+
+
+def _fts_query(text):
+    """'Иван петр' -> '"иван"* "петр"*': все слова, каждое - как префикс"""
+    return ' '.join(f'"{word}"*' for word in _WORD_RE.findall(text.lower()))
+
+
+def search_clients(conn: Connection, text, limit=SEARCH_LIMIT):
+    """Клиенты, у которых каждое слово запроса - начало слова в ФИО, телефоне,
+    документах или email; лучшие совпадения первыми. Фрагменты номеров
+    (от 3 символов, в том числе из середины) ищутся по триграммам.
+    При очень широком запросе к clients присоединяются SEARCH_CANDIDATES лучших."""
+    query = _fts_query(text)
+    if not query:
+        return []
+    params = {'query': query, 'limit': limit, 'candidates': max(limit, SEARCH_CANDIDATES)}
+    rows = conn.execute(CLIENTS_SEARCH_FTS, params).fetchall()
+
+    fragment = _SEPARATORS_RE.sub('', text)
+    if len(rows) < limit and len(fragment) >= 3 and any(ch.isdigit() for ch in fragment):
+        found = {row[0] for row in rows}
+        trigram_query = '"' + fragment.replace('"', '""') + '"'
+        for row in conn.execute(CLIENTS_SEARCH_TRIGRAM, {**params, 'query': trigram_query}):
+            if row[0] not in found and len(rows) < limit:
+                rows.append(row)
+    return rows
@@ -1,20 +1,76 @@
-import sqlite3
+import atexit
+import os
+import threading
+from functools import partial
 from pathlib import Path
 
-def get_db_connection():
-    """Создает и возвращает соединение с базой данных"""
-    db_path = Path(__file__).parent / "car_rental.db"
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row  # Для доступа к полям по имени
-    return conn
+from database.instrumentation import connection_factory
+from database.pool import ConnectionPool, PooledConnection, ReadOnlyConnection
+from database.profiles import apply_profile, get_profile_name
+
+DB_PATH = Path(__file__).parent / "car_rental.db"
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_db_path(db_path=None):
+    """Путь к файлу базы данных (можно переопределить через CAR_RENTAL_DB)"""
+    return str(db_path or os.environ.get("CAR_RENTAL_DB") or DB_PATH)
+
+
+def get_pool(db_path=None, profile=None, read_only=False):
+    """Возвращает пул соединений для файла базы данных и профиля PRAGMA"""
+    key = (get_db_path(db_path), get_profile_name(profile), read_only)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            base = ReadOnlyConnection if read_only else PooledConnection
+            pool = _pools[key] = ConnectionPool(
+                key[0], setup=partial(apply_profile, name=key[1], read_only=read_only),
+                factory=connection_factory(base))
+        return pool
+
+
+def get_db_connection(db_path=None, profile=None):
+    """Выдает соединение с базой данных из пула.
+
+    conn.close() возвращает соединение в пул, а не закрывает его.
+    Профиль PRAGMA выбирается функцией database.profiles.get_profile_name.
+    """
+    return get_pool(db_path, profile).acquire()
+
+
+def get_read_connection(db_path=None, profile=None):
+    """Выдает соединение только для чтения из отдельного пула.
+
+    Для отчетов и списков: запись через него невозможна, а долгое чтение
+    в режиме WAL не задерживает фиксацию бронирований. Несколько запросов
+    одного снимка выполняются внутри conn.execute('BEGIN').
+    """
+    return get_pool(db_path, profile, read_only=True).acquire()
+
+
+def close_all_pools():
+    """Закрывает все пулы соединений (вызывается при выходе)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+atexit.register(close_all_pools)
+
 
 def init_db():
-    """Инициализирует базу данных (создает таблицы)"""
+    """Инициализирует базу данных (создает таблицы и применяет миграции)"""
     conn = get_db_connection()
     try:
         # Импортируем здесь, чтобы избежать циклических зависимостей
         from database.models import create_tables
+        from database.migrations import migrate
         create_tables(conn)
         print("Таблицы базы данных успешно созданы")
+        migrate(conn)
     finally:
         conn.close()
@@ -0,0 +1,174 @@
+"""Регистрация повреждений пакетом (итоги осмотра парка).
+
+Строки CSV 'номер аренды;описание;стоимость ремонта[;дата]' проверяются,
+автомобили определяются по арендам пакетными чтениями по первичному ключу,
+повреждения вставляются executemany, а удержания из депозитов применяются
+одним UPDATE по списку сумм - все в одной транзакции. Правило удержания
+то же, что в report_damage_dialog: стоимость ремонта вычитается из
+депозита аренды, если его хватает; повреждения одной аренды учитываются
+по порядку строк.
+
+Запуск из каталога car_rental_system:
+    python database/damages.py осмотр.csv [--db путь] [--dry-run]
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from sqlite3 import Connection
+from typing import NamedTuple
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.pagination import IDS_CHUNK
+from database.queries import DAMAGE_IMPORT, RENTAL_DEDUCT_DEPOSITS, RENTALS_FOR_DAMAGES
+
+DAMAGE_STATUSES = ('completed', 'overdue')  # Повреждения регистрируются после возврата
+
+
+class DamageRow(NamedTuple):
+    line: int  # номер строки файла
+    rental_id: int
+    description: str
+    repair_cost: float
+    reported_date: str  # None - сегодня
+
+
+class ImportedDamage(NamedTuple):
+    line: int
+    rental_id: int
+    car_id: int
+    description: str
+    repair_cost: float
+    reported_date: str
+    deducted: bool  # стоимость удержана из депозита
+
+
+class DamageImportResult(NamedTuple):
+    imported: list  # [ImportedDamage]
+    rejected: list  # [(номер строки, причина)]
+
+    @property
+    def deducted(self):
+        return sum(d.repair_cost for d in self.imported if d.deducted)
+
+
+def parse_damages(lines):
+    """Строки повреждений из CSV 'номер аренды;описание;стоимость[;ГГГГ-ММ-ДД]'.
+
+    Строка заголовка пропускается. Возвращает (строки, [(номер строки, ошибка)]).
+    """
+    rows, errors = [], []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        fields = [field.strip() for field in next(csv.reader([line], delimiter=';' if ';' in line else ','))]
+        if number == 1 and not fields[0].isdigit():
+            continue  # заголовок
+        try:
+            if len(fields) not in (3, 4):
+                raise ValueError
+            rental_id, description, cost = int(fields[0]), fields[1], float(fields[2].replace(' ', ''))
+            reported = datetime.strptime(fields[3], '%Y-%m-%d').date().isoformat() \
+                if len(fields) == 4 and fields[3] else None
+        except ValueError:
+            errors.append((number, f"ожидается 'номер аренды;описание;стоимость[;ГГГГ-ММ-ДД]': {line}"))
+            continue
+        if not description:
+            errors.append((number, "пустое описание"))
+        elif cost <= 0:
+            errors.append((number, "стоимость ремонта должна быть положительной"))
+        else:
+            rows.append(DamageRow(number, rental_id, description, cost, reported))
+    return rows, errors
+
+
+def _load_rentals(conn: Connection, ids):
+    rentals = {}
+    for start in range(0, len(ids), IDS_CHUNK):
+        chunk = ids[start:start + IDS_CHUNK]
+        sql = RENTALS_FOR_DAMAGES.format(placeholders=', '.join('?' * len(chunk)))
+        rentals.update((row[0], tuple(row[1:])) for row in conn.execute(sql, chunk))
+    return rentals
+
+
+def import_damages(conn: Connection, rows, employee_id=1):
+    """Регистрирует повреждения и удержания из депозитов.
+
+    Все изменения выполняются в одной транзакции, которую фиксирует
+    вызывающий (conn.commit()). Строки, которые нельзя принять, попадают
+    в rejected и не мешают остальным.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+
+    rows = list(rows)
+    rentals = _load_rentals(conn, list({row.rental_id for row in rows}))
+    deposits = {rental_id: deposit for rental_id, (_, _, deposit) in rentals.items()}
+    imported, rejected = [], []
+    for row in rows:
+        rental = rentals.get(row.rental_id)
+        if rental is None:
+            rejected.append((row.line, f"аренда #{row.rental_id} не найдена"))
+            continue
+        car_id, status, _ = rental
+        if status not in DAMAGE_STATUSES:
+            rejected.append((row.line, f"аренда #{row.rental_id} не завершена ({status})"))
+            continue
+        deducted = deposits[row.rental_id] >= row.repair_cost
+        if deducted:
+            deposits[row.rental_id] -= row.repair_cost
+        imported.append(ImportedDamage(row.line, row.rental_id, car_id, row.description,
+                                       row.repair_cost, row.reported_date, deducted))
+
+    conn.executemany(DAMAGE_IMPORT, [
+        (d.rental_id, d.car_id, d.description, d.repair_cost, d.reported_date, employee_id)
+        for d in imported])
+    deductions = {}
+    for d in imported:
+        if d.deducted:
+            deductions[d.rental_id] = deductions.get(d.rental_id, 0) + d.repair_cost
+    if deductions:
+        conn.execute(RENTAL_DEDUCT_DEPOSITS, (json.dumps(list(deductions.items())),))
+    return DamageImportResult(imported, rejected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('file', help='CSV: номер аренды;описание;стоимость[;дата]')
+    parser.add_argument('--db', help='файл базы (по умолчанию - база приложения)')
+    parser.add_argument('--dry-run', action='store_true', help='проверить и откатить')
+    args = parser.parse_args()
+
+    from database.connection import get_db_connection
+
+    with open(args.file, encoding='utf-8-sig') as file:
+        rows, errors = parse_damages(file)
+    conn = get_db_connection(args.db)
+    try:
+        started = time.perf_counter()
+        result = import_damages(conn, rows)
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    for number, reason in sorted(errors + result.rejected):
+        print(f"Строка {number}: {reason}")
+    print(f"{'Проверено' if args.dry_run else 'Зарегистрировано'} повреждений: {len(result.imported)} "
+          f"за {elapsed:.3f} с ({len(result.imported) / max(elapsed, 1e-9):,.0f} строк/с), "
+          f"удержано из депозитов {result.deducted:,.2f} руб.; отклонено строк: "
+          f"{len(errors) + len(result.rejected)}")
+    return 1 if errors or result.rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""Замеры запросов SQLite: задержки по запросам и действиям интерфейса.
+
+Включается переменной окружения CAR_RENTAL_DB_TRACE=1 или параметром
+trace = yes секции [sqlite] в ~/.car_rental_config.ini. Тогда соединения
+создаются классом TracedConnection: время каждого запроса (выполнение и
+чтение строк), число строк и шагов виртуальной машины SQLite (обработчик
+прогресса) копятся в гистограммах по нормализованному SQL и действию,
+которое его вызвало. Запросы дольше slow_ms пишутся в журнал медленных
+запросов вместе с подставленными параметрами (из set_trace_callback),
+сводка выводится при выходе из программы.
+
+Параметры (переменная окружения / ключ секции [sqlite]):
+    CAR_RENTAL_DB_SLOW_MS / slow_ms        порог медленного запроса, мс (100)
+    CAR_RENTAL_DB_SLOW_LOG / slow_log      файл журнала медленных запросов
+    CAR_RENTAL_DB_STATS / stats_file       JSON со сводкой (по умолчанию не пишется)
+"""
+import atexit
+import configparser
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+# Относительно: модуль импортируется и как database.instrumentation, и как
+# car_rental_system.database.instrumentation (магазин, sales_in_the_store)
+from .profiles import CONFIG_PATH
+
+# Верхние границы корзин гистограммы, мс
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+PROGRESS_STEPS = 1000  # Обработчик прогресса вызывается раз в столько инструкций VM
+SUMMARY_TOP = 30
+
+DEFAULT_SLOW_MS = 100.0
+DEFAULT_SLOW_LOG = Path.home() / ".car_rental_slow_queries.log"
+
+_ENV = {
+    'trace': 'CAR_RENTAL_DB_TRACE',
+    'slow_ms': 'CAR_RENTAL_DB_SLOW_MS',
+    'slow_log': 'CAR_RENTAL_DB_SLOW_LOG',
+    'stats_file': 'CAR_RENTAL_DB_STATS',
+}
+
+
+@lru_cache(maxsize=None)
+def _setting(key):
+    """Значение из окружения или секции [sqlite] файла конфигурации"""
+    value = os.environ.get(_ENV[key])
+    if value is None and CONFIG_PATH.exists():
+        cfg = configparser.ConfigParser()
+        cfg.read(CONFIG_PATH)
+        value = cfg.get("sqlite", key, fallback=None)
+    return value
+
+
+def is_enabled():
+    return (_setting('trace') or '').strip().lower() in ('1', 'yes', 'true', 'on')
+
+
+# ========== Нормализация SQL ==========
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMS_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Текст запроса без литералов и лишних пробелов; IN (?, ?, ...) - как IN (?...)"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _SPACE_RE.sub(' ', sql).strip()
+    return _PARAMS_LIST_RE.sub('(?...)', sql)
+
+
+# ========== Действие интерфейса ==========
+_local = threading.local()
+
+
+@contextmanager
+def action(name):
+    """Запросы внутри блока относятся к действию name (например, задаче DbWorker)"""
+    previous = getattr(_local, 'action', None)
+    _local.action = name
+    try:
+        yield
+    finally:
+        _local.action = previous
+
+
+def current_action():
+    """Явно заданное действие или ближайшая функция вне этого модуля в стеке вызовов"""
+    name = getattr(_local, 'action', None)
+    if name:
+        return name
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return '?'
+    code = frame.f_code
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+# ========== Статистика ==========
+class QueryStats:
+    """Гистограмма задержек одного запроса в одном действии"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.vm_steps = 0
+        self.buckets = [0] * len(BUCKETS_MS)
+
+    def add(self, elapsed_ms, rows, vm_steps):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.vm_steps += vm_steps
+        self.buckets[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, pct):
+        """Верхняя граница корзины, в которую попадает перцентиль pct"""
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'vm_steps': self.vm_steps,
+            'histogram': dict(zip(map(str, BUCKETS_MS), self.buckets)),
+        }
+
+
+class Recorder:
+    """Общая для всех соединений процесса статистика и журнал медленных запросов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # (действие, нормализованный SQL) -> QueryStats
+        self._registered = False
+        self.slow_ms = float(_setting('slow_ms') or DEFAULT_SLOW_MS)
+        self.slow_log = Path(_setting('slow_log') or DEFAULT_SLOW_LOG)
+
+    def record(self, action_name, sql, elapsed_ms, rows, vm_steps, expanded_sql=None):
+        key = (action_name, normalize_sql(sql))
+        with self._lock:
+            if not self._registered:
+                atexit.register(self.dump)
+                self._registered = True
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats()
+            stats.add(elapsed_ms, rows, vm_steps)
+        if elapsed_ms >= self.slow_ms:
+            self._log_slow(action_name, expanded_sql or sql, elapsed_ms, rows, vm_steps)
+
+    def _log_slow(self, action_name, sql, elapsed_ms, rows, vm_steps):
+        line = (f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{elapsed_ms:.1f} мс\t{action_name}\t"
+                f"строк: {rows}\tшагов VM: ~{vm_steps}\t{_SPACE_RE.sub(' ', sql).strip()}\n")
+        try:
+            with self._lock, open(self.slow_log, 'a', encoding='utf-8') as file:
+                file.write(line)
+        except OSError:
+            pass
+
+    def snapshot(self):
+        """[(действие, SQL, QueryStats)] по убыванию суммарного времени"""
+        with self._lock:
+            items = [(a, sql, stats) for (a, sql), stats in self._stats.items()]
+        return sorted(items, key=lambda item: item[2].total_ms, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self, top=SUMMARY_TOP):
+        items = self.snapshot()
+        total = sum(stats.total_ms for _, _, stats in items) or 1
+        lines = [f"Замеры запросов: {len(items)} видов, {total:.0f} мс всего",
+                 f"{'всего, мс':>10} {'доля':>6} {'вызовов':>8} {'p50':>8} {'p95':>8} "
+                 f"{'макс':>8} {'строк':>9}  действие / запрос"]
+        for action_name, sql, stats in items[:top]:
+            lines.append(f"{stats.total_ms:10.1f} {stats.total_ms / total:6.1%} {stats.count:8d} "
+                         f"{stats.percentile(50):8.2f} {stats.percentile(95):8.2f} "
+                         f"{stats.max_ms:8.2f} {stats.rows:9d}  {action_name}: {sql[:100]}")
+        return '\n'.join(lines)
+
+    def dump(self):
+        """Сводка в stderr и, если задан stats_file, в JSON"""
+        items = self.snapshot()
+        if not items:
+            return
+        print(self.summary(), file=sys.stderr)
+        stats_file = _setting('stats_file')
+        if stats_file:
+            data = [{'action': a, 'sql': sql, **stats.as_dict()} for a, sql, stats in items]
+            with open(stats_file, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False, indent=2)
+
+
+RECORDER = Recorder()
+
+
+# ========== Соединение и курсор с замерами ==========
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий запрос от execute до последней прочитанной строки"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sql = None
+
+    def _start(self, sql):
+        self._finish()
+        self._sql = sql
+        self._action = current_action()
+        self._elapsed = 0.0
+        self._rows = 0
+        self._expanded = None
+        self._steps = self.connection._steps
+        self.connection._trace = None
+
+    def _finish(self):
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        rows = self._rows if self._rows or self.rowcount < 0 else self.rowcount
+        RECORDER.record(self._action, sql, self._elapsed * 1000, rows,
+                        self.connection._steps - self._steps, self._expanded)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        try:
+            return self._timed(super().execute, sql, parameters)
+        except Exception:
+            self._finish()
+            raise
+        finally:
+            self._expanded = self.connection._trace
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        try:
+            return self._timed(super().executemany, sql, seq_of_parameters)
+        finally:
+            self._finish()
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все запросы которого замеряются (см. описание модуля)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._steps = 0  # шагов VM с открытия соединения (с точностью до PROGRESS_STEPS)
+        self._trace = None
+        self.set_trace_callback(self._on_trace)
+        self.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+
+    def _on_trace(self, statement):
+        # Первый вызов после запуска запроса - сам запрос с подставленными
+        # параметрами, следующие - неявный BEGIN и программы триггеров
+        if self._trace is None and statement.strip() != 'BEGIN':
+            self._trace = statement
+
+    def _on_progress(self):
+        self._steps += PROGRESS_STEPS
+        return 0
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute создает курсор в обход cursor(), поэтому переопределены
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _timed_end(self, method, statement):
+        if not self.in_transaction:
+            return method()
+        steps = self._steps
+        started = time.perf_counter()
+        try:
+            return method()
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            RECORDER.record(current_action(), statement, elapsed_ms, 0, self._steps - steps)
+
+    def commit(self):
+        return self._timed_end(super().commit, 'COMMIT')
+
+    def rollback(self):
+        return self._timed_end(super().rollback, 'ROLLBACK')
+
+
+_traced_classes = {sqlite3.Connection: TracedConnection}
+
+
+def connection_factory(base=sqlite3.Connection):
+    """Класс соединения для sqlite3.connect(factory=...): base или, если замеры
+    включены, его вариант с замерами"""
+    if not is_enabled():
+        return base
+    cls = _traced_classes.get(base)
+    if cls is None:
+        cls = _traced_classes[base] = type(f'Traced{base.__name__}', (TracedConnection, base), {})
+    return cls
@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+from sqlite3 import Connection
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.availability import create_interval_index
+from database.balances import create_balances
+from database.changelog import create_changelog
+from database.client_search import create_client_search_index
+from database.models import create_indexes
+from database.overdue import create_overdue_sweeps
+from database.pricing import create_pricing_triggers
+from database.rollups import create_rollups
+
+
+def _secondary_indexes(conn: Connection):
+    create_indexes(conn)
+    conn.execute('ANALYZE')
+
+
+# Версия схемы хранится в PRAGMA user_version.
+# Миграции применяются по порядку, каждая - в своей транзакции.
+MIGRATIONS = [
+    (1, 'Вторичные индексы', _secondary_indexes),
+    (2, 'R*Tree-индекс интервалов аренд', create_interval_index),
+    (3, 'Версия тарифов для кэша расчета стоимости', create_pricing_triggers),
+    (4, 'Журнал изменений строк', create_changelog),
+    (5, 'Полнотекстовый поиск клиентов', create_client_search_index),
+    (6, 'Сводные таблицы отчетов', create_rollups),
+    (7, 'Журнал проходов по просроченным арендам', create_overdue_sweeps),
+    (8, 'Балансы расчетов по арендам и клиентам', create_balances),
+]
+
+
+def get_schema_version(conn: Connection):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: Connection):
+    """Применяет недостающие миграции и возвращает итоговую версию схемы"""
+    version = get_schema_version(conn)
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            conn.execute('BEGIN')
+            apply(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Миграция {number} применена: {description}")
+        version = number
+    return version
+
+
+if __name__ == "__main__":
+    from database.connection import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        print(f"Версия схемы: {migrate(conn)}")
+    finally:
+        conn.close()
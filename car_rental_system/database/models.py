@@ -136,3 +136,34 @@ def create_tables(conn: Connection):
     )''')
     
     conn.commit()
+
+
+# Вторичные индексы под фильтры и соединения интерфейса и отчетов
+INDEXES = {
+    'idx_rentals_car_status': 'rentals(car_id, status)',
+    'idx_rentals_client': 'rentals(client_id)',
+    'idx_rentals_start_date': 'rentals(start_date)',
+    'idx_payments_rental': 'payments(rental_id)',
+    'idx_damages_car': 'damages(car_id)',
+    'idx_rental_services_service': 'rental_services(service_id)',
+    'idx_cars_status': 'cars(status)',
+    'idx_clients_name': 'clients(last_name, first_name)',
+    # Частичный индекс - текущие (активные и просроченные) аренды в порядке срока возврата
+    'idx_rentals_current': "rentals(end_date) WHERE status IN ('active', 'overdue')",
+    # Активные аренды по сроку возврата - очередь для перевода в overdue
+    'idx_rentals_active_due': "rentals(end_date) WHERE status = 'active'",
+    # Невозвращенные просроченные аренды - для начисления штрафов
+    'idx_rentals_overdue_open': "rentals(car_id) WHERE status = 'overdue' AND actual_end_date IS NULL",
+}
+
+
+def create_indexes(conn: Connection):
+    """Создает вторичные индексы (повторный вызов безопасен)"""
+    for name, target in INDEXES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def drop_indexes(conn: Connection):
+    """Удаляет вторичные индексы (перед массовой загрузкой данных)"""
+    for name in INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
@@ -0,0 +1,121 @@
+"""Перевод аренд с прошедшим сроком возврата в статус overdue.
+
+Активные аренды с end_date раньше текущего момента помечаются пакетами по
+chunk_size строк: каждый пакет - один UPDATE по частичному индексу
+idx_rentals_active_due в своей транзакции, поэтому блокировка записи
+держится недолго даже при очереди из сотен тысяч аренд. Штраф по
+невозвращенным просроченным арендам начисляется по тому же правилу, что и
+при завершении аренды (RentalPricingEngine.late_penalty). Каждый проход
+записывается в overdue_sweeps и заодно обрезает журнал изменений до
+последних KEEP_CHANGES записей (database/changelog.py): иначе он растет
+с каждой записью в отслеживаемые таблицы.
+
+Запуск из каталога car_rental_system:
+    python database/overdue.py               # один проход
+    python database/overdue.py --every 600   # проход каждые 10 минут
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from sqlite3 import Connection
+from typing import NamedTuple
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.changelog import prune_changelog
+from database.models import create_indexes
+from database.pricing import RentalPricingEngine
+from database.queries import OVERDUE_ACCRUED, OVERDUE_FLAG_CHUNK, OVERDUE_SWEEP_LOG
+
+CHUNK_SIZE = 1000  # ~0.2 с блокировки записи на пакет вместе с триггерами R*Tree и журнала
+
+
+def create_overdue_sweeps(conn: Connection):
+    """Создает журнал проходов и индекс очереди активных аренд"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS overdue_sweeps (
+        sweep_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        swept_at TIMESTAMP NOT NULL,
+        duration_ms REAL NOT NULL,
+        rows_flagged INTEGER NOT NULL,
+        chunks INTEGER NOT NULL,
+        overdue_rentals INTEGER NOT NULL,
+        penalty_accrued REAL NOT NULL
+    )''')
+    create_indexes(conn)
+
+
+class SweepResult(NamedTuple):
+    flagged: int  # аренд переведено в overdue за проход
+    chunks: int
+    overdue: int  # невозвращенных просроченных аренд после прохода
+    penalty: float  # начисленный по ним штраф на момент прохода
+    duration: float  # секунды
+    pruned: int  # удалено старых записей журнала изменений
+
+
+def _timestamp(now):
+    return (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def accrued_penalties(conn: Connection, pricing: RentalPricingEngine, now=None):
+    """Число невозвращенных просроченных аренд и начисленный по ним штраф"""
+    rows = conn.execute(OVERDUE_ACCRUED, {'now': _timestamp(now)}).fetchall()
+    penalties = pricing.late_penalties(conn, [(car_id, days) for car_id, _, days in rows])
+    return sum(row[1] for row in rows), sum(penalties)
+
+
+def sweep_overdue(conn: Connection, pricing=None, now=None, chunk_size=CHUNK_SIZE):
+    """Помечает просроченные активные аренды и записывает проход в overdue_sweeps"""
+    pricing = pricing or RentalPricingEngine()
+    timestamp = _timestamp(now)
+    started = time.perf_counter()
+    flagged = chunks = 0
+    while True:
+        cursor = conn.execute(OVERDUE_FLAG_CHUNK, {'now': timestamp, 'limit': chunk_size})
+        conn.commit()  # Блокировка записи освобождается после каждого пакета
+        chunks += 1
+        flagged += cursor.rowcount
+        if cursor.rowcount < chunk_size:
+            break
+    overdue, penalty = accrued_penalties(conn, pricing, now)
+    duration = time.perf_counter() - started
+    conn.execute(OVERDUE_SWEEP_LOG, (timestamp, duration * 1000, flagged, chunks, overdue, penalty))
+    conn.commit()
+    pruned = prune_changelog(conn)
+    conn.commit()
+    return SweepResult(flagged, chunks, overdue, penalty, duration, pruned)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='файл базы (по умолчанию - база приложения)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='аренд в одной транзакции')
+    parser.add_argument('--every', type=float, metavar='СЕКУНДЫ',
+                        help='повторять проход с этим интервалом')
+    args = parser.parse_args()
+
+    from database.connection import get_db_connection
+
+    pricing = RentalPricingEngine()
+    while True:
+        conn = get_db_connection(args.db)
+        try:
+            result = sweep_overdue(conn, pricing, chunk_size=args.chunk_size)
+        finally:
+            conn.close()
+        print(f"{_timestamp(None)}: помечено просроченными {result.flagged} "
+              f"(пакетов: {result.chunks}) за {result.duration:.2f} с; "
+              f"не возвращено {result.overdue}, штраф {result.penalty:,.2f} руб.; "
+              f"удалено записей журнала: {result.pruned}")
+        if args.every is None:
+            return 0
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
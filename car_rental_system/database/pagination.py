@@ -0,0 +1,88 @@
+"""Постраничное чтение списков вкладок по ключу сортировки (keyset pagination).
+
+Следующая страница начинается сразу после ключа последней прочитанной
+строки и читается по индексу, поэтому ее стоимость не зависит от глубины
+прокрутки, а в памяти одновременно держится только одна страница.
+"""
+from sqlite3 import Connection
+from typing import Callable, NamedTuple, Optional
+
+from database.queries import (CARS_BY_IDS, CARS_PAGE_AFTER, CARS_PAGE_FIRST, CLIENTS_BY_IDS,
+                              CLIENTS_PAGE_AFTER, CLIENTS_PAGE_FIRST, RENTALS_BY_IDS,
+                              RENTALS_PAGE_AFTER, RENTALS_PAGE_FIRST, TABLE_ROWS_ESTIMATE)
+
+PAGE_SIZE = 200
+IDS_CHUNK = 500  # Не больше параметров в одном IN (...)
+
+
+class PagedQuery(NamedTuple):
+    table: str
+    first_sql: str
+    after_sql: str
+    by_ids_sql: str
+    key: Callable  # параметры *_PAGE_AFTER по строке; порядок значений - порядок сортировки
+    descending: bool = False
+
+
+PAGED_QUERIES = {
+    'cars': PagedQuery('cars', CARS_PAGE_FIRST, CARS_PAGE_AFTER, CARS_BY_IDS,
+                       lambda row: {'car_id': row[0]}),
+    'clients': PagedQuery('clients', CLIENTS_PAGE_FIRST, CLIENTS_PAGE_AFTER, CLIENTS_BY_IDS,
+                          lambda row: {'last_name': row[1], 'first_name': row[2],
+                                       'client_id': row[0]}),
+    'rentals': PagedQuery('rentals', RENTALS_PAGE_FIRST, RENTALS_PAGE_AFTER, RENTALS_BY_IDS,
+                          lambda row: {'start_date': row[3], 'rental_id': row[0]},
+                          descending=True),
+}
+
+
+class Page(NamedTuple):
+    rows: list
+    after: Optional[dict]  # ключ для следующей страницы; None - это последняя страница
+
+
+def fetch_page(conn: Connection, name, after=None, limit=PAGE_SIZE):
+    """Страница списка name ('cars', 'clients', 'rentals') после ключа after"""
+    query = PAGED_QUERIES[name]
+    # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+    if after is None:
+        rows = conn.execute(query.first_sql, {'limit': limit + 1}).fetchall()
+    else:
+        rows = conn.execute(query.after_sql, {**after, 'limit': limit + 1}).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return Page(rows, query.key(rows[-1]))
+    return Page(rows, None)
+
+
+def iter_pages(conn: Connection, name, limit=PAGE_SIZE):
+    """Все строки списка name, читаемые страницами"""
+    after = None
+    while True:
+        page = fetch_page(conn, name, after, limit)
+        yield from page.rows
+        if page.after is None:
+            return
+        after = page.after
+
+
+def sort_key(name, row):
+    """Кортеж, по которому строка упорядочена в списке name"""
+    return tuple(PAGED_QUERIES[name].key(row).values())
+
+
+def fetch_rows(conn: Connection, name, ids):
+    """Строки списка name по первичным ключам (в произвольном порядке)"""
+    ids = list(ids)
+    sql = PAGED_QUERIES[name].by_ids_sql
+    rows = []
+    for start in range(0, len(ids), IDS_CHUNK):
+        chunk = ids[start:start + IDS_CHUNK]
+        rows.extend(conn.execute(sql.format(placeholders=', '.join('?' * len(chunk))), chunk))
+    return rows
+
+
+def estimate_count(conn: Connection, name):
+    """Оценка числа строк списка без полного прохода по таблице"""
+    table = PAGED_QUERIES[name].table
+    return conn.execute(TABLE_ROWS_ESTIMATE.format(table=table)).fetchone()[0]
@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """Соединение, которое при close() возвращается в пул, а не закрывается"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._checked_out = False
+        self._owner = None  # поток, последним вернувший соединение в пул
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._checked_out:
+            self._pool.release(self)
+        # Повторный close() уже возвращенного соединения ничего не делает
+
+    def _real_close(self):
+        """Закрывает соединение по-настоящему"""
+        self._pool = None
+        self._checked_out = False
+        try:
+            super().close()
+        except sqlite3.Error:
+            pass
+
+
+class ReadOnlyConnection(PooledConnection):
+    """Соединение только для чтения (отчеты и списки).
+
+    Файл открывается с URI mode=ro, а PRAGMA query_only запрещает запись
+    даже во временные объекты. В режиме WAL такое соединение читает снимок
+    на начало своей транзакции и не берет блокировок, мешающих писателю.
+    """
+
+    def __init__(self, database, *args, **kwargs):
+        kwargs['uri'] = True
+        super().__init__(f"{Path(database).resolve().as_uri()}?mode=ro", *args, **kwargs)
+        # Напрямую: подклассы (замеры запросов) еще не закончили __init__
+        sqlite3.Connection.execute(self, "PRAGMA query_only = ON")
+
+
+class ConnectionPool:
+    """Пул заранее настроенных соединений SQLite.
+
+    Свободные соединения (не больше max_size) помнят поток, который вернул
+    их последним: поток в первую очередь получает то соединение, которое уже
+    использовал (с прогретым кэшем страниц и разобранной схемой). Это только
+    предпочтение: иначе выдается последнее возвращенное соединение, а если
+    свободных нет и лимит max_size исчерпан - ожидается возврат занятого.
+    Реестра потоков нет, поэтому поток на запрос (ThreadingHTTPServer) не
+    накапливает записи.
+    """
+
+    def __init__(self, db_path, max_size=5, timeout=5.0, setup=None, factory=PooledConnection):
+        self.db_path = str(db_path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self._setup = setup
+        self._factory = factory  # подкласс PooledConnection
+        self._cond = threading.Condition()
+        self._idle = deque()  # свободные соединения, последнее возвращенное - справа
+        self._size = 0
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def size(self):
+        """Общее число открытых соединений (свободных и выданных)"""
+        return self._size
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, factory=self._factory,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Для доступа к полям по имени
+        if self._setup is not None:
+            self._setup(conn)
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _take_idle(self):
+        """Берет свободное соединение: сначала своего потока, затем последнее возвращенное"""
+        me = threading.get_ident()
+        for conn in reversed(self._idle):
+            if conn._owner == me:
+                self._idle.remove(conn)
+                return conn
+        return self._idle.pop() if self._idle else None
+
+    def acquire(self):
+        """Выдает соединение из пула"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Пул соединений закрыт")
+                conn = self._take_idle()
+                if conn is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            raise PoolTimeoutError(
+                                f"Нет свободных соединений (лимит {self.max_size})")
+                        continue
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+
+            conn._pool = self
+            conn._checked_out = True
+            return conn
+
+    def release(self, conn):
+        """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                conn._real_close()
+                return
+            conn._owner = threading.get_ident()
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        conn._real_close()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: with pool.connection() as conn: ...
+
+        При выходе без исключения фиксирует транзакцию и возвращает
+        соединение в пул.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        finally:
+            conn.close()
+
+    def close(self):
+        """Закрывает свободные соединения; выданные закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                conn._real_close()
+                self._size -= 1
+            self._idle.clear()
+            self._cond.notify_all()
+
@@ -0,0 +1,153 @@
+"""Расчет стоимости аренды по тарифам, закэшированным в памяти.
+
+Тарифы категорий, цены услуг и категории автомобилей загружаются одним
+проходом и хранятся в памяти. Триггеры на categories, services и cars
+увеличивают версию 'pricing' в таблице cache_versions; кэш перечитывается,
+только когда версия изменилась (в том числе из другого терминала).
+"""
+import threading
+from datetime import date, datetime
+from sqlite3 import Connection
+from typing import NamedTuple
+
+from database.queries import (PRICING_CARS, PRICING_CATEGORIES, PRICING_SERVICES,
+                              PRICING_VERSION)
+
+LATE_PENALTY_RATE = 1.5  # Штраф за каждый день опоздания - 150% суточного тарифа
+
+# Изменения, после которых кэш тарифов устаревает
+_PRICING_TRIGGERS = {
+    'categories': ('INSERT', 'UPDATE', 'DELETE'),
+    'services': ('INSERT', 'UPDATE', 'DELETE'),
+    'cars': ('INSERT', 'UPDATE OF category_id', 'DELETE'),
+}
+
+
+def create_pricing_triggers(conn: Connection):
+    """Создает счетчик версий кэшей и триггеры версии тарифов"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS cache_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('pricing', 0)")
+    for table, events in _PRICING_TRIGGERS.items():
+        for event in events:
+            name = f"pricing_version_{table}_{event.split()[0].lower()}"
+            conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+            BEGIN
+                UPDATE cache_versions SET version = version + 1 WHERE name = 'pricing';
+            END''')
+
+
+def drop_pricing_triggers(conn: Connection):
+    """Отключает триггеры версии тарифов на время массовой загрузки; возвращает True, если они были"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'pricing\\_version\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+    return bool(names)
+
+
+def bump_pricing_version(conn: Connection):
+    """Помечает кэши тарифов устаревшими (после загрузки без триггеров)"""
+    conn.execute("UPDATE cache_versions SET version = version + 1 WHERE name = 'pricing'")
+
+
+class Quote(NamedTuple):
+    car_id: int
+    days: int
+    daily_rate: float
+    base_cost: float
+    services_cost: float
+    deposit: float
+    total_cost: float
+
+
+def rental_days(start, end):
+    """Число оплачиваемых суток между датами ('ГГГГ-ММ-ДД' или date/datetime)"""
+    if isinstance(start, str):
+        start = datetime.fromisoformat(start)
+    if isinstance(end, str):
+        end = datetime.fromisoformat(end)
+    if isinstance(start, date) and not isinstance(start, datetime):
+        start = datetime(start.year, start.month, start.day)
+    if isinstance(end, date) and not isinstance(end, datetime):
+        end = datetime(end.year, end.month, end.day)
+    if end <= start:
+        raise ValueError("Дата окончания должна быть позже даты начала")
+    return (end - start).days
+
+
+class RentalPricingEngine:
+    """Расчет стоимости аренды без обращения к БД на каждый автомобиль и услугу"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._cars = {}        # car_id -> category_id
+        self._categories = {}  # category_id -> (daily_rate, deposit_amount)
+        self._services = {}    # service_id -> price
+
+    def refresh(self, conn: Connection):
+        """Перечитывает тарифы, если их версия в БД изменилась"""
+        version = conn.execute(PRICING_VERSION).fetchone()[0]
+        with self._lock:
+            if version == self._version:
+                return
+            self._categories = {row[0]: (row[1], row[2])
+                                for row in conn.execute(PRICING_CATEGORIES)}
+            self._services = {row[0]: row[1] for row in conn.execute(PRICING_SERVICES)}
+            self._cars = {row[0]: row[1] for row in conn.execute(PRICING_CARS)}
+            self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def _rates(self, car_id):
+        try:
+            return self._categories[self._cars[car_id]]
+        except KeyError:
+            raise ValueError(f"Автомобиль {car_id} не найден") from None
+
+    def _quote(self, car_id, start, end, service_ids):
+        days = rental_days(start, end)
+        daily_rate, deposit = self._rates(car_id)
+        base_cost = daily_rate * days
+        try:
+            services_cost = sum(self._services[s] for s in service_ids) * days
+        except KeyError as e:
+            raise ValueError(f"Услуга {e.args[0]} не найдена") from None
+        return Quote(car_id, days, daily_rate, base_cost, services_cost, deposit,
+                     base_cost + services_cost)
+
+    def quote(self, conn: Connection, car_id, start, end, service_ids=()):
+        """Стоимость одной аренды"""
+        self.refresh(conn)
+        with self._lock:
+            return self._quote(car_id, start, end, service_ids)
+
+    def quote_many(self, conn: Connection, requests):
+        """Стоимость для множества (car_id, start, end, service_ids) за одну проверку версии"""
+        self.refresh(conn)
+        with self._lock:
+            return [self._quote(car_id, start, end, service_ids)
+                    for car_id, start, end, service_ids in requests]
+
+    def daily_rate(self, conn: Connection, car_id):
+        self.refresh(conn)
+        with self._lock:
+            return self._rates(car_id)[0]
+
+    def late_penalty(self, conn: Connection, car_id, extra_days):
+        """Штраф за опоздание с возвратом на extra_days суток"""
+        return self.daily_rate(conn, car_id) * extra_days * LATE_PENALTY_RATE
+
+    def late_penalties(self, conn: Connection, requests):
+        """Штрафы для множества (car_id, extra_days) за одну проверку версии"""
+        self.refresh(conn)
+        with self._lock:
+            return [self._rates(car_id)[0] * extra_days * LATE_PENALTY_RATE
+                    for car_id, extra_days in requests]
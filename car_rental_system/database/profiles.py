@@ -0,0 +1,80 @@
+import configparser
+import os
+from functools import lru_cache
+from pathlib import Path
+
+# Наборы PRAGMA, применяемые при открытии соединения.
+# cache_size < 0 задается в КиБ, mmap_size - в байтах, busy_timeout - в мс.
+PROFILES = {
+    # Каждая фиксация транзакции сбрасывается на диск (fsync WAL)
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+    # WAL + NORMAL: fsync только при чекпоинте, читатели не блокируют писателей
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # Массовая загрузка данных: без fsync, большой кэш
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+CONFIG_PATH = Path.home() / ".car_rental_config.ini"
+
+
+@lru_cache(maxsize=None)
+def _configured_profile():
+    """Профиль из файла конфигурации (читается один раз за процесс)"""
+    if not CONFIG_PATH.exists():
+        return None
+    cfg = configparser.ConfigParser()
+    cfg.read(CONFIG_PATH)
+    return cfg.get("sqlite", "profile", fallback=None)
+
+
+def get_profile_name(name=None):
+    """Определяет имя профиля.
+
+    Порядок: явный аргумент, переменная окружения CAR_RENTAL_DB_PROFILE,
+    параметр profile секции [sqlite] в ~/.car_rental_config.ini,
+    профиль по умолчанию.
+    """
+    if not name:
+        name = os.environ.get("CAR_RENTAL_DB_PROFILE")
+    name = name or _configured_profile() or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(
+            f"Неизвестный профиль '{name}'. Доступны: {', '.join(PROFILES)}")
+    return name
+
+
+def apply_profile(conn, name=None, read_only=False):
+    """Применяет профиль PRAGMA к соединению и возвращает имя профиля.
+
+    Соединению только для чтения journal_mode не задается: режим хранится
+    в файле базы и устанавливается соединениями для записи.
+    """
+    name = get_profile_name(name)
+    for pragma, value in PROFILES[name].items():
+        if read_only and pragma == "journal_mode":
+            continue
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return name
@@ -0,0 +1,384 @@
+# SQL-запросы интерфейса автопроката (gui.py).
+# Собраны в одном месте, чтобы их можно было проверять через
+# EXPLAIN QUERY PLAN и замерять в бенчмарках без запуска интерфейса.
+
+# Списки вкладок читаются страницами по ключу сортировки (database/pagination.py):
+# *_PAGE_FIRST - первая страница, *_PAGE_AFTER - строки после ключа последней
+# показанной строки. Ключ дополнен первичным ключом, чтобы порядок был однозначным.
+# *_BY_IDS - те же строки по списку id для применения журнала изменений;
+# {placeholders} заменяется на '?, ?, ...'.
+
+# ========== Автомобили ==========
+_CARS_SELECT = '''
+SELECT c.car_id, c.brand, c.model, c.year, c.license_plate,
+       cat.name, c.status, cat.daily_rate
+FROM cars c
+JOIN categories cat ON c.category_id = cat.category_id
+'''
+
+CARS_PAGE_FIRST = _CARS_SELECT + '''
+ORDER BY c.car_id
+LIMIT :limit
+'''
+
+CARS_PAGE_AFTER = _CARS_SELECT + '''
+WHERE c.car_id > :car_id
+ORDER BY c.car_id
+LIMIT :limit
+'''
+
+CARS_BY_IDS = _CARS_SELECT + "WHERE c.car_id IN ({placeholders})"
+
+CATEGORIES_LIST = "SELECT category_id, name FROM categories"
+
+CAR_INSERT = '''
+INSERT INTO cars (brand, model, year, license_plate, category_id, status)
+VALUES (?, ?, ?, ?, ?, 'available')
+'''
+
+CAR_SET_STATUS = "UPDATE cars SET status = ? WHERE car_id = ?"
+
+CAR_STATUS = "SELECT status FROM cars WHERE car_id = ?"
+
+# Статус по оставшимся занятым арендам автомобиля (database/availability.py);
+# автомобиль в ремонте не трогается
+CAR_SYNC_STATUS = '''
+UPDATE cars SET status = CASE
+    WHEN EXISTS (SELECT 1 FROM rentals r
+                 WHERE r.car_id = cars.car_id AND r.status IN ('active', 'overdue')
+                   AND r.actual_end_date IS NULL) THEN 'rented'
+    WHEN EXISTS (SELECT 1 FROM rentals r
+                 WHERE r.car_id = cars.car_id AND r.status = 'reserved') THEN 'reserved'
+    ELSE 'available'
+END
+WHERE car_id = ? AND status != 'maintenance'
+'''
+
+CAR_OPEN_RENTALS_COUNT = '''
+SELECT COUNT(*) FROM rentals
+WHERE car_id = ? AND status IN ('reserved', 'active', 'overdue')
+'''
+
+CAR_DELETE = "DELETE FROM cars WHERE car_id = ?"
+
+# ========== Клиенты ==========
+_CLIENTS_SELECT = '''
+SELECT client_id, last_name, first_name, phone, driver_license, rating,
+       CASE WHEN blacklisted THEN 'Да' ELSE 'Нет' END as blacklist
+FROM clients
+'''
+
+CLIENTS_PAGE_FIRST = _CLIENTS_SELECT + '''
+ORDER BY last_name, first_name, client_id
+LIMIT :limit
+'''
+
+CLIENTS_PAGE_AFTER = _CLIENTS_SELECT + '''
+WHERE (last_name, first_name, client_id) > (:last_name, :first_name, :client_id)
+ORDER BY last_name, first_name, client_id
+LIMIT :limit
+'''
+
+CLIENTS_BY_IDS = _CLIENTS_SELECT + "WHERE client_id IN ({placeholders})"
+
+CLIENT_INSERT = '''
+INSERT INTO clients
+(last_name, first_name, birth_date, passport_number, driver_license, phone, email, registration_date)
+VALUES (?, ?, ?, ?, ?, ?, ?, date('now'))
+'''
+
+CLIENT_SET_BLACKLIST = "UPDATE clients SET blacklisted = ? WHERE client_id = ?"
+
+# Поиск клиентов по индексам FTS5 (database/client_search.py).
+# Ранжируются все совпадения, но к clients присоединяются только :candidates
+# лучших: порядок кандидатов задает ранг, а не порядок rowid в индексе.
+CLIENTS_SEARCH_FTS = '''
+SELECT c.client_id, c.last_name, c.first_name, c.phone, c.driver_license, c.rating,
+       CASE WHEN c.blacklisted THEN 'Да' ELSE 'Нет' END as blacklist
+FROM (
+    SELECT rowid, bm25(clients_fts, 10.0, 5.0, 2.0, 2.0, 2.0, 1.0) AS score
+    FROM clients_fts
+    WHERE clients_fts MATCH :query
+    ORDER BY score
+    LIMIT :candidates
+) f
+JOIN clients c ON c.client_id = f.rowid
+ORDER BY f.score
+LIMIT :limit
+'''
+
+CLIENTS_SEARCH_TRIGRAM = '''
+SELECT c.client_id, c.last_name, c.first_name, c.phone, c.driver_license, c.rating,
+       CASE WHEN c.blacklisted THEN 'Да' ELSE 'Нет' END as blacklist
+FROM (
+    SELECT rowid, rank AS score
+    FROM clients_trigram
+    WHERE clients_trigram MATCH :query
+    ORDER BY score
+    LIMIT :candidates
+) t
+JOIN clients c ON c.client_id = t.rowid
+ORDER BY t.score
+LIMIT :limit
+'''
+
+# ========== Аренды ==========
+_RENTALS_SELECT = '''
+SELECT r.rental_id,
+       c.last_name || ' ' || c.first_name as client,
+       car.brand || ' ' || car.model as car,
+       r.start_date, r.end_date, r.total_cost, r.status
+FROM rentals r
+JOIN clients c ON r.client_id = c.client_id
+JOIN cars car ON r.car_id = car.car_id
+'''
+
+RENTALS_PAGE_FIRST = _RENTALS_SELECT + '''
+ORDER BY r.start_date DESC, r.rental_id DESC
+LIMIT :limit
+'''
+
+RENTALS_PAGE_AFTER = _RENTALS_SELECT + '''
+WHERE (r.start_date, r.rental_id) < (:start_date, :rental_id)
+ORDER BY r.start_date DESC, r.rental_id DESC
+LIMIT :limit
+'''
+
+RENTALS_BY_IDS = _RENTALS_SELECT + "WHERE r.rental_id IN ({placeholders})"
+
+RENTAL_CLIENTS = '''
+SELECT client_id, last_name || ' ' || first_name as name
+FROM clients
+WHERE blacklisted = 0
+ORDER BY last_name
+'''
+
+# Свободные в период [window_start, window_end) автомобили (минуты от 1970-01-01);
+# занятые интервалы ищутся по R*Tree rental_intervals
+AVAILABLE_CARS_FOR_PERIOD = '''
+SELECT c.car_id, c.brand, c.model, cat.name, cat.daily_rate
+FROM cars c
+JOIN categories cat ON c.category_id = cat.category_id
+WHERE c.status != 'maintenance'
+  AND (:category_id IS NULL OR c.category_id = :category_id)
+  AND c.car_id NOT IN (
+      SELECT car_min FROM rental_intervals
+      WHERE start_min < :window_end AND end_min > :window_start
+  )
+ORDER BY c.car_id
+'''
+
+CAR_INTERVAL_CONFLICTS = '''
+SELECT rental_id FROM rental_intervals
+WHERE start_min < :window_end AND end_min > :window_start
+  AND car_min <= :car_id AND car_max >= :car_id
+  AND rental_id IS NOT :exclude_rental_id
+LIMIT 1
+'''
+
+SERVICES_LIST = "SELECT service_id, name, price FROM services"
+
+RENTAL_INSERT = '''
+INSERT INTO rentals
+(client_id, car_id, start_date, end_date, total_cost, deposit_amount, status, employee_id)
+VALUES (?, ?, ?, ?, ?, ?, 'reserved', 1)
+'''
+
+RENTAL_SERVICE_INSERT = '''
+INSERT INTO rental_services (rental_id, service_id, quantity)
+VALUES (?, ?, 1)
+'''
+
+# Аренды для приема автомобилей (database/checkin.py)
+RENTALS_FOR_CHECK_IN = '''
+SELECT rental_id, car_id, start_date, end_date, total_cost, status, actual_end_date
+FROM rentals
+WHERE rental_id IN ({placeholders})
+'''
+
+RENTAL_COMPLETE = '''
+UPDATE rentals SET
+status = 'completed',
+actual_end_date = ?,
+total_cost = ?
+WHERE rental_id = ?
+'''
+
+RENTAL_CAR = "SELECT car_id FROM rentals WHERE rental_id = ?"
+
+RENTAL_CANCEL = '''
+UPDATE rentals SET
+status = 'cancelled',
+actual_end_date = date('now')
+WHERE rental_id = ?
+'''
+
+# ========== Повреждения (database/damages.py) ==========
+RENTALS_FOR_DAMAGES = '''
+SELECT rental_id, car_id, status, deposit_amount
+FROM rentals
+WHERE rental_id IN ({placeholders})
+'''
+
+DAMAGE_IMPORT = '''
+INSERT INTO damages
+(rental_id, car_id, description, repair_cost, reported_date, status, employee_id)
+VALUES (?, ?, ?, ?, COALESCE(?, date('now')), 'reported', ?)
+'''
+
+# Удержания из депозитов одним запросом: параметр - JSON [[rental_id, сумма], ...]
+RENTAL_DEDUCT_DEPOSITS = '''
+UPDATE rentals SET deposit_amount = deposit_amount - d.value ->> 1
+FROM json_each(?) d
+WHERE rentals.rental_id = d.value ->> 0
+'''
+
+# ========== Тарифы (database/pricing.py) ==========
+PRICING_VERSION = "SELECT version FROM cache_versions WHERE name = 'pricing'"
+
+PRICING_CATEGORIES = "SELECT category_id, daily_rate, deposit_amount FROM categories"
+
+PRICING_SERVICES = "SELECT service_id, price FROM services"
+
+PRICING_CARS = "SELECT car_id, category_id FROM cars"
+
+# ========== Оценка числа строк (database/pagination.py) ==========
+# MAX(rowid) берется из конца B-дерева без обхода таблицы; для таблиц,
+# из которых почти не удаляют строки, совпадает с числом строк.
+# Имя таблицы подставляется из фиксированного списка PAGED_QUERIES.
+TABLE_ROWS_ESTIMATE = "SELECT COALESCE(MAX(rowid), 0) FROM {table}"
+
+# ========== Журнал изменений (database/changelog.py) ==========
+CHANGELOG_LAST_SEQ = "SELECT COALESCE(MAX(seq), 0) FROM changelog"
+
+CHANGELOG_MIN_SEQ = "SELECT MIN(seq) FROM changelog"
+
+CHANGELOG_SINCE = '''
+SELECT seq, table_name, row_id, op
+FROM changelog
+WHERE seq > ?
+ORDER BY seq
+LIMIT ?
+'''
+
+CHANGELOG_MARK_RELOAD = "INSERT INTO changelog (table_name, row_id, op) VALUES ('*', 0, 'R')"
+
+CHANGELOG_PRUNE = "DELETE FROM changelog WHERE seq <= (SELECT MAX(seq) FROM changelog) - ?"
+
+# ========== Отчеты (сводные таблицы database/rollups.py) ==========
+REPORT_INCOME_BY_MONTH = '''
+SELECT substr(d.day, 1, 7) AS month, cat.name, SUM(d.amount), SUM(d.payments)
+FROM revenue_daily d
+JOIN categories cat ON cat.category_id = d.category_id
+WHERE d.day BETWEEN :date_from AND :date_to
+GROUP BY month, cat.category_id
+ORDER BY month, cat.name
+'''
+
+REPORT_POPULAR_CARS = '''
+SELECT c.car_id, c.brand, c.model, c.license_plate, d.rentals
+FROM (
+    SELECT car_id, SUM(rentals) AS rentals
+    FROM car_rentals_daily
+    WHERE day BETWEEN :date_from AND :date_to
+    GROUP BY car_id
+    ORDER BY rentals DESC
+    LIMIT :limit
+) d
+JOIN cars c ON c.car_id = d.car_id
+ORDER BY d.rentals DESC, c.car_id
+'''
+
+# Условие по статусу совпадает с частичным индексом idx_rentals_current
+REPORT_ACTIVE_RENTALS = '''
+SELECT r.rental_id,
+       c.last_name || ' ' || c.first_name as client,
+       car.brand || ' ' || car.model as car,
+       car.license_plate, r.start_date, r.end_date, r.status
+FROM rentals r
+JOIN clients c ON r.client_id = c.client_id
+JOIN cars car ON r.car_id = car.car_id
+WHERE r.status IN ('active', 'overdue')
+ORDER BY r.end_date
+LIMIT :limit
+'''
+
+REPORT_ACTIVE_RENTALS_COUNT = "SELECT COUNT(*) FROM rentals WHERE status IN ('active', 'overdue')"
+
+REPORT_MAINTENANCE_CARS = '''
+SELECT c.car_id, c.brand, c.model, c.license_plate, c.last_service_date,
+       COUNT(d.damage_id), COALESCE(SUM(d.repair_cost), 0)
+FROM cars c
+LEFT JOIN damages d ON d.car_id = c.car_id AND d.status IN ('reported', 'under_repair')
+WHERE c.status = 'maintenance'
+GROUP BY c.car_id
+ORDER BY c.car_id
+'''
+
+# ========== Просроченные аренды (database/overdue.py) ==========
+# Пакет активных аренд с прошедшим сроком - по частичному индексу idx_rentals_active_due.
+# Срок возврата - весь день end_date (он хранится и датой, и датой со временем):
+# сравнение с date(:now) равно date(end_date) < date(:now), но идет по индексу
+OVERDUE_FLAG_CHUNK = '''
+UPDATE rentals SET status = 'overdue'
+WHERE rental_id IN (
+    SELECT rental_id FROM rentals
+    WHERE status = 'active' AND end_date < date(:now)
+    ORDER BY end_date
+    LIMIT :limit
+)
+'''
+
+# Невозвращенные просроченные аренды по автомобилям (idx_rentals_overdue_open):
+# число и сумма дней опоздания
+OVERDUE_ACCRUED = '''
+SELECT car_id, COUNT(*), SUM(julianday(date(:now)) - julianday(date(end_date)))
+FROM rentals
+WHERE status = 'overdue' AND actual_end_date IS NULL
+GROUP BY car_id
+'''
+
+OVERDUE_SWEEP_LOG = '''
+INSERT INTO overdue_sweeps (swept_at, duration_ms, rows_flagged, chunks, overdue_rentals, penalty_accrued)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# ========== Балансы расчетов (database/balances.py) ==========
+# Должники по убыванию долга - по индексу выражения idx_client_balances_debt
+BALANCE_DEBTORS = '''
+SELECT b.client_id, c.last_name || ' ' || c.first_name AS client, c.phone,
+       round(b.charged, 2), round(b.paid, 2), round(b.charged - b.paid, 2) AS debt
+FROM client_balances b
+JOIN clients c ON c.client_id = b.client_id
+WHERE b.charged - b.paid > :min_debt
+ORDER BY b.charged - b.paid DESC
+LIMIT :limit
+'''
+
+BALANCE_RENTAL = '''
+SELECT round(charged, 2), round(paid, 2), round(charged - paid, 2)
+FROM rental_balances
+WHERE rental_id = ?
+'''
+
+# ========== Загрузка автопарка (database/utilization.py) ==========
+# Интервалы аренд в днях от 1970-01-01; день возврата не считается занятым.
+# open - автомобиль не возвращен: занят как минимум до сегодняшнего дня
+_UTILIZATION_INTERVAL = '''
+SELECT rental_id, car_id,
+       CAST(julianday(start_date) - 2440587.5 AS INTEGER),
+       CAST(julianday(COALESCE(actual_end_date, end_date)) - 2440587.5 AS INTEGER),
+       actual_end_date IS NULL AND status IN ('active', 'overdue')
+FROM rentals
+'''
+
+UTILIZATION_RENTALS = _UTILIZATION_INTERVAL + "WHERE status != 'cancelled'"
+
+UTILIZATION_RENTALS_BY_IDS = _UTILIZATION_INTERVAL + '''WHERE rental_id IN ({placeholders}) AND status != 'cancelled'
+'''
+
+UTILIZATION_CARS = '''
+SELECT c.car_id, c.brand, c.model, c.license_plate, cat.name
+FROM cars c
+JOIN categories cat ON cat.category_id = c.category_id
+'''
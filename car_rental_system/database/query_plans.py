@@ -0,0 +1,177 @@
+"""Проверка планов запросов интерфейса через EXPLAIN QUERY PLAN.
+
+Запуск из каталога car_rental_system:
+    python database/query_plans.py            # на заполненной тестовой базе
+    python database/query_plans.py --db путь  # на существующей базе
+Код возврата 1, если какой-либо запрос полностью сканирует большую таблицу.
+"""
+import argparse
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import queries
+
+# Таблицы, которые растут вместе с историей аренд
+LARGE_TABLES = {'cars', 'clients', 'rentals', 'payments', 'damages', 'rental_services',
+                'changelog', 'revenue_daily', 'car_rentals_daily', 'rental_balances',
+                'client_balances'}
+
+# (действие интерфейса, SQL, параметры, таблицы, которые запрос
+# читает целиком намеренно - полный список в Treeview и т.п.).
+# Первые страницы списков разрешено сканировать: обход идет по индексу
+# сортировки и останавливается на LIMIT, а сортировка во временном
+# B-дереве для разрешенного скана считается нарушением.
+PLAN_CHECKS = [
+    ('load_cars', queries.CARS_PAGE_FIRST, {'limit': 201}, {'cars'}),
+    ('load_cars', queries.CARS_PAGE_AFTER, {'car_id': 1, 'limit': 201}, set()),
+    ('add_car_dialog', queries.CATEGORIES_LIST, (), set()),
+    ('change_car_status_dialog', queries.CAR_SET_STATUS, ('available', 1), set()),
+    ('delete_car', queries.CAR_OPEN_RENTALS_COUNT, (1,), set()),
+    ('delete_car', queries.CAR_DELETE, (1,), set()),
+    ('load_clients', queries.CLIENTS_PAGE_FIRST, {'limit': 201}, {'clients'}),
+    ('load_clients', queries.CLIENTS_PAGE_AFTER,
+     {'last_name': 'Иванов', 'first_name': 'Иван', 'client_id': 1, 'limit': 201}, set()),
+    ('toggle_blacklist', queries.CLIENT_SET_BLACKLIST, (True, 1), set()),
+    ('search_clients_dialog', queries.CLIENTS_SEARCH_FTS,
+     {'query': '"ив"*', 'limit': 200, 'candidates': 2000}, set()),
+    ('search_clients_dialog', queries.CLIENTS_SEARCH_TRIGRAM,
+     {'query': '"456"', 'limit': 200, 'candidates': 2000}, set()),
+    ('load_rentals', queries.RENTALS_PAGE_FIRST, {'limit': 201}, {'rentals'}),
+    ('load_rentals', queries.RENTALS_PAGE_AFTER,
+     {'start_date': '2024-01-01', 'rental_id': 1, 'limit': 201}, set()),
+    ('new_rental_dialog', queries.RENTAL_CLIENTS, (), {'clients'}),
+    ('new_rental_dialog', queries.AVAILABLE_CARS_FOR_PERIOD,
+     {'window_start': 29000000, 'window_end': 29010080, 'category_id': None}, {'cars'}),
+    ('create_rental', queries.CAR_INTERVAL_CONFLICTS,
+     {'car_id': 1, 'window_start': 29000000, 'window_end': 29010080,
+      'exclude_rental_id': None}, set()),
+    ('new_rental_dialog', queries.SERVICES_LIST, (), set()),
+    ('create_rental', queries.CAR_STATUS, (1,), set()),
+    ('create_rental', queries.CAR_SYNC_STATUS, (1,), set()),
+    # Тарифы читаются целиком один раз на версию (database/pricing.py)
+    ('calculate_cost', queries.PRICING_VERSION, (), set()),
+    ('calculate_cost', queries.PRICING_CARS, (), {'cars'}),
+    ('complete_rental', queries.RENTALS_FOR_CHECK_IN.format(placeholders='?, ?'), (1, 2), set()),
+    ('complete_rental', queries.RENTAL_COMPLETE, ('2024-01-01', 100, 1), set()),
+    ('cancel_rental', queries.RENTAL_CAR, (1,), set()),
+    ('cancel_rental', queries.RENTAL_CANCEL, (1,), set()),
+    ('cancel_rental', queries.CAR_SYNC_STATUS, (1,), set()),
+    ('report_damage_dialog', queries.RENTALS_FOR_DAMAGES.format(placeholders='?, ?'), (1, 2), set()),
+    ('report_damage_dialog', queries.RENTAL_DEDUCT_DEPOSITS, ('[[1, 100], [2, 50]]',), set()),
+    # Инкрементальное обновление списков по журналу изменений
+    ('refresh_changes', queries.CHANGELOG_LAST_SEQ, (), set()),
+    ('refresh_changes', queries.CHANGELOG_MIN_SEQ, (), set()),
+    ('refresh_changes', queries.CHANGELOG_SINCE, (0, 5001), set()),
+    ('refresh_changes', queries.CARS_BY_IDS.format(placeholders='?, ?'), (1, 2), set()),
+    ('refresh_changes', queries.CLIENTS_BY_IDS.format(placeholders='?, ?'), (1, 2), set()),
+    ('refresh_changes', queries.RENTALS_BY_IDS.format(placeholders='?, ?'), (1, 2), set()),
+    # Отчеты: сводные таблицы читаются только за период, текущие аренды -
+    # целиком по частичному индексу idx_rentals_current
+    ('generate_income_report', queries.REPORT_INCOME_BY_MONTH,
+     {'date_from': '2024-01-01', 'date_to': '2024-12-31'}, set()),
+    ('generate_popular_cars_report', queries.REPORT_POPULAR_CARS,
+     {'date_from': '2024-01-01', 'date_to': '2024-12-31', 'limit': 20}, set()),
+    ('generate_active_rentals_report', queries.REPORT_ACTIVE_RENTALS, {'limit': 500}, {'rentals'}),
+    ('generate_active_rentals_report', queries.REPORT_ACTIVE_RENTALS_COUNT, (), {'rentals'}),
+    ('generate_maintenance_report', queries.REPORT_MAINTENANCE_CARS, (), set()),
+    # Перевод просроченных аренд (database/overdue.py); штрафы - целиком
+    # по частичному индексу невозвращенных просроченных аренд
+    ('sweep_overdue', queries.OVERDUE_FLAG_CHUNK, {'now': '2024-06-01 00:00:00', 'limit': 5000}, set()),
+    ('sweep_overdue', queries.OVERDUE_ACCRUED, {'now': '2024-06-01 00:00:00'}, {'rentals'}),
+    ('sweep_overdue', queries.CHANGELOG_PRUNE, (100000,), set()),
+    # Должники - по индексу выражения долга (database/balances.py)
+    ('generate_debtors_report', queries.BALANCE_DEBTORS, {'min_debt': 1000, 'limit': 100}, set()),
+    ('rental_balance', queries.BALANCE_RENTAL, (1,), set()),
+    ('generate_utilization_report', queries.UTILIZATION_RENTALS, (), {'rentals'}),
+    ('generate_utilization_report', queries.UTILIZATION_RENTALS_BY_IDS.format(placeholders='?, ?'), (1, 2), set()),
+    ('generate_utilization_report', queries.UTILIZATION_CARS, (), {'cars'}),
+]
+
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.I)
+_SQL_WORDS = {'where', 'join', 'on', 'order', 'group', 'set', 'left', 'inner',
+              'limit', 'values', 'using', 'natural', 'cross'}
+
+
+def _aliases(sql):
+    """Сопоставляет псевдонимы из FROM/JOIN с именами таблиц"""
+    result = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        result[table] = table
+        if alias and alias.lower() not in _SQL_WORDS:
+            result[alias] = table
+    return result
+
+
+def explain(conn, sql, params=()):
+    """Возвращает строки detail из EXPLAIN QUERY PLAN"""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def find_full_scans(conn, sql, params=(), allowed=()):
+    """Список нарушений плана: полные сканы больших таблиц и сортировки
+    во временном B-дереве для намеренно полных выборок"""
+    aliases = _aliases(sql)
+    problems = []
+    plan = explain(conn, sql, params)
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table not in LARGE_TABLES:
+            continue
+        if table not in allowed:
+            problems.append(detail)
+        elif any('TEMP B-TREE FOR ORDER BY' in d for d in plan):
+            problems.append(f'{detail} + сортировка без индекса')
+    return problems
+
+
+def check_query_plans(conn):
+    """Проверяет все запросы интерфейса; возвращает [(действие, нарушения)]"""
+    failures = []
+    for action, sql, params, allowed in PLAN_CHECKS:
+        problems = find_full_scans(conn, sql, params, allowed)
+        if problems:
+            failures.append((action, problems))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='существующая база (по умолчанию - временная тестовая)')
+    args = parser.parse_args()
+
+    from database.connection import get_db_connection, get_pool
+    from database.migrations import migrate
+    from database.models import create_tables
+    from database.seed import fill_test_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or str(Path(tmp) / 'plans.db')
+        conn = get_db_connection(db_path)
+        try:
+            if not args.db:
+                create_tables(conn)
+                migrate(conn)
+                fill_test_data(db_path)
+                conn.execute('ANALYZE')
+            failures = check_query_plans(conn)
+        finally:
+            conn.close()
+            get_pool(db_path).close()
+
+    for action, problems in failures:
+        for detail in problems:
+            print(f"ПОЛНЫЙ СКАН  {action}: {detail}")
+    print(f"Проверено запросов: {len(PLAN_CHECKS)}, с нарушениями: {len(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Бронирование автомобиля без двойных броней.
+
+Проверка свободного интервала и вставка аренды выполняются в одной
+транзакции BEGIN IMMEDIATE: блокировка записи берется до проверки, поэтому
+другой терминал не может забронировать тот же автомобиль между проверкой
+и вставкой. Бронь ограничивает только пересечение интервалов: статус
+автомобиля не служит блокировкой и после вставки пересчитывается по его
+арендам (sync_car_status); автомобиль в ремонте не бронируется. Если база
+занята дольше busy_timeout, транзакция повторяется с экспоненциальной задержкой.
+"""
+import random
+import sqlite3
+import time
+from sqlite3 import Connection
+from typing import NamedTuple
+
+from database.availability import is_car_available, sync_car_status, to_minutes
+from database.queries import CAR_STATUS, RENTAL_INSERT, RENTAL_SERVICE_INSERT
+
+RETRIES = 5
+BACKOFF = 0.05  # с, первая задержка перед повтором; далее удваивается
+
+
+class CarUnavailableError(Exception):
+    """Автомобиль нельзя забронировать на выбранный период"""
+
+
+class Reservation(NamedTuple):
+    rental_id: int
+    quote: object  # pricing.Quote
+    attempts: int  # 1 - без повторов из-за занятой базы
+
+
+def _is_busy(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def try_reserve(conn: Connection, client_id, car_id, start, end, service_ids, pricing):
+    """Бронирование внутри уже открытой транзакции записи; возвращает (rental_id, quote).
+
+    Вызывающий фиксирует или откатывает транзакцию.
+    """
+    if to_minutes(end) <= to_minutes(start):
+        raise ValueError("Дата окончания должна быть позже даты начала")
+    # Выданный или забронированный на другой срок автомобиль свободен,
+    # если не пересекаются интервалы аренд; в ремонте - нельзя
+    row = conn.execute(CAR_STATUS, (car_id,)).fetchone()
+    if row is None:
+        raise CarUnavailableError(f"Автомобиль {car_id} не найден")
+    if row[0] == 'maintenance':
+        raise CarUnavailableError(f"Автомобиль {car_id} в ремонте")
+    if not is_car_available(conn, car_id, start, end):
+        raise CarUnavailableError(f"Автомобиль {car_id} уже забронирован на этот период")
+
+    quote = pricing.quote(conn, car_id, start, end, service_ids)
+    cursor = conn.execute(RENTAL_INSERT, (client_id, car_id, start, end, quote.total_cost, quote.deposit))
+    conn.executemany(RENTAL_SERVICE_INSERT, [(cursor.lastrowid, service_id) for service_id in service_ids])
+    sync_car_status(conn, [car_id])
+    return cursor.lastrowid, quote
+
+
+def reserve_car(conn: Connection, client_id, car_id, start, end, service_ids, pricing,
+                retries=RETRIES, backoff=BACKOFF):
+    """Бронирует автомобиль и фиксирует транзакцию.
+
+    CarUnavailableError - автомобиль занят или в ремонте; sqlite3.OperationalError
+    'database is locked' - база занята и после retries повторов.
+    """
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("Бронирование начинает собственную транзакцию")
+    for attempt in range(1, retries + 2):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rental_id, quote = try_reserve(conn, client_id, car_id, start, end, service_ids, pricing)
+            conn.commit()
+            return Reservation(rental_id, quote, attempt)
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e) or attempt > retries:
+                raise
+            # Случайный множитель разводит повторы терминалов во времени
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
@@ -0,0 +1,151 @@
+"""Сводные таблицы для отчетов, поддерживаемые триггерами.
+
+revenue_daily - выручка по дням и категориям (завершенные платежи),
+car_rentals_daily - число аренд по дням начала и автомобилям (кроме отмененных).
+Отчет за период читает строки только этого периода, а не всю историю.
+Текущие активные аренды и автомобили в ремонте читаются по индексам
+idx_rentals_current и idx_cars_status (database/models.py).
+"""
+from sqlite3 import Connection
+
+from database.models import create_indexes
+
+_UPSERT_REVENUE = '''
+    INSERT INTO revenue_daily (day, category_id, amount, payments)
+    SELECT date({row}.payment_date), c.category_id, {sign}{row}.amount, {sign}1
+    FROM rentals r
+    JOIN cars c ON c.car_id = r.car_id
+    WHERE r.rental_id = {row}.rental_id AND {row}.status = 'completed'
+    ON CONFLICT (day, category_id) DO UPDATE SET
+        amount = amount + excluded.amount,
+        payments = payments + excluded.payments;'''
+
+_UPSERT_CAR_RENTALS = '''
+    INSERT INTO car_rentals_daily (day, car_id, rentals)
+    SELECT date({row}.start_date), {row}.car_id, {sign}1
+    WHERE {row}.status != 'cancelled'
+    ON CONFLICT (day, car_id) DO UPDATE SET rentals = rentals + excluded.rentals;'''
+
+
+# Перенос уже учтенных платежей при смене автомобиля аренды или категории автомобиля
+_MOVE_REVENUE = '''
+    INSERT INTO revenue_daily (day, category_id, amount, payments)
+    SELECT date(p.payment_date), {category}, {sign}SUM(p.amount), {sign}COUNT(*)
+    FROM rentals r
+    JOIN payments p ON p.rental_id = r.rental_id
+    JOIN cars c ON c.car_id = {car}
+    WHERE {where} AND p.status = 'completed'
+    GROUP BY 1, 2
+    ON CONFLICT (day, category_id) DO UPDATE SET
+        amount = amount + excluded.amount,
+        payments = payments + excluded.payments;'''
+
+
+def _revenue(row, sign=''):
+    return _UPSERT_REVENUE.format(row=row, sign=sign)
+
+
+def _car_rentals(row, sign=''):
+    return _UPSERT_CAR_RENTALS.format(row=row, sign=sign)
+
+
+def create_rollups(conn: Connection):
+    """Создает сводные таблицы, триггеры и заполняет их по истории"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS revenue_daily (
+        day DATE NOT NULL,
+        category_id INTEGER NOT NULL,
+        amount REAL NOT NULL DEFAULT 0,
+        payments INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, category_id)
+    ) WITHOUT ROWID''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS car_rentals_daily (
+        day DATE NOT NULL,
+        car_id INTEGER NOT NULL,
+        rentals INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, car_id)
+    ) WITHOUT ROWID''')
+    create_indexes(conn)
+    create_rollup_triggers(conn)
+    rebuild_rollups(conn)
+
+
+def create_rollup_triggers(conn: Connection):
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_payments_ai AFTER INSERT ON payments
+    BEGIN {_revenue('NEW')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_payments_au
+    AFTER UPDATE OF rental_id, amount, payment_date, status ON payments
+    BEGIN {_revenue('OLD', '-')} {_revenue('NEW')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_payments_ad AFTER DELETE ON payments
+    BEGIN {_revenue('OLD', '-')}
+    END''')
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_rentals_car_au AFTER UPDATE OF car_id ON rentals
+    WHEN OLD.car_id IS NOT NEW.car_id
+    BEGIN {_MOVE_REVENUE.format(category='c.category_id', car='OLD.car_id', sign='-',
+                                where='r.rental_id = NEW.rental_id')}
+          {_MOVE_REVENUE.format(category='c.category_id', car='NEW.car_id', sign='',
+                                where='r.rental_id = NEW.rental_id')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_cars_au AFTER UPDATE OF category_id ON cars
+    WHEN OLD.category_id IS NOT NEW.category_id
+    BEGIN {_MOVE_REVENUE.format(category='OLD.category_id', car='r.car_id', sign='-',
+                                where='r.car_id = NEW.car_id')}
+          {_MOVE_REVENUE.format(category='NEW.category_id', car='r.car_id', sign='',
+                                where='r.car_id = NEW.car_id')}
+    END''')
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_rentals_ai AFTER INSERT ON rentals
+    BEGIN {_car_rentals('NEW')}
+    END''')
+    # Смена статуса без отмены (active -> overdue -> completed) счетчики не меняет
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_rentals_au
+    AFTER UPDATE OF car_id, start_date, status ON rentals
+    WHEN OLD.car_id IS NOT NEW.car_id
+      OR OLD.start_date IS NOT NEW.start_date
+      OR (OLD.status = 'cancelled') != (NEW.status = 'cancelled')
+    BEGIN {_car_rentals('OLD', '-')} {_car_rentals('NEW')}
+    END''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS rollup_rentals_ad AFTER DELETE ON rentals
+    BEGIN {_car_rentals('OLD', '-')}
+    END''')
+
+
+def drop_rollup_triggers(conn: Connection):
+    """Отключает пересчет сводок на время массовой загрузки; возвращает True, если он был"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'rollup\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+    return bool(names)
+
+
+def rebuild_rollups(conn: Connection):
+    """Пересчитывает сводные таблицы по всей истории одним проходом"""
+    conn.execute('DELETE FROM revenue_daily')
+    conn.execute('''
+    INSERT INTO revenue_daily (day, category_id, amount, payments)
+    SELECT date(p.payment_date), c.category_id, SUM(p.amount), COUNT(*)
+    FROM payments p
+    JOIN rentals r ON r.rental_id = p.rental_id
+    JOIN cars c ON c.car_id = r.car_id
+    WHERE p.status = 'completed'
+    GROUP BY 1, 2''')
+    conn.execute('DELETE FROM car_rentals_daily')
+    conn.execute('''
+    INSERT INTO car_rentals_daily (day, car_id, rentals)
+    SELECT date(start_date), car_id, COUNT(*)
+    FROM rentals
+    WHERE status != 'cancelled'
+    GROUP BY 1, 2''')
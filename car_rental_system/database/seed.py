@@ -1,267 +1,444 @@
+import argparse
 import sys
+import time
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from datetime import datetime, timedelta
-from random import choice, randint, uniform
-import sqlite3
-   
-
+from random import Random
 
 # Добавляем родительскую директорию в PYTHONPATH
 sys.path.append(str(Path(__file__).parent.parent))
 
+from database.availability import create_interval_triggers, drop_interval_triggers, rebuild_interval_index
+from database.balances import create_balance_triggers, drop_balance_triggers, rebuild_balances
+from database.changelog import create_changelog_triggers, drop_changelog_triggers, mark_full_reload
+from database.client_search import (create_client_search_triggers, drop_client_search_triggers,
+                                    rebuild_client_search_index)
 from database.connection import get_db_connection
+from database.models import create_indexes, drop_indexes
+from database.pricing import bump_pricing_version, create_pricing_triggers, drop_pricing_triggers
+from database.rollups import create_rollup_triggers, drop_rollup_triggers, rebuild_rollups
 
-def fill_test_data():
-    """Заполняет базу данных тестовыми данными"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # 1. Категории автомобилей
-        categories = [
-            ('Эконом', 1500, 5000, 'Компактные городские автомобили'),
-            ('Комфорт', 2500, 10000, 'Седаны среднего класса'),
-            ('Бизнес', 4000, 15000, 'Премиальные автомобили'),
-            ('Внедорожник', 3500, 12000, 'SUV и кроссоверы'),
-            ('Минивэн', 3000, 10000, 'Для больших компаний'),
-            ('Спорт', 6000, 20000, 'Спортивные автомобили'),
-            ('Электромобиль', 4500, 15000, 'Экологичный транспорт')
-        ]
-        cursor.executemany(
-            'INSERT OR IGNORE INTO categories (name, daily_rate, deposit_amount, description) VALUES (?, ?, ?, ?)',
-            categories
-        )
+CATEGORIES = [
+    ('Эконом', 1500, 5000, 'Компактные городские автомобили'),
+    ('Комфорт', 2500, 10000, 'Седаны среднего класса'),
+    ('Бизнес', 4000, 15000, 'Премиальные автомобили'),
+    ('Внедорожник', 3500, 12000, 'SUV и кроссоверы'),
+    ('Минивэн', 3000, 10000, 'Для больших компаний'),
+    ('Спорт', 6000, 20000, 'Спортивные автомобили'),
+    ('Электромобиль', 4500, 15000, 'Экологичный транспорт')
+]
+
+SERVICES = [
+    ('Детское кресло', 300, 'Детское удерживающее устройство'),
+    ('Навигатор', 200, 'GPS навигация'),
+    ('Полная страховка', 500, 'Страховка без франшизы'),
+    ('Дополнительный водитель', 1000, 'Второй водитель в договоре'),
+    ('Доставка авто', 1500, 'Доставка автомобиля клиенту'),
+    ('Зимние шины', 800, 'Комплект зимней резины'),
+    ('Wi-Fi роутер', 400, 'Мобильный интернет в авто')
+]
+
+EMPLOYEES = [
+    ('Иван', 'Петров', 'Менеджер', '2020-01-15', '+79161234567', 'manager@rental.ru', 50000),
+    ('Ольга', 'Сидорова', 'Администратор', '2021-03-10', '+79169876543', 'admin@rental.ru', 45000),
+    ('Алексей', 'Козлов', 'Механик', '2019-05-20', '+79151112233', 'mechanic@rental.ru', 40000)
+]
+
+BRANDS_MODELS = [
+    ('Toyota', 'Camry'), ('Toyota', 'Corolla'), ('Toyota', 'RAV4'), ('Toyota', 'Prius'),
+    ('Kia', 'Rio'), ('Kia', 'Optima'), ('Kia', 'Sportage'), ('Kia', 'Sorento'),
+    ('Hyundai', 'Solaris'), ('Hyundai', 'Sonata'), ('Hyundai', 'Tucson'), ('Hyundai', 'Santa Fe'),
+    ('BMW', '3 Series'), ('BMW', '5 Series'), ('BMW', 'X3'), ('BMW', 'X5'),
+    ('Mercedes', 'C-Class'), ('Mercedes', 'E-Class'), ('Mercedes', 'GLC'), ('Mercedes', 'GLE'),
+    ('Audi', 'A4'), ('Audi', 'A6'), ('Audi', 'Q5'), ('Audi', 'Q7'),
+    ('Volkswagen', 'Polo'), ('Volkswagen', 'Passat'), ('Volkswagen', 'Tiguan'), ('Volkswagen', 'Teramont'),
+    ('Skoda', 'Octavia'), ('Skoda', 'Superb'), ('Skoda', 'Kodiaq')
+]
+
+FIRST_NAMES = ['Иван', 'Алексей', 'Дмитрий', 'Сергей', 'Андрей', 'Михаил',
+               'Мария', 'Елена', 'Анна', 'Ольга', 'Наталья', 'Татьяна']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Васильев',
+              'Павлов', 'Семенов', 'Голубев', 'Виноградов', 'Козлов', 'Лебедев']
+COLORS = ['Белый', 'Серый', 'Черный', 'Серебристый', 'Красный', 'Синий']
+STREETS = ['Ленина', 'Пушкина', 'Гагарина']
+DAMAGES = ['Царапина на двери', 'Вмятина на бампере', 'Разбитое зеркало',
+           'Повреждение салона', 'Потертости на кузове']
+NOTES = ['нет', 'нужна детская кресло', 'доставка', 'полная страховка']
+PAYMENT_METHODS = ['cash', 'card', 'bank_transfer', 'online']
+
+DATE_FMT = '%Y-%m-%d %H:%M:%S'
+CAR_ATTEMPTS = 5  # Сколько автомобилей пробовать для текущей аренды или брони
+
+
+class _Stats:
+    """Счетчики вставленных строк и времени по таблицам"""
+
+    def __init__(self):
+        self.rows = {}
+        self.seconds = {}
+
+    def add(self, table, rows, seconds):
+        self.rows[table] = self.rows.get(table, 0) + rows
+        self.seconds[table] = self.seconds.get(table, 0.0) + seconds
+
+    def report(self, total_seconds):
+        for table, rows in self.rows.items():
+            rate = rows / self.seconds[table] if self.seconds[table] else 0
+            print(f"• {table}: {rows} строк, {rate:,.0f} строк/с")
+        total = sum(self.rows.values())
+        print(f"Итого: {total} строк за {total_seconds:.1f} с "
+              f"({total / total_seconds if total_seconds else 0:,.0f} строк/с)")
 
-        # 2. Дополнительные услуги
-        services = [
-            ('Детское кресло', 300, 'Детское удерживающее устройство'),
-            ('Навигатор', 200, 'GPS навигация'),
-            ('Полная страховка', 500, 'Страховка без франшизы'),
-            ('Дополнительный водитель', 1000, 'Второй водитель в договоре'),
-            ('Доставка авто', 1500, 'Доставка автомобиля клиенту'),
-            ('Зимние шины', 800, 'Комплект зимней резины'),
-            ('Wi-Fi роутер', 400, 'Мобильный интернет в авто')
-        ]
-        cursor.executemany(
-            'INSERT OR IGNORE INTO services (name, price, description) VALUES (?, ?, ?)',
-            services
+
+def _chunks(count, chunk_size):
+    """Границы порций [start, stop) для count строк"""
+    for start in range(0, count, chunk_size):
+        yield start, min(start + chunk_size, count)
+
+
+def _max_id(cursor, table, column):
+    return cursor.execute(f'SELECT COALESCE(MAX({column}), 0) FROM {table}').fetchone()[0]
+
+
+def _insert_reference_data(cursor):
+    cursor.executemany(
+        'INSERT OR IGNORE INTO categories (name, daily_rate, deposit_amount, description) VALUES (?, ?, ?, ?)',
+        CATEGORIES
+    )
+    cursor.executemany(
+        'INSERT OR IGNORE INTO services (name, price, description) VALUES (?, ?, ?)',
+        SERVICES
+    )
+    cursor.executemany(
+        '''INSERT OR IGNORE INTO employees
+        (first_name, last_name, position, hire_date, phone, email, salary)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        EMPLOYEES
+    )
+
+
+def _car_rows(rnd, first_id, start, stop, category_ids):
+    for i in range(start, stop):
+        car_id = first_id + i
+        brand, model = BRANDS_MODELS[i % len(BRANDS_MODELS)]
+        yield (
+            car_id, brand, model, 2018 + i % 6,
+            f"{chr(1040 + car_id % 32)}{car_id:07d}{chr(1040 + car_id // 32 % 32)}",
+            category_ids[i % len(category_ids)],
+            rnd.choice(COLORS),
+            10000 + rnd.randint(0, 200000),
+            f"VIN{car_id:014d}",
+            'maintenance' if rnd.randint(1, 20) == 1 else 'available',
+            f"202{rnd.randint(0, 3)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            f"2023-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}" if i % 3 == 0 else None
         )
 
-        # 3. Сотрудники
-        employees = [
-            ('Иван', 'Петров', 'Менеджер', '2020-01-15', '+79161234567', 'manager@rental.ru', 50000),
-            ('Ольга', 'Сидорова', 'Администратор', '2021-03-10', '+79169876543', 'admin@rental.ru', 45000),
-            ('Алексей', 'Козлов', 'Механик', '2019-05-20', '+79151112233', 'mechanic@rental.ru', 40000)
-        ]
-        cursor.executemany(
-            '''INSERT OR IGNORE INTO employees 
-            (first_name, last_name, position, hire_date, phone, email, salary) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)''',
-            employees
+
+def _client_rows(rnd, first_id, start, stop):
+    for i in range(start, stop):
+        client_id = first_id + i
+        yield (
+            client_id,
+            rnd.choice(FIRST_NAMES),
+            rnd.choice(LAST_NAMES),
+            f"19{rnd.randint(60, 99)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            f"{client_id // 1000000:04d} {client_id % 1000000:06d}",
+            f"{client_id // 1000000 + 10:02d} {client_id % 1000000:06d}",
+            f"+79{rnd.randint(10000000, 99999999)}",
+            f"{rnd.choice(FIRST_NAMES).lower()}.{rnd.choice(LAST_NAMES).lower()}{client_id}@example.com",
+            f"202{rnd.randint(0, 3)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            rnd.randint(3, 5),
+            f"г. Москва, ул. {rnd.choice(STREETS)}, д. {rnd.randint(1, 100)}"
         )
 
-        # 4. Автомобили (30+ записей)
-        brands_models = [
-            ('Toyota', 'Camry'), ('Toyota', 'Corolla'), ('Toyota', 'RAV4'), ('Toyota', 'Prius'),
-            ('Kia', 'Rio'), ('Kia', 'Optima'), ('Kia', 'Sportage'), ('Kia', 'Sorento'),
-            ('Hyundai', 'Solaris'), ('Hyundai', 'Sonata'), ('Hyundai', 'Tucson'), ('Hyundai', 'Santa Fe'),
-            ('BMW', '3 Series'), ('BMW', '5 Series'), ('BMW', 'X3'), ('BMW', 'X5'),
-            ('Mercedes', 'C-Class'), ('Mercedes', 'E-Class'), ('Mercedes', 'GLC'), ('Mercedes', 'GLE'),
-            ('Audi', 'A4'), ('Audi', 'A6'), ('Audi', 'Q5'), ('Audi', 'Q7'),
-            ('Volkswagen', 'Polo'), ('Volkswagen', 'Passat'), ('Volkswagen', 'Tiguan'), ('Volkswagen', 'Teramont'),
-            ('Skoda', 'Octavia'), ('Skoda', 'Superb'), ('Skoda', 'Kodiaq')
-        ]
-
-
-        for i, (brand, model) in enumerate(brands_models):
-            try:
-                cursor.execute(
-                    '''INSERT OR IGNORE INTO cars 
-                    (brand, model, year, license_plate, category_id, color, mileage, vin, status, purchase_date, last_service_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (
-                        brand,
-                        model,
-                        2018 + i % 6,
-                        f"{chr(1040 + i//10)}{i%1000:03d}{chr(1040 + (i//10)%32)}{chr(1040 + (i//5)%32)}777",
-                        (i % 7) + 1,
-                        choice(['Белый', 'Серый', 'Черный', 'Серебристый', 'Красный', 'Синий']),
-                        10000 + i*2000,
-                        f"VIN{randint(10000000000000000, 99999999999999999)}",
-                        choice(['available', 'available', 'available', 'rented', 'maintenance']),
-                        f"202{randint(0,3)}-{randint(1,12):02d}-{randint(1,28):02d}",
-                        f"2023-{randint(1,12):02d}-{randint(1,28):02d}" if i % 3 == 0 else None
-                    )
-                )
-            except sqlite3.IntegrityError:
-                continue  # Пропускаем дубликаты
-
-        # 5. Клиенты (50+ записей)
-        first_names = ['Иван', 'Алексей', 'Дмитрий', 'Сергей', 'Андрей', 'Михаил',
-                      'Мария', 'Елена', 'Анна', 'Ольга', 'Наталья', 'Татьяна']
-        last_names = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Васильев',
-                     'Павлов', 'Семенов', 'Голубев', 'Виноградов', 'Козлов', 'Лебедев']
-
-        for i in range(50):
-            try:
-                cursor.execute(
-                    '''INSERT OR IGNORE INTO clients 
-                    (first_name, last_name, birth_date, passport_number, driver_license, phone, email, registration_date, rating, address)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (
-                        choice(first_names),
-                        choice(last_names),
-                        f"19{randint(60,99)}-{randint(1,12):02d}-{randint(1,28):02d}",
-                        f"{randint(1000,9999)} {randint(100000,999999)}",
-                        f"{randint(10,99)} {randint(100000,999999)}",
-                        f"+79{randint(10000000,99999999)}",
-                        f"{choice(first_names).lower()}.{choice(last_names).lower()}@example.com",
-                        f"202{randint(0,3)}-{randint(1,12):02d}-{randint(1,28):02d}",
-                        randint(3, 5),
-                        f"г. Москва, ул. {choice(['Ленина', 'Пушкина', 'Гагарина'])}, д. {randint(1,100)}"
-                    )
-                )
-            except sqlite3.IntegrityError:
-                continue  # Пропускаем дубликаты
-
-        # 6. Аренды (100+ записей)
-        for _ in range(100):
-            car_id = randint(1, 30)
-            cursor.execute('SELECT category_id, status FROM cars WHERE car_id = ?', (car_id,))
-            car_data = cursor.fetchone()
-            
-            if not car_data or car_data[1] != 'available':
-                continue
-                
-            category_id = car_data[0]
-            
-            cursor.execute('SELECT daily_rate, deposit_amount FROM categories WHERE category_id = ?', (category_id,))
-            rates = cursor.fetchone()
-            if not rates:
-                continue
-                
-            daily_rate, deposit = rates
-
-
-            start_date = datetime.now() - timedelta(days=randint(1, 180))
-            end_date = start_date + timedelta(days=randint(1, 14))
-            
-            # Определяем статус аренды
-            if randint(1,5) == 1:  # 20% chance of overdue
-                actual_end_date = end_date + timedelta(days=randint(1,7))
-                status = 'overdue'
+
+def _overlaps(periods, start, end):
+    return any(s < end and start < e for s, e in periods)
+
+
+def _open_periods(cursor):
+    """Сроки уже имеющихся текущих аренд и броней по автомобилям"""
+    periods = {}
+    for car_id, start, end in cursor.execute(
+            "SELECT car_id, start_date, end_date FROM rentals WHERE status IN ('active', 'reserved')"):
+        periods.setdefault(car_id, []).append((datetime.fromisoformat(start), datetime.fromisoformat(end)))
+    return periods
+
+
+def _rental_batch(rnd, first_id, start, stop, cars, client_range, service_ids,
+                  employee_ids, today, history_days, open_periods):
+    """Порция аренд вместе с платежами, повреждениями и услугами.
+    Текущие аренды и брони одного автомобиля не пересекаются: их сроки
+    копятся в open_periods (car_id -> [(начало, конец)]) между порциями"""
+    rentals, payments, damages, services = [], [], [], []
+    now = datetime.combine(today, datetime.min.time())
+    first_client, last_client = client_range
+
+    for i in range(start, stop):
+        rental_id = first_id + i
+        car_id, daily_rate, deposit = cars[rnd.randrange(len(cars))]
+        start_date = now - timedelta(days=rnd.randint(-30, history_days),
+                                     hours=rnd.randint(8, 20))
+        days = rnd.randint(1, 14)
+        end_date = start_date + timedelta(days=days)
+        actual_end_date = None
+
+        if start_date > now:
+            status = 'cancelled' if rnd.randint(1, 20) == 1 else 'reserved'
+        elif end_date >= now:
+            status = 'active'
+        elif rnd.randint(1, 12) == 1:
+            status = 'cancelled'
+        elif rnd.randint(1, 10) == 1:
+            status = 'overdue'
+            actual_end_date = end_date + timedelta(days=rnd.randint(1, 7))
+        else:
+            status = 'completed'
+            actual_end_date = end_date
+
+        if status in ('active', 'reserved'):
+            # Автомобиль занят в эти даты - другой случайный; если заняты и
+            # несколько других, аренда записывается отмененной
+            for _ in range(CAR_ATTEMPTS):
+                if not _overlaps(open_periods.get(car_id, ()), start_date, end_date):
+                    open_periods.setdefault(car_id, []).append((start_date, end_date))
+                    break
+                car_id, daily_rate, deposit = cars[rnd.randrange(len(cars))]
             else:
-                actual_end_date = end_date if randint(0,1) else None
-                status = choice(['reserved', 'active', 'completed', 'cancelled'])
-            
-            # Расчет стоимости
-            days = (end_date - start_date).days
-            total_cost = daily_rate * max(1, days) * uniform(0.9, 1.1)
-            
-            try:
-                cursor.execute(
-                    '''INSERT INTO rentals 
-                    (client_id, car_id, start_date, end_date, actual_end_date, total_cost, deposit_amount, status, notes, employee_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (
-                        randint(1, 50),
-                        car_id,
-                        start_date.strftime('%Y-%m-%d %H:%M:%S'),
-                        end_date.strftime('%Y-%m-%d %H:%M:%S'),
-                        actual_end_date.strftime('%Y-%m-%d %H:%M:%S') if actual_end_date else None,
-                        round(total_cost, 2),
-                        deposit,
-                        status,
-                        f"Дополнительные пожелания: {choice(['нет', 'нужна детская кресло', 'доставка', 'полная страховка'])}",
-                        randint(1, 3)
-                    )
-                )
-
-                # Обновляем статус автомобиля
-                new_status = 'rented' if status in ['active', 'overdue'] else 'reserved' if status == 'reserved' else 'available'
-                cursor.execute('UPDATE cars SET status = ? WHERE car_id = ?', (new_status, car_id))
-                
-                # Добавляем услуги (30% chance)
-                if randint(1,10) <= 3:
-                    service_id = randint(1,7)
-                    cursor.execute(
-                        'INSERT OR IGNORE INTO rental_services (rental_id, service_id, quantity) VALUES (?, ?, ?)',
-                        (cursor.lastrowid, service_id, randint(1,3))
-                    )
-            except sqlite3.IntegrityError:
-                conn.rollback()
-                continue
-
-
-        # 7. Платежи
-        cursor.execute('SELECT rental_id, total_cost, deposit_amount, status FROM rentals')
-        for rental_id, total_cost, deposit, status in cursor.fetchall():
-            if status in ['active', 'completed', 'overdue']:
-                # Основной платеж
-                cursor.execute(
-                    '''INSERT INTO payments 
-                    (rental_id, amount, payment_date, payment_method, transaction_id, status)
-                    VALUES (?, ?, ?, ?, ?, ?)''',
-                    (
-                        rental_id,
-                        total_cost + deposit,
-                        (datetime.now() - timedelta(days=randint(0,30))).strftime('%Y-%m-%d %H:%M:%S'),
-                        choice(['cash', 'card', 'bank_transfer', 'online']),
-                        f"TR{randint(1000000000,9999999999)}",
-                        'completed'
-                    )
-                )
-                
-                # Возврат депозита (50% chance)
-                if status in ['completed', 'overdue'] and randint(0,1) and deposit > 0:
-                    cursor.execute(
-                        '''INSERT INTO payments 
-                        (rental_id, amount, payment_date, payment_method, transaction_id, status)
-                        VALUES (?, ?, ?, ?, ?, ?)''',
-                        (
-                            rental_id,
-                            -deposit,
-                            (datetime.now() + timedelta(days=randint(1,14))).strftime('%Y-%m-%d %H:%M:%S'),
-                            'bank_transfer',
-                            f"REF{randint(1000000000,9999999999)}",
-                            'completed'
-                        )
-                    )
-
-        # 8. Повреждения (10% от завершенных аренд)
-        cursor.execute('SELECT rental_id, car_id FROM rentals WHERE status IN ("completed", "overdue")')
-        for rental_id, car_id in cursor.fetchall():
-            if randint(1,10) == 1:
-                cursor.execute(
-                    '''INSERT INTO damages 
-                    (rental_id, car_id, description, repair_cost, reported_date, repaired_date, status, employee_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (
-                        rental_id,
-                        car_id,
-                        choice(['Царапина на двери', 'Вмятина на бампере', 'Разбитое зеркало', 
-                               'Повреждение салона', 'Потертости на кузове']),
-                        round(uniform(1000, 20000), 2),
-                        (datetime.now() - timedelta(days=randint(1,30))).strftime('%Y-%m-%d %H:%M:%S'),
-                        (datetime.now() + timedelta(days=randint(1,14))).strftime('%Y-%m-%d %H:%M:%S') if randint(0,1) else None,
-                        choice(['reported', 'under_repair', 'repaired', 'paid']),
-                        randint(1,3)
-                    )
-                )
+                status = 'cancelled'
+
+        total_cost = round(daily_rate * days * rnd.uniform(0.9, 1.1), 2)
+        rentals.append((
+            rental_id,
+            rnd.randint(first_client, last_client),
+            car_id,
+            start_date.strftime(DATE_FMT),
+            end_date.strftime(DATE_FMT),
+            actual_end_date.strftime(DATE_FMT) if actual_end_date else None,
+            total_cost,
+            deposit,
+            status,
+            f"Дополнительные пожелания: {rnd.choice(NOTES)}",
+            rnd.choice(employee_ids)
+        ))
+
+        # Дополнительные услуги (30%)
+        if rnd.randint(1, 10) <= 3:
+            services.append((rental_id, rnd.choice(service_ids), rnd.randint(1, 3)))
+
+        if status in ('active', 'completed', 'overdue'):
+            # Основной платеж
+            payments.append((
+                rental_id, total_cost + deposit, start_date.strftime(DATE_FMT),
+                rnd.choice(PAYMENT_METHODS), f"TR{rental_id:010d}", 'completed'
+            ))
+            # Возврат депозита (50% завершенных)
+            if actual_end_date and rnd.randint(0, 1) and deposit > 0:
+                payments.append((
+                    rental_id, -deposit,
+                    (actual_end_date + timedelta(days=rnd.randint(1, 14))).strftime(DATE_FMT),
+                    'bank_transfer', f"REF{rental_id:010d}", 'completed'
+                ))
+            # Повреждения (10% завершенных)
+            if actual_end_date and rnd.randint(1, 10) == 1:
+                damages.append((
+                    rental_id, car_id, rnd.choice(DAMAGES),
+                    round(rnd.uniform(1000, 20000), 2),
+                    actual_end_date.strftime(DATE_FMT),
+                    (actual_end_date + timedelta(days=rnd.randint(1, 14))).strftime(DATE_FMT)
+                    if rnd.randint(0, 1) else None,
+                    rnd.choice(['reported', 'under_repair', 'repaired', 'paid']),
+                    rnd.choice(employee_ids)
+                ))
+
+    return rentals, payments, damages, services
+
+
+def _restore_derived(conn, dropped):
+    """Строит индексы и перестраивает то, что generate_data отключил на время загрузки"""
+    create_indexes(conn)
+    if dropped['intervals']:
+        rebuild_interval_index(conn)
+        create_interval_triggers(conn)
+    if dropped['pricing']:
+        create_pricing_triggers(conn)
+        bump_pricing_version(conn)
+    if dropped['rollups']:
+        rebuild_rollups(conn)
+        create_rollup_triggers(conn)
+    if dropped['balances']:
+        rebuild_balances(conn)
+        create_balance_triggers(conn)
+    if dropped['client_search']:
+        rebuild_client_search_index(conn)
+        create_client_search_triggers(conn)
+    if dropped['changelog']:
+        create_changelog_triggers(conn)
+        mark_full_reload(conn)
+    # Статистика - после перестройки производных таблиц, иначе они остаются без нее
+    conn.execute('ANALYZE')
+    conn.commit()
+
+
+def generate_data(db_path=None, cars=len(BRANDS_MODELS), clients=50, rentals=100,
+                  seed=42, chunk_size=50000, commit_every=1000000,
+                  history_days=5 * 365, today=None):
+    """Генерирует данные заданного объема (по умолчанию - небольшой набор).
+
+    Строки вставляются порциями по chunk_size через executemany, транзакция
+    фиксируется каждые commit_every строк. Вторичные индексы, журнал изменений,
+    поиск клиентов, R*Tree интервалов, версия тарифов и сводные таблицы отчетов
+    отключаются на время загрузки и перестраиваются в конце. Одинаковый seed дает одинаковые данные
+    (при одинаковой дате today).
+    """
+    if min(cars, clients, rentals) < 0:
+        raise ValueError("Размеры набора данных не могут быть отрицательными")
+    rnd = Random(seed)
+    today = today or date.today()
+    stats = _Stats()
+    started = time.perf_counter()
+
+    conn = get_db_connection(db_path, profile='bulk-load')
+    cursor = conn.cursor()
+    dropped = None
+    try:
+        # Проверка до отключения индексов и триггеров: ошибка не оставляет базу без них
+        if rentals and ((not cars and not _max_id(cursor, 'cars', 'car_id'))
+                        or (not clients and not _max_id(cursor, 'clients', 'client_id'))):
+            raise ValueError("Для генерации аренд нужны автомобили и клиенты")
+        _insert_reference_data(cursor)
+        drop_indexes(conn)
+        dropped = {
+            'changelog': drop_changelog_triggers(conn),
+            'client_search': drop_client_search_triggers(conn),
+            'rollups': drop_rollup_triggers(conn),
+            'balances': drop_balance_triggers(conn),
+            'intervals': drop_interval_triggers(conn),
+            'pricing': drop_pricing_triggers(conn),
+        }
+        conn.commit()
+
+        category_ids = [row[0] for row in cursor.execute(
+            'SELECT category_id FROM categories ORDER BY category_id')]
+        service_ids = [row[0] for row in cursor.execute('SELECT service_id FROM services')]
+        employee_ids = [row[0] for row in cursor.execute('SELECT employee_id FROM employees')]
+
+        pending = 0
+
+        def insert(table, sql, rows):
+            nonlocal pending
+            t = time.perf_counter()
+            cursor.executemany(sql, rows)
+            stats.add(table, len(rows), time.perf_counter() - t)
+            pending += len(rows)
+            if pending >= commit_every:
+                conn.commit()
+                pending = 0
+
+        # Автомобили
+        first_car = _max_id(cursor, 'cars', 'car_id') + 1
+        for start, stop in _chunks(cars, chunk_size):
+            t = time.perf_counter()
+            rows = list(_car_rows(rnd, first_car, start, stop, category_ids))
+            stats.add('cars', 0, time.perf_counter() - t)
+            insert('cars', '''INSERT INTO cars
+                (car_id, brand, model, year, license_plate, category_id, color, mileage, vin,
+                 status, purchase_date, last_service_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+
+        # Клиенты
+        first_client = _max_id(cursor, 'clients', 'client_id') + 1
+        for start, stop in _chunks(clients, chunk_size):
+            t = time.perf_counter()
+            rows = list(_client_rows(rnd, first_client, start, stop))
+            stats.add('clients', 0, time.perf_counter() - t)
+            insert('clients', '''INSERT INTO clients
+                (client_id, first_name, last_name, birth_date, passport_number, driver_license,
+                 phone, email, registration_date, rating, address)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+
+        # Аренды с платежами, повреждениями и услугами
+        fleet = cursor.execute('''
+            SELECT c.car_id, cat.daily_rate, cat.deposit_amount
+            FROM cars c JOIN categories cat ON c.category_id = cat.category_id
+        ''').fetchall()
+        client_range = cursor.execute(
+            'SELECT MIN(client_id), MAX(client_id) FROM clients').fetchone()
 
+        first_rental = _max_id(cursor, 'rentals', 'rental_id') + 1
+        open_periods = _open_periods(cursor)
+        for start, stop in _chunks(rentals, chunk_size):
+            t = time.perf_counter()
+            batch = _rental_batch(rnd, first_rental, start, stop, fleet, client_range,
+                                  service_ids, employee_ids, today, history_days, open_periods)
+            stats.add('rentals', 0, time.perf_counter() - t)
+            rental_rows, payment_rows, damage_rows, service_rows = batch
+            insert('rentals', '''INSERT INTO rentals
+                (rental_id, client_id, car_id, start_date, end_date, actual_end_date,
+                 total_cost, deposit_amount, status, notes, employee_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rental_rows)
+            insert('payments', '''INSERT INTO payments
+                (rental_id, amount, payment_date, payment_method, transaction_id, status)
+                VALUES (?, ?, ?, ?, ?, ?)''', payment_rows)
+            insert('damages', '''INSERT INTO damages
+                (rental_id, car_id, description, repair_cost, reported_date, repaired_date,
+                 status, employee_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', damage_rows)
+            insert('rental_services', '''INSERT OR IGNORE INTO rental_services
+                (rental_id, service_id, quantity) VALUES (?, ?, ?)''', service_rows)
+
+        # Статусы автомобилей по текущим арендам - одним запросом
+        cursor.execute('''
+            UPDATE cars SET status = CASE
+                WHEN car_id IN (SELECT car_id FROM rentals WHERE status IN ('active', 'overdue'))
+                    THEN 'rented'
+                WHEN car_id IN (SELECT car_id FROM rentals WHERE status = 'reserved')
+                    THEN 'reserved'
+                ELSE status
+            END
+            WHERE status != 'maintenance'
+        ''')
         conn.commit()
-        print("База данных успешно заполнена данными!")
-        print(f"• Категории: {len(categories)}")
-        print(f"• Автомобили: {len(brands_models)}") 
-        print(f"• Клиенты: 50")
-        print(f"• Аренды: 100")
-    
     except Exception as e:
         conn.rollback()
         print(f"Ошибка: {e}")
         raise
     finally:
-        conn.close()
+        try:
+            # Индексы и триггеры возвращаются и после ошибки - по уже зафиксированным строкам
+            if dropped is not None:
+                t = time.perf_counter()
+                _restore_derived(conn, dropped)
+                print(f"Индексы построены за {time.perf_counter() - t:.1f} с")
+        finally:
+            conn.close()
+
+    stats.report(time.perf_counter() - started)
+    return stats.rows
+
+
+def fill_test_data(db_path=None):
+    """Заполняет базу данных тестовыми данными"""
+    generate_data(db_path, chunk_size=1000)
+    print("База данных успешно заполнена данными!")
+
 
 if __name__ == "__main__":
-    fill_test_data()
+    parser = argparse.ArgumentParser(description="Генератор тестовых данных автопроката")
+    parser.add_argument("--db", help="файл базы данных (по умолчанию - основной)")
+    parser.add_argument("--cars", type=int, help="массовая загрузка: число автомобилей")
+    parser.add_argument("--clients", type=int, help="массовая загрузка: число клиентов")
+    parser.add_argument("--rentals", type=int, help="массовая загрузка: число аренд")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    sizes = (args.cars, args.clients, args.rentals)
+    if all(size is None for size in sizes):
+        fill_test_data(args.db)
+    elif None in sizes or not args.db:
+        # Большой набор не должен случайно попасть в рабочую базу
+        parser.error("для массовой загрузки укажите --cars, --clients, --rentals и --db")
+    else:
+        generate_data(args.db, cars=args.cars, clients=args.clients, rentals=args.rentals,
+                      seed=args.seed, chunk_size=args.chunk_size)
@@ -0,0 +1,316 @@
+"""Загрузка автопарка: доля дней, когда автомобили были в аренде.
+
+Интервалы всех аренд (кроме отмененных) загружаются один раз в массивы
+NumPy, индексированные номером аренды. Отчет за любой период - один
+векторный проход: обрезка интервалов по периоду, суммы дней по
+автомобилям (bincount), затем по категориям и маркам, и число занятых
+автомобилей по дням (разностный массив + cumsum).
+
+Массивы и готовые отчеты действительны для одного seq журнала изменений:
+при новых изменениях перечитываются только измененные аренды
+(changes_since), а при изменении автомобилей или категорий - справочник
+автомобилей. Полная перезагрузка - только если журнал уже очищен.
+
+NumPy - необязательная зависимость: без нее остальная программа работает,
+а отчет сообщает, что нужно установить numpy.
+
+Запуск из каталога car_rental_system:
+    python database/utilization.py [--db путь] [--from ГГГГ-ММ-ДД] [--to ГГГГ-ММ-ДД]
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from pathlib import Path
+from sqlite3 import Connection
+from typing import NamedTuple
+
+# Добавляем родительскую директорию в PYTHONPATH
+sys.path.append(str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from database.changelog import changes_since, current_seq
+from database.pagination import IDS_CHUNK
+from database.queries import UTILIZATION_CARS, UTILIZATION_RENTALS, UTILIZATION_RENTALS_BY_IDS
+
+FETCH_ROWS = 100_000  # Строк аренд за одно чтение при полной загрузке
+CACHE_SIZE = 32  # Отчетов за разные периоды на одну версию данных
+_EPOCH = date(1970, 1, 1)
+
+
+class CarUtilization(NamedTuple):
+    car_id: int
+    brand: str
+    model: str
+    license_plate: str
+    category: str
+    rentals: int  # аренд, пересекающих период
+    occupied_days: int
+    percent: float
+
+
+class GroupUtilization(NamedTuple):
+    name: str
+    cars: int
+    occupied_days: int
+    percent: float
+
+
+class DailyOccupancy(NamedTuple):
+    day: str
+    cars_out: int
+    percent: float
+
+
+class FleetUtilization(NamedTuple):
+    date_from: str
+    date_to: str  # включительно
+    days: int
+    cars_total: int
+    percent: float
+    cars: list  # [CarUtilization] по убыванию загрузки
+    categories: list  # [GroupUtilization]
+    brands: list  # [GroupUtilization]
+    daily: list  # [DailyOccupancy]
+
+
+def _day(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - _EPOCH).days
+
+
+def _percent(occupied, capacity):
+    return round(100.0 * occupied / capacity, 2) if capacity else 0.0
+
+
+class UtilizationEngine:
+    """Интервалы аренд в памяти и отчеты о загрузке; общий для потоков"""
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        if np is None:
+            raise RuntimeError("Для отчета о загрузке автопарка нужен NumPy: pip install numpy")
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._seq = None
+        self._reports = OrderedDict()  # (начало, конец, сегодня) -> FleetUtilization
+        # Аренды: индекс - rental_id; car = -1 - аренды нет или она отменена
+        self._car = np.full(0, -1, dtype=np.int32)
+        self._start = np.zeros(0, dtype=np.int32)
+        self._end = np.zeros(0, dtype=np.int32)
+        self._open = np.zeros(0, dtype=bool)
+        # Автомобили: индекс - car_id
+        self._cars = {}  # car_id -> (марка, модель, номер, категория)
+        self._car_category = np.zeros(0, dtype=np.int32)
+        self._car_brand = np.zeros(0, dtype=np.int32)
+        self._car_exists = np.zeros(0, dtype=bool)
+        self._categories = []
+        self._brands = []
+
+    def refresh(self, conn: Connection):
+        """Подтягивает изменения после последней загрузки; возвращает seq журнала"""
+        with self._lock:
+            if self._seq is None:
+                self._seq = current_seq(conn)  # до чтения: изменения во время загрузки применятся повторно
+                self._load_cars(conn)
+                self._load_rentals(conn)
+                return self._seq
+            change = changes_since(conn, self._seq)
+            if change.seq == self._seq:
+                return self._seq
+            if change.full_reload:
+                self._load_cars(conn)
+                self._load_rentals(conn)
+            else:
+                if 'cars' in change.changes or 'categories' in change.changes:
+                    self._load_cars(conn)
+                if 'rentals' in change.changes:
+                    self._patch_rentals(conn, list(change.changes['rentals']))
+            self._seq = change.seq
+            self._reports.clear()
+            return self._seq
+
+    def _load_cars(self, conn):
+        self._cars = {row[0]: tuple(row[1:]) for row in conn.execute(UTILIZATION_CARS)}
+        size = max(self._cars, default=0) + 1
+        self._categories = sorted({car[3] for car in self._cars.values()})
+        self._brands = sorted({car[0] for car in self._cars.values()})
+        categories = {name: index for index, name in enumerate(self._categories)}
+        brands = {name: index for index, name in enumerate(self._brands)}
+        self._car_category = np.zeros(size, dtype=np.int32)
+        self._car_brand = np.zeros(size, dtype=np.int32)
+        self._car_exists = np.zeros(size, dtype=bool)
+        for car_id, (brand, _, _, category) in self._cars.items():
+            self._car_category[car_id] = categories[category]
+            self._car_brand[car_id] = brands[brand]
+            self._car_exists[car_id] = True
+
+    def _load_rentals(self, conn):
+        cursor = conn.execute(UTILIZATION_RENTALS)
+        chunks = []
+        while rows := cursor.fetchmany(FETCH_ROWS):
+            chunks.append(np.array(rows, dtype=np.int32))
+        rows = np.concatenate(chunks) if chunks else np.zeros((0, 5), dtype=np.int32)
+        size = int(rows[:, 0].max()) + 1 if len(rows) else 0
+        self._resize(size, reset=True)
+        self._store(rows)
+
+    def _patch_rentals(self, conn, ids):
+        self._resize(max(ids) + 1)
+        self._car[ids] = -1  # Удаленные и отмененные не вернутся из запроса
+        for start in range(0, len(ids), IDS_CHUNK):
+            chunk = ids[start:start + IDS_CHUNK]
+            sql = UTILIZATION_RENTALS_BY_IDS.format(placeholders=', '.join('?' * len(chunk)))
+            rows = conn.execute(sql, chunk).fetchall()
+            if rows:
+                self._store(np.array(rows, dtype=np.int32))
+
+    def _resize(self, size, reset=False):
+        grow = size - (0 if reset else len(self._car))
+        if reset:
+            self._car = np.full(size, -1, dtype=np.int32)
+            self._start = np.zeros(size, dtype=np.int32)
+            self._end = np.zeros(size, dtype=np.int32)
+            self._open = np.zeros(size, dtype=bool)
+        elif grow > 0:
+            self._car = np.concatenate([self._car, np.full(grow, -1, dtype=np.int32)])
+            self._start = np.concatenate([self._start, np.zeros(grow, dtype=np.int32)])
+            self._end = np.concatenate([self._end, np.zeros(grow, dtype=np.int32)])
+            self._open = np.concatenate([self._open, np.zeros(grow, dtype=bool)])
+
+    def _store(self, rows):
+        ids = rows[:, 0]
+        self._car[ids] = rows[:, 1]
+        self._start[ids] = rows[:, 2]
+        # Аренда короче суток занимает день начала
+        self._end[ids] = np.maximum(rows[:, 3], rows[:, 2] + 1)
+        self._open[ids] = rows[:, 4].astype(bool)
+
+    def report(self, conn: Connection, date_from, date_to, today=None):
+        """Загрузка автопарка за период [date_from, date_to] (даты или 'ГГГГ-ММ-ДД')"""
+        first, last = _day(date_from), _day(date_to)
+        if last < first:
+            raise ValueError("Начало периода позже его конца")
+        today = _day(today or date.today())
+        self.refresh(conn)
+        key = (first, last, today)
+        with self._lock:
+            result = self._reports.get(key)
+            if result is None:
+                result = self._compute(first, last + 1, today)
+                self._reports[key] = result
+                while len(self._reports) > self.cache_size:
+                    self._reports.popitem(last=False)
+            else:
+                self._reports.move_to_end(key)
+            return result
+
+    def _compute(self, first, stop, today):
+        days = stop - first
+        cars_total = int(self._car_exists.sum())
+        size = len(self._car_exists)
+
+        # Невозвращенные автомобили заняты до сегодняшнего дня включительно
+        end = np.where(self._open, np.maximum(self._end, today + 1), self._end)
+        start = np.maximum(self._start, first)
+        end = np.minimum(end, stop)
+        mask = (end > start) & (self._car >= 0) & (self._car < size)
+        mask[mask] = self._car_exists[self._car[mask]]
+        car, start, end = self._car[mask], start[mask] - first, end[mask] - first
+        rentals = np.bincount(car, minlength=size)
+
+        # Пересекающиеся аренды одного автомобиля (старые или ручные данные) сливаются:
+        # после сортировки по (автомобиль, начало) каждая аренда добавляет только дни
+        # после конца предыдущих аренд того же автомобиля. Дни сдвигаются на
+        # car * (days + 1), чтобы накопленный максимум не переходил между автомобилями
+        span = days + 1
+        offset = car.astype(np.int64) * span
+        order = np.argsort(offset + start)
+        car, start, end, offset = car[order], start[order], end[order], offset[order]
+        reach = np.maximum.accumulate(offset + end)
+        covered = np.empty_like(start)
+        covered[:1] = 0
+        covered[1:] = reach[:-1] - offset[1:]  # < 0 у первой аренды автомобиля
+        start = np.maximum(start, covered)
+        keep = end > start
+        car, start, end = car[keep], start[keep], end[keep]
+
+        occupied = np.bincount(car, weights=end - start, minlength=size)
+        cars_out = np.cumsum(np.bincount(start, minlength=span) - np.bincount(end, minlength=span))[:days]
+
+        cars = [CarUtilization(car_id, brand, model, plate, category, int(rentals[car_id]),
+                               int(occupied[car_id]), _percent(occupied[car_id], days))
+                for car_id, (brand, model, plate, category) in self._cars.items()]
+        cars.sort(key=lambda c: (-c.occupied_days, c.car_id))
+        first_day = _EPOCH + timedelta(days=first)
+        return FleetUtilization(
+            first_day.isoformat(), (first_day + timedelta(days=days - 1)).isoformat(), days, cars_total,
+            _percent(occupied.sum(), cars_total * days), cars,
+            self._groups(self._categories, self._car_category, occupied, days),
+            self._groups(self._brands, self._car_brand, occupied, days),
+            [DailyOccupancy((first_day + timedelta(days=offset)).isoformat(), int(out),
+                            _percent(out, cars_total))
+             for offset, out in enumerate(cars_out.tolist())])
+
+    def _groups(self, names, index, occupied, days):
+        exists = self._car_exists
+        counts = np.bincount(index[exists], minlength=len(names))
+        sums = np.bincount(index[exists], weights=occupied[exists], minlength=len(names))
+        groups = [GroupUtilization(name, int(count), int(total), _percent(total, count * days))
+                  for name, count, total in zip(names, counts.tolist(), sums.tolist())]
+        return sorted(groups, key=lambda g: -g.percent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='файл базы (по умолчанию - база приложения)')
+    parser.add_argument('--from', dest='date_from', help='начало периода (по умолчанию - год назад)')
+    parser.add_argument('--to', dest='date_to', help='конец периода (по умолчанию - сегодня)')
+    parser.add_argument('--today', help='текущая дата для невозвращенных автомобилей')
+    parser.add_argument('--top', type=int, default=10, help='сколько автомобилей показать')
+    args = parser.parse_args()
+
+    from database.connection import get_read_connection
+
+    today = date.fromisoformat(args.today) if args.today else date.today()
+    date_to = args.date_to or today.isoformat()
+    date_from = args.date_from or (date.fromisoformat(date_to) - timedelta(days=364)).isoformat()
+    engine = UtilizationEngine()
+    conn = get_read_connection(args.db)
+    try:
+        started = time.perf_counter()
+        engine.refresh(conn)
+        loaded = time.perf_counter()
+        result = engine.report(conn, date_from, date_to, today)
+        computed = time.perf_counter()
+        engine.report(conn, date_from, date_to, today)
+        cached = time.perf_counter()
+    finally:
+        conn.close()
+
+    print(f"Загрузка автопарка с {result.date_from} по {result.date_to}: {result.percent:.2f}% "
+          f"({result.cars_total} автомобилей, {result.days} дней)")
+    for title, groups in (("По категориям", result.categories), ("По маркам", result.brands)):
+        print(f"{title}:")
+        for group in groups:
+            print(f"  {group.name}: {group.percent:.2f}% ({group.cars} автомобилей)")
+    print("Самые загруженные автомобили:")
+    for car in result.cars[:args.top]:
+        print(f"  {car.brand} {car.model} ({car.license_plate}, ID {car.car_id}): {car.percent:.2f}%, "
+              f"аренд {car.rentals}")
+    if result.daily:
+        peak = max(result.daily, key=lambda d: d.cars_out)
+        print(f"Пик: {peak.day}, в аренде {peak.cars_out} автомобилей ({peak.percent:.2f}%)")
+    print(f"Чтение аренд: {loaded - started:.3f} с, расчет: {computed - loaded:.3f} с, "
+          f"повтор из кэша: {(cached - computed) * 1000:.3f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Фоновый поток для обращений к БД из интерфейса Tk.
+
+Задачи выполняются по очереди в одном рабочем потоке на соединении из пула,
+поэтому записи идут в порядке вызова. Чтение для отчетов и списков
+(read_only=True) выполняется отдельным потоком на соединениях только для
+чтения: долгий отчет не задерживает бронирование, стоящее за ним в очереди,
+а в режиме WAL - и его фиксацию. Результаты передаются обратно в поток Tk
+через root.after: главный цикл не блокируется ни медленным отчетом, ни
+заблокированной базой.
+"""
+import queue
+import sqlite3
+import sys
+import threading
+from collections import deque
+from tkinter import messagebox
+
+from database.connection import get_db_connection, get_read_connection
+from database.instrumentation import action
+
+
+class DbTask:
+    """Задача рабочего потока: func(conn) и обработчики результата в потоке Tk"""
+
+    def __init__(self, func, on_done, on_error, error_text, description, background, on_cancel=None):
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.error_text = error_text
+        self.description = description
+        self.background = background  # не показывается индикатором занятости
+        self.cancelled = False
+        self.conn = None  # соединение, на котором задача выполняется сейчас
+
+
+class DbWorker:
+    """Очередь задач к БД с отменой через sqlite3.Connection.interrupt()"""
+
+    POLL_MS = 30
+
+    def __init__(self, root, on_busy=None):
+        self.root = root
+        self.on_busy = on_busy  # on_busy(описание текущей задачи или None)
+        self._cond = threading.Condition()
+        # Очереди и текущие задачи потоков записи (False) и чтения (True)
+        self._queues = {False: deque(), True: deque()}
+        self._current = {False: None, True: None}
+        self._results = queue.Queue()
+        self._pending = 0  # изменяются только в потоке Tk
+        self._visible = 0
+        self._polling = False
+        self._threads = [threading.Thread(target=self._run, args=(read_only,), daemon=True,
+                                          name='db-reader' if read_only else 'db-worker')
+                         for read_only in (False, True)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, func, on_done=None, on_error=None,
+               error_text="Ошибка базы данных", description="Обращение к базе данных",
+               background=False, read_only=False, on_cancel=None):
+        """Ставит func(conn) в очередь; on_done(result) или on_error(e) вызываются в потоке Tk.
+        Без on_error ошибка показывается в окне с текстом error_text.
+        У отмененной задачи вызывается только on_cancel() - вызывающий, ждущий
+        ответа (например, флаг загрузки страницы), сбрасывает в нем свое состояние.
+        Фоновые задачи (background=True) не включают индикатор занятости.
+        Задачи read_only=True получают соединение только для чтения и идут
+        в очередь потока чтения, независимую от очереди записи."""
+        task = DbTask(func, on_done, on_error, error_text, description, background, on_cancel)
+        with self._cond:
+            self._queues[read_only].append(task)
+            self._cond.notify_all()  # Ждут оба потока: разбудить нужно и поток этой очереди
+        self._pending += 1
+        self._visible += not background
+        self._notify_busy()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+        return task
+
+    def cancel(self, task):
+        """Отменяет задачу: ожидающая не запустится, выполняемая прервется"""
+        with self._cond:
+            task.cancelled = True
+            if task.conn is not None:
+                task.conn.interrupt()
+
+    def cancel_all(self):
+        """Отменяет ожидающие задачи и прерывает текущее чтение. Выполняемая
+        запись доводится до конца: она могла уже зафиксировать изменения,
+        и ее on_done должен сработать"""
+        with self._cond:
+            tasks = [task for pending in self._queues.values() for task in pending]
+            if self._current[True] is not None:
+                tasks.append(self._current[True])
+        for task in tasks:
+            self.cancel(task)
+
+    def shutdown(self, timeout=2.0):
+        self.cancel_all()
+        with self._cond:
+            for pending in self._queues.values():
+                pending.append(None)
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    # ========== Рабочий поток ==========
+    def _run(self, read_only):
+        tasks = self._queues[read_only]
+        connect = get_read_connection if read_only else get_db_connection
+        while True:
+            with self._cond:
+                while not tasks:
+                    self._cond.wait()
+                task = tasks.popleft()
+                if task is None:
+                    return
+                self._current[read_only] = task
+            result, error = None, None
+            conn = None
+            try:
+                if not task.cancelled:
+                    conn = connect()
+                    with self._cond:
+                        task.conn = conn
+                    # Замеры запросов (если включены) относятся к описанию задачи
+                    with action(task.description):
+                        result = task.func(conn)
+            except Exception as e:
+                error = e
+            finally:
+                with self._cond:
+                    task.conn = None
+                    self._current[read_only] = None
+                # Незафиксированные изменения откатываются при возврате в пул
+                if conn is not None:
+                    conn.close()
+            self._results.put((task, result, error))
+
+    # ========== Поток Tk ==========
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    task, result, error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending -= 1
+                self._visible -= not task.background
+                try:
+                    self._deliver(task, result, error)
+                except Exception:
+                    self.root.report_callback_exception(*sys.exc_info())
+            self._notify_busy()
+        finally:
+            if self._pending:
+                self.root.after(self.POLL_MS, self._poll)
+            else:
+                self._polling = False
+
+    def _deliver(self, task, result, error):
+        if task.cancelled:
+            if task.on_cancel is not None:
+                task.on_cancel()
+            return
+        if error is None:
+            if task.on_done is not None:
+                task.on_done(result)
+        elif task.on_error is not None:
+            task.on_error(error)
+        elif isinstance(error, sqlite3.OperationalError) and 'interrupted' in str(error):
+            return
+        else:
+            messagebox.showerror("Ошибка", f"{task.error_text}: {error}")
+
+    def _notify_busy(self):
+        if self.on_busy is None:
+            return
+        if not self._visible:
+            self.on_busy(None)
+            return
+        with self._cond:
+            tasks = [*self._current.values(), *self._queues[False], *self._queues[True]]
+        current = next((t for t in tasks if t is not None and not t.background), None)
+        self.on_busy(current.description if current else "Обращение к базе данных")
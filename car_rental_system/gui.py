@@ -1,19 +1,212 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
-from database.connection import get_db_connection
+from database.availability import find_available_cars, sync_car_status
+from database.balances import DEBTORS_LIMIT, clients_with_debt
+from database.changelog import changes_since, current_seq
+from database.checkin import check_in_rentals, parse_returns
+from database.client_search import SEARCH_LIMIT, search_clients
+from database.damages import DamageRow, import_damages, parse_damages
+from database.overdue import sweep_overdue
+from database.pricing import RentalPricingEngine
+from database.reservations import reserve_car
+from database.utilization import UtilizationEngine
+from database.pagination import PAGED_QUERIES, estimate_count, fetch_page, fetch_rows, sort_key
+from database import queries
+from db_worker import DbWorker
 import sqlite3
 
+
+class TreePager:
+    """Заполняет Treeview страницами и подгружает следующую при прокрутке к концу"""
+    
+    def __init__(self, worker, tree, scrollbar, status_var, name, title):
+        self.worker = worker
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.status_var = status_var
+        self.name = name
+        self.title = title
+        self.after = None
+        self.exhausted = True
+        self.estimate = 0
+        self.pending = False
+        self.active = False  # Список заполняется страницами (а не, например, результатами поиска)
+        self.generation = 0  # Ответы на запросы до очистки списка отбрасываются
+        self.keys = {}  # iid строки -> ключ сортировки
+        self.descending = PAGED_QUERIES[name].descending
+        tree.configure(yscrollcommand=self.on_scroll)
+        scrollbar.configure(command=tree.yview)
+    
+    def clear(self):
+        """Очищает список и отключает подгрузку (например, для результатов поиска)"""
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.keys.clear()
+        self.after = None
+        self.exhausted = True
+        self.pending = False
+        self.active = False
+        self.status_var.set("")
+    
+    def reset(self):
+        self.clear()
+        self.exhausted = False
+        self.active = True
+        self.pending = True
+        generation = self.generation
+        
+        def work(conn):
+            return estimate_count(conn, self.name), fetch_page(conn, self.name)
+        
+        def done(result):
+            if generation == self.generation:
+                self.estimate, page = result
+                self._show_page(page)
+        
+        self.worker.submit(work, done, self._failed, description=f"Загрузка: {self.title}",
+                           read_only=True, on_cancel=lambda: self._cancelled(generation))
+    
+    def load_more(self):
+        if self.exhausted:
+            return
+        self.pending = True
+        generation = self.generation
+        after = self.after
+        
+        def done(page):
+            if generation == self.generation:
+                self._show_page(page)
+        
+        self.worker.submit(lambda conn: fetch_page(conn, self.name, after), done, self._failed,
+                           description=f"Загрузка: {self.title}", read_only=True,
+                           on_cancel=lambda: self._cancelled(generation))
+    
+    def _cancelled(self, generation):
+        # Отмененная страница загрузится снова при следующей прокрутке к концу
+        if generation == self.generation:
+            self.pending = False
+    
+    def _failed(self, error):
+        self.pending = False
+        self.exhausted = True
+        if not (isinstance(error, sqlite3.OperationalError) and 'interrupted' in str(error)):
+            messagebox.showerror("Ошибка", f"Не удалось загрузить {self.title}: {error}")
+    
+    def _show_page(self, page):
+        for row in page.rows:
+            iid = str(row[0])
+            # Строка могла появиться раньше из журнала изменений
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            self.tree.insert("", tk.END, iid=iid, values=tuple(row))
+            self.keys[iid] = sort_key(self.name, row)
+        self.after = page.after
+        self.exhausted = page.after is None
+        self.pending = False
+        self._update_status()
+    
+    def apply_changes(self, changes, rows):
+        """Применяет журнал: changes - {id: операция}, rows - текущие строки измененных id"""
+        fresh = {str(row[0]): row for row in rows}
+        for row_id in changes:
+            iid = str(row_id)
+            if iid in fresh:
+                continue
+            # Строка удалена
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+                self.keys.pop(iid, None)
+        
+        if not self.active:
+            # Результаты поиска: только обновляем видимые строки
+            for iid, row in fresh.items():
+                if self.tree.exists(iid):
+                    self.tree.item(iid, values=tuple(row))
+            return
+        
+        # Измененные строки ставятся на место по ключу сортировки среди остальных
+        for iid in fresh:
+            if self.tree.exists(iid):
+                self.tree.detach(iid)
+        order = list(self.tree.get_children())
+        keys = [self.keys[iid] for iid in order]
+        if self.descending:
+            keys.reverse()
+        for iid, row in fresh.items():
+            key = sort_key(self.name, row)
+            if self.descending:
+                position = len(keys) - bisect_right(keys, key)
+            else:
+                position = bisect_left(keys, key)
+            if position == len(order) and not self.exhausted:
+                # Строка за пределами загруженных страниц - придет со следующей страницей
+                if self.tree.exists(iid):
+                    self.tree.delete(iid)
+                    self.keys.pop(iid, None)
+                continue
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=tuple(row))
+                self.tree.move(iid, "", position)
+            else:
+                self.tree.insert("", position, iid=iid, values=tuple(row))
+            order.insert(position, iid)
+            keys.insert(len(keys) - position if self.descending else position, key)
+            self.keys[iid] = key
+        self._update_status()
+    
+    def _update_status(self):
+        loaded = len(self.tree.get_children())
+        if self.exhausted:
+            self.status_var.set(f"Загружено: {loaded}")
+        else:
+            self.status_var.set(f"Загружено: {loaded} из ~{max(self.estimate, loaded)}")
+    
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Вызывается и после вставки строк: если страница не заполнила окно, грузим следующую
+        if float(last) >= 0.95 and not self.exhausted and not self.pending:
+            self.load_more()
+
 class CarRentalApp:
+    CHANGES_POLL_MS = 3000
+    OVERDUE_SWEEP_MS = 10 * 60 * 1000
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Система автопроката")
         self.root.geometry("1200x800")
+        self.pricing = RentalPricingEngine()
+        # Интервалы аренд для отчета о загрузке: загружаются при первом отчете (нужен NumPy)
+        self.utilization = None
+        # Все обращения к БД идут через фоновые потоки записи и чтения
+        self.db = DbWorker(root, on_busy=self.show_busy)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Последний примененный seq журнала изменений
+        self.change_seq = None
+        self.refresh_task = None
         
         self.create_widgets()
         self.load_initial_data()
     
+    def on_close(self):
+        self.db.shutdown()
+        self.root.destroy()
+    
     def create_widgets(self):
+        # Строка состояния: индикатор занятости и отмена долгих запросов
+        status_frame = tk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        self.busy_var = tk.StringVar(value="Готово")
+        tk.Label(status_frame, textvariable=self.busy_var, anchor="w").pack(side=tk.LEFT, padx=10)
+        self.cancel_button = tk.Button(status_frame, text="Отмена", state=tk.DISABLED,
+                                       command=self.db.cancel_all)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5, pady=2)
+        self.busy_progress = ttk.Progressbar(status_frame, mode="indeterminate", length=150)
+        self.busy_progress.pack(side=tk.RIGHT, padx=5)
+        
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True)
         
@@ -37,15 +230,36 @@ class CarRentalApp:
         self.notebook.add(self.reports_frame, text="Отчеты")
         self.create_reports_tab()
     
+    def show_busy(self, description):
+        if description:
+            if self.busy_var.get() == "Готово":
+                self.busy_progress.start(15)
+                self.cancel_button.config(state=tk.NORMAL)
+                self.root.config(cursor="watch")
+            self.busy_var.set(f"{description}...")
+        else:
+            self.busy_progress.stop()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.root.config(cursor="")
+            self.busy_var.set("Готово")
+    
     def create_cars_tab(self):
         columns = ("ID", "Марка", "Модель", "Год", "Номер", "Категория", "Статус", "Цена/день")
-        self.cars_tree = ttk.Treeview(self.cars_frame, columns=columns, show="headings")
+        tree_frame = tk.Frame(self.cars_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.cars_tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
         
         for col in columns:
             self.cars_tree.heading(col, text=col)
             self.cars_tree.column(col, width=100)
         
-        self.cars_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.cars_tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.cars_status = tk.StringVar()
+        tk.Label(self.cars_frame, textvariable=self.cars_status).pack(anchor="w", padx=10)
         
         btn_frame = tk.Frame(self.cars_frame)
         btn_frame.pack(pady=10)
@@ -54,16 +268,26 @@ class CarRentalApp:
         tk.Button(btn_frame, text="Добавить авто", command=self.add_car_dialog).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Изменить статус", command=self.change_car_status_dialog).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Удалить", command=self.delete_car).pack(side=tk.LEFT, padx=5)
+        
+        self.cars_pager = TreePager(self.db, self.cars_tree, scrollbar, self.cars_status, 'cars', "автомобили")
     
     def create_clients_tab(self):
         columns = ("ID", "Фамилия", "Имя", "Телефон", "Права", "Рейтинг", "Черный список")
-        self.clients_tree = ttk.Treeview(self.clients_frame, columns=columns, show="headings")
+        tree_frame = tk.Frame(self.clients_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.clients_tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
         
         for col in columns:
             self.clients_tree.heading(col, text=col)
             self.clients_tree.column(col, width=120)
         
-        self.clients_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.clients_tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.clients_status = tk.StringVar()
+        tk.Label(self.clients_frame, textvariable=self.clients_status).pack(anchor="w", padx=10)
         
         btn_frame = tk.Frame(self.clients_frame)
         btn_frame.pack(pady=10)
@@ -72,16 +296,26 @@ class CarRentalApp:
         tk.Button(btn_frame, text="Добавить клиента", command=self.add_client_dialog).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Добавить в ЧС", command=self.toggle_blacklist).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Поиск", command=self.search_clients_dialog).pack(side=tk.LEFT, padx=5)
+        
+        self.clients_pager = TreePager(self.db, self.clients_tree, scrollbar, self.clients_status, 'clients', "клиентов")
     
     def create_rentals_tab(self):
         columns = ("ID", "Клиент", "Автомобиль", "Начало", "Конец", "Стоимость", "Статус")
-        self.rentals_tree = ttk.Treeview(self.rentals_frame, columns=columns, show="headings")
+        tree_frame = tk.Frame(self.rentals_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.rentals_tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
         
         for col in columns:
             self.rentals_tree.heading(col, text=col)
             self.rentals_tree.column(col, width=120)
         
-        self.rentals_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.rentals_tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.rentals_status = tk.StringVar()
+        tk.Label(self.rentals_frame, textvariable=self.rentals_status).pack(anchor="w", padx=10)
         
         btn_frame = tk.Frame(self.rentals_frame)
         btn_frame.pack(pady=10)
@@ -89,50 +323,117 @@ class CarRentalApp:
         tk.Button(btn_frame, text="Обновить", command=self.load_rentals).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Новая аренда", command=self.new_rental_dialog).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Завершить аренду", command=self.complete_rental).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Прием автомобилей", command=self.check_in_dialog).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Отменить аренду", command=self.cancel_rental).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Отчет о повреждениях", command=self.report_damage_dialog).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Импорт повреждений", command=self.import_damages_dialog).pack(side=tk.LEFT, padx=5)
+        
+        self.rentals_pager = TreePager(self.db, self.rentals_tree, scrollbar, self.rentals_status, 'rentals', "аренды")
     
     def create_reports_tab(self):
         report_frame = tk.Frame(self.reports_frame)
         report_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Период для отчетов о доходах и популярности
+        period_frame = tk.Frame(report_frame)
+        period_frame.pack(pady=5)
+        tk.Label(period_frame, text="С:").pack(side=tk.LEFT)
+        self.report_from_entry = tk.Entry(period_frame, width=12)
+        self.report_from_entry.insert(0, (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d'))
+        self.report_from_entry.pack(side=tk.LEFT, padx=5)
+        tk.Label(period_frame, text="По:").pack(side=tk.LEFT)
+        self.report_to_entry = tk.Entry(period_frame, width=12)
+        self.report_to_entry.insert(0, datetime.now().strftime('%Y-%m-%d'))
+        self.report_to_entry.pack(side=tk.LEFT, padx=5)
+        
         tk.Button(report_frame, text="Доход по месяцам", command=self.generate_income_report).pack(pady=5)
         tk.Button(report_frame, text="Популярные автомобили", command=self.generate_popular_cars_report).pack(pady=5)
         tk.Button(report_frame, text="Активные аренды", command=self.generate_active_rentals_report).pack(pady=5)
         tk.Button(report_frame, text="Автомобили в ремонте", command=self.generate_maintenance_report).pack(pady=5)
+        tk.Button(report_frame, text="Задолженности клиентов", command=self.generate_debtors_report).pack(pady=5)
+        tk.Button(report_frame, text="Загрузка автопарка", command=self.generate_utilization_report).pack(pady=5)
         
         self.report_text = tk.Text(report_frame, height=20, wrap=tk.WORD)
         self.report_text.pack(fill=tk.BOTH, expand=True)
     
     def load_initial_data(self):
+        # seq читается до загрузки списков: изменения между ними применятся повторно, а не потеряются
+        def set_change_seq(seq):
+            self.change_seq = seq
+        
+        self.db.submit(current_seq, set_change_seq, error_text="Не удалось прочитать журнал изменений",
+                       description="Чтение журнала изменений", read_only=True)
         self.load_cars()
         self.load_clients()
         self.load_rentals()
+        self.root.after(self.CHANGES_POLL_MS, self.poll_changes)
+        self.sweep_overdue()
+    
+    def sweep_overdue(self):
+        """Периодический перевод аренд с прошедшим сроком в overdue (database/overdue.py)"""
+        def done(result):
+            if result.flagged:
+                self.refresh_changes(quiet=True)
+        
+        def failed(e):
+            pass  # База занята или недоступна - повторим при следующем проходе
+        
+        self.db.submit(lambda conn: sweep_overdue(conn, self.pricing), done, failed,
+                       description="Поиск просроченных аренд", background=True)
+        self.root.after(self.OVERDUE_SWEEP_MS, self.sweep_overdue)
+    
+    def poll_changes(self):
+        """Опрос журнала: изменения из других терминалов появляются без перезагрузки списков"""
+        if not self.db.busy:
+            self.refresh_changes(quiet=True)
+        self.root.after(self.CHANGES_POLL_MS, self.poll_changes)
+    
+    def refresh_changes(self, quiet=False):
+        """Применяет к спискам изменения строк после последнего увиденного seq"""
+        if self.change_seq is None:
+            return
+        if self.refresh_task is not None and not self.refresh_task.cancelled:
+            return
+        seq = self.change_seq
+        pagers = {'cars': self.cars_pager, 'clients': self.clients_pager, 'rentals': self.rentals_pager}
+        
+        def work(conn):
+            # Изменения и строки читаются из одного снимка
+            conn.execute('BEGIN')
+            change_set = changes_since(conn, seq)
+            rows = {name: fetch_rows(conn, name, [row_id for row_id, op in change_set.changes.get(name, {}).items()
+                                                   if op != 'D'])
+                    for name in pagers}
+            return change_set, rows
+        
+        def done(result):
+            self.refresh_task = None
+            change_set, rows = result
+            self.change_seq = change_set.seq
+            if change_set.full_reload:
+                self.load_cars()
+                self.load_clients()
+                self.load_rentals()
+                return
+            for name, pager in pagers.items():
+                if name in change_set.changes:
+                    pager.apply_changes(change_set.changes[name], rows[name])
+            # Категория входит в строки автомобилей (название, тариф)
+            if 'categories' in change_set.changes:
+                self.load_cars()
+        
+        def failed(e):
+            self.refresh_task = None
+            if not quiet:
+                messagebox.showerror("Ошибка", f"Не удалось обновить списки: {e}")
+        
+        self.refresh_task = self.db.submit(work, done, failed, description="Обновление списков",
+                                           background=quiet, read_only=True)
     
     # ========== Методы для работы с автомобилями ==========
     def load_cars(self):
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT c.car_id, c.brand, c.model, c.year, c.license_plate, 
-                   cat.name, c.status, cat.daily_rate
-            FROM cars c
-            JOIN categories cat ON c.category_id = cat.category_id
-            ORDER BY c.car_id
-            ''')
-            
-            for item in self.cars_tree.get_children():
-                self.cars_tree.delete(item)
-            
-            for row in cursor.fetchall():
-                self.cars_tree.insert("", tk.END, values=row)
-                
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить автомобили: {e}")
-        finally:
-            conn.close()
+        # Первая страница; остальные подгружаются при прокрутке списка
+        self.cars_pager.reset()
     
     def add_car_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -158,45 +459,46 @@ class CarRentalApp:
         
         tk.Label(dialog, text="Категория:").grid(row=4, column=0, padx=5, pady=5, sticky="e")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT category_id, name FROM categories")
-        categories = cursor.fetchall()
-        conn.close()
-        
         category_var = tk.StringVar(dialog)
         category_dropdown = ttk.Combobox(dialog, textvariable=category_var, state="readonly")
-        category_dropdown['values'] = [f"{cat[0]} - {cat[1]}" for cat in categories]
-        if categories:
-            category_dropdown.current(0)
         category_dropdown.grid(row=4, column=1, padx=5, pady=5)
         
+        def fill_categories(categories):
+            if not dialog.winfo_exists():
+                return
+            category_dropdown['values'] = [f"{cat[0]} - {cat[1]}" for cat in categories]
+            if categories:
+                category_dropdown.current(0)
+        
+        self.db.submit(lambda conn: conn.execute(queries.CATEGORIES_LIST).fetchall(), fill_categories,
+                       error_text="Не удалось загрузить категории", description="Загрузка категорий",
+                       read_only=True)
+        
         def save():
             try:
                 category_id = int(category_var.get().split(" - ")[0])
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                INSERT INTO cars (brand, model, year, license_plate, category_id, status)
-                VALUES (?, ?, ?, ?, ?, 'available')
-                ''', (
+                params = (
                     brand_entry.get(),
                     model_entry.get(),
                     int(year_entry.get()),
                     license_entry.get(),
                     category_id
-                ))
-                
+                )
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось добавить автомобиль: {e}")
+                return
+            
+            def work(conn):
+                conn.execute(queries.CAR_INSERT, params)
                 conn.commit()
+            
+            def done(_):
                 messagebox.showinfo("Успех", "Автомобиль успешно добавлен")
-                self.load_cars()
+                self.refresh_changes()
                 dialog.destroy()
-                
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось добавить автомобиль: {e}")
-            finally:
-                conn.close()
+            
+            self.db.submit(work, done, error_text="Не удалось добавить автомобиль",
+                           description="Добавление автомобиля")
         
         tk.Button(dialog, text="Сохранить", command=save).grid(row=5, columnspan=2, pady=10)
     
@@ -225,23 +527,19 @@ class CarRentalApp:
             tk.Radiobutton(dialog, text=status, variable=status_var, value=status).pack(anchor="w")
         
         def save():
-            try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                UPDATE cars SET status = ? WHERE car_id = ?
-                ''', (status_var.get(), car_id))
-                
+            new_status = status_var.get()
+            
+            def work(conn):
+                conn.execute(queries.CAR_SET_STATUS, (new_status, car_id))
                 conn.commit()
+            
+            def done(_):
                 messagebox.showinfo("Успех", "Статус автомобиля обновлен")
-                self.load_cars()
+                self.refresh_changes()
                 dialog.destroy()
-                
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось изменить статус: {e}")
-            finally:
-                conn.close()
+            
+            self.db.submit(work, done, error_text="Не удалось изменить статус",
+                           description="Изменение статуса автомобиля")
         
         tk.Button(dialog, text="Сохранить", command=save).pack(pady=10)
     
@@ -256,53 +554,28 @@ class CarRentalApp:
         if not messagebox.askyesno("Подтверждение", "Удалить выбранный автомобиль?"):
             return
         
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
+        def work(conn):
             # Проверяем, нет ли активных аренд
-            cursor.execute('''
-            SELECT COUNT(*) FROM rentals 
-            WHERE car_id = ? AND status IN ('reserved', 'active')
-            ''', (car_id,))
-            
-            if cursor.fetchone()[0] > 0:
+            if conn.execute(queries.CAR_OPEN_RENTALS_COUNT, (car_id,)).fetchone()[0] > 0:
+                return False
+            conn.execute(queries.CAR_DELETE, (car_id,))
+            conn.commit()
+            return True
+        
+        def done(deleted):
+            if not deleted:
                 messagebox.showerror("Ошибка", "Нельзя удалить автомобиль с активными арендами")
                 return
-            
-            cursor.execute('DELETE FROM cars WHERE car_id = ?', (car_id,))
-            conn.commit()
             messagebox.showinfo("Успех", "Автомобиль удален")
-            self.load_cars()
-            
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось удалить автомобиль: {e}")
-        finally:
-            conn.close()
+            self.refresh_changes()
+        
+        self.db.submit(work, done, error_text="Не удалось удалить автомобиль",
+                       description="Удаление автомобиля")
     
     # ========== Методы для работы с клиентами ==========
     def load_clients(self):
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT client_id, last_name, first_name, phone, driver_license, rating, 
-                   CASE WHEN blacklisted THEN 'Да' ELSE 'Нет' END as blacklist
-            FROM clients
-            ORDER BY last_name, first_name
-            ''')
-            
-            for item in self.clients_tree.get_children():
-                self.clients_tree.delete(item)
-            
-            for row in cursor.fetchall():
-                self.clients_tree.insert("", tk.END, values=row)
-                
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить клиентов: {e}")
-        finally:
-            conn.close()
+        # Первая страница; остальные подгружаются при прокрутке списка
+        self.clients_pager.reset()
     
     def add_client_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -328,33 +601,27 @@ class CarRentalApp:
             entries[name] = entry
         
         def save():
-            try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                INSERT INTO clients 
-                (last_name, first_name, birth_date, passport_number, driver_license, phone, email, registration_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, date('now'))
-                ''', (
-                    entries['last_name'].get(),
-                    entries['first_name'].get(),
-                    entries['birth_date'].get(),
-                    entries['passport'].get(),
-                    entries['license'].get(),
-                    entries['phone'].get(),
-                    entries['email'].get()
-                ))
-                
+            params = (
+                entries['last_name'].get(),
+                entries['first_name'].get(),
+                entries['birth_date'].get(),
+                entries['passport'].get(),
+                entries['license'].get(),
+                entries['phone'].get(),
+                entries['email'].get()
+            )
+            
+            def work(conn):
+                conn.execute(queries.CLIENT_INSERT, params)
                 conn.commit()
+            
+            def done(_):
                 messagebox.showinfo("Успех", "Клиент успешно добавлен")
-                self.load_clients()
+                self.refresh_changes()
                 dialog.destroy()
-                
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось добавить клиента: {e}")
-            finally:
-                conn.close()
+            
+            self.db.submit(work, done, error_text="Не удалось добавить клиента",
+                           description="Добавление клиента")
         
         tk.Button(dialog, text="Сохранить", command=save).grid(row=len(fields), columnspan=2, pady=10)
     
@@ -369,121 +636,68 @@ class CarRentalApp:
         
         new_status = current_status == 'Нет'
         
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            UPDATE clients SET blacklisted = ? WHERE client_id = ?
-            ''', (new_status, client_id))
-            
+        def work(conn):
+            conn.execute(queries.CLIENT_SET_BLACKLIST, (new_status, client_id))
             conn.commit()
+        
+        def done(_):
             messagebox.showinfo("Успех", "Статус клиента обновлен")
-            self.load_clients()
-            
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось изменить статус: {e}")
-        finally:
-            conn.close()
+            self.refresh_changes()
+        
+        self.db.submit(work, done, error_text="Не удалось изменить статус",
+                       description="Изменение статуса клиента")
     
     def search_clients_dialog(self):
-        search_term = simpledialog.askstring("Поиск клиентов", "Введите фамилию или имя:")
+        search_term = simpledialog.askstring(
+            "Поиск клиентов", "Введите ФИО, телефон, паспорт, права или email (можно начало слова):")
         if not search_term:
             return
         
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT client_id, last_name, first_name, phone, driver_license, rating, 
-                   CASE WHEN blacklisted THEN 'Да' ELSE 'Нет' END as blacklist
-            FROM clients
-            WHERE last_name LIKE ? OR first_name LIKE ?
-            ORDER BY last_name, first_name
-            ''', (f"%{search_term}%", f"%{search_term}%"))
-            
-            for item in self.clients_tree.get_children():
-                self.clients_tree.delete(item)
-            
-            for row in cursor.fetchall():
-                self.clients_tree.insert("", tk.END, values=row)
-                
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось выполнить поиск: {e}")
-        finally:
-            conn.close()
+        # Результаты поиска заменяют постраничный список
+        self.clients_pager.clear()
+        generation = self.clients_pager.generation
+        
+        def work(conn):
+            return search_clients(conn, search_term)
+        
+        def done(rows):
+            if generation != self.clients_pager.generation:
+                return
+            for row in rows:
+                self.clients_tree.insert("", tk.END, iid=str(row[0]), values=tuple(row))
+            if len(rows) < SEARCH_LIMIT:
+                self.clients_status.set(f"Найдено: {len(rows)}")
+            else:
+                self.clients_status.set(f"Показаны {SEARCH_LIMIT} лучших совпадений")
+        
+        self.db.submit(work, done, error_text="Не удалось выполнить поиск",
+                       description="Поиск клиентов", read_only=True)
     
     # ========== Методы для работы с арендами ==========
     def load_rentals(self):
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT r.rental_id, 
-                   c.last_name || ' ' || c.first_name as client,
-                   car.brand || ' ' || car.model as car,
-                   r.start_date, r.end_date, r.total_cost, r.status
-            FROM rentals r
-            JOIN clients c ON r.client_id = c.client_id
-            JOIN cars car ON r.car_id = car.car_id
-            ORDER BY r.start_date DESC
-            ''')
-            
-            for item in self.rentals_tree.get_children():
-                self.rentals_tree.delete(item)
-            
-            for row in cursor.fetchall():
-                self.rentals_tree.insert("", tk.END, values=row)
-                
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить аренды: {e}")
-        finally:
-            conn.close()
+        # Первая страница; остальные подгружаются при прокрутке списка
+        self.rentals_pager.reset()
     
     def new_rental_dialog(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("Новая аренда")
-        dialog.geometry("600x500")
+        dialog.geometry("700x550")
         
         # Выбор клиента
         tk.Label(dialog, text="Клиент:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-        SELECT client_id, last_name || ' ' || first_name as name 
-        FROM clients 
-        WHERE blacklisted = 0
-        ORDER BY last_name
-        ''')
-        clients = cursor.fetchall()
-        
         client_var = tk.StringVar(dialog)
         client_dropdown = ttk.Combobox(dialog, textvariable=client_var, state="readonly")
-        client_dropdown['values'] = [f"{c[0]} - {c[1]}" for c in clients]
-        if clients:
-            client_dropdown.current(0)
         client_dropdown.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
         
-        # Выбор автомобиля
-        tk.Label(dialog, text="Автомобиль:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        # Категория автомобиля
+        tk.Label(dialog, text="Категория:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
         
-        cursor.execute('''
-        SELECT c.car_id, c.brand || ' ' || c.model || ' (' || cat.name || ')' as car_info
-        FROM cars c
-        JOIN categories cat ON c.category_id = cat.category_id
-        WHERE c.status = 'available'
-        ''')
-        cars = cursor.fetchall()
-        
-        car_var = tk.StringVar(dialog)
-        car_dropdown = ttk.Combobox(dialog, textvariable=car_var, state="readonly")
-        car_dropdown['values'] = [f"{c[0]} - {c[1]}" for c in cars]
-        if cars:
-            car_dropdown.current(0)
-        car_dropdown.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+        category_var = tk.StringVar(dialog)
+        category_dropdown = ttk.Combobox(dialog, textvariable=category_var, state="readonly")
+        category_dropdown['values'] = ["Все категории"]
+        category_dropdown.current(0)
+        category_dropdown.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         
         # Даты аренды
         tk.Label(dialog, text="Дата начала (ГГГГ-ММ-ДД):").grid(row=2, column=0, padx=5, pady=5, sticky="e")
@@ -496,135 +710,137 @@ class CarRentalApp:
         end_date_entry.insert(0, (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d'))
         end_date_entry.grid(row=3, column=1, padx=5, pady=5)
         
+        # Выбор автомобиля, свободного на выбранные даты
+        tk.Label(dialog, text="Автомобиль:").grid(row=4, column=0, padx=5, pady=5, sticky="e")
+        
+        car_var = tk.StringVar(dialog)
+        car_dropdown = ttk.Combobox(dialog, textvariable=car_var, state="readonly")
+        car_dropdown.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
+        
         # Дополнительные услуги
-        tk.Label(dialog, text="Дополнительные услуги:").grid(row=4, column=0, padx=5, pady=5, sticky="ne")
+        tk.Label(dialog, text="Дополнительные услуги:").grid(row=5, column=0, padx=5, pady=5, sticky="ne")
         
         services_frame = tk.Frame(dialog)
-        services_frame.grid(row=4, column=1, padx=5, pady=5, sticky="w")
-        
-        cursor.execute('SELECT service_id, name, price FROM services')
-        services = cursor.fetchall()
-        conn.close()
+        services_frame.grid(row=5, column=1, padx=5, pady=5, sticky="w")
         
         self.service_vars = {}
-        for i, (service_id, name, price) in enumerate(services):
-            var = tk.IntVar()
-            cb = tk.Checkbutton(services_frame, text=f"{name} ({price} руб.)", variable=var)
-            cb.pack(anchor="w")
-            self.service_vars[service_id] = var
+        
+        def selected_services():
+            return [service_id for service_id, var in self.service_vars.items() if var.get() == 1]
+        
+        def find_cars(event=None):
+            try:
+                start_date = datetime.strptime(start_date_entry.get(), '%Y-%m-%d')
+                end_date = datetime.strptime(end_date_entry.get(), '%Y-%m-%d')
+                category = category_var.get()
+                category_id = int(category.split(" - ")[0]) if " - " in category else None
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось подобрать автомобили: {e}")
+                return
+            service_ids = selected_services()
+            
+            def work(conn):
+                cars = find_available_cars(conn, start_date, end_date, category_id)
+                # Цена показывается рядом с каждым автомобилем - один расчет на весь список
+                quotes = self.pricing.quote_many(
+                    conn, [(c[0], start_date, end_date, service_ids) for c in cars])
+                return cars, quotes
+            
+            def done(result):
+                if not dialog.winfo_exists():
+                    return
+                cars, quotes = result
+                car_dropdown['values'] = [f"{c[0]} - {c[1]} {c[2]} ({c[3]}) - {q.total_cost:.2f} руб."
+                                          for c, q in zip(cars, quotes)]
+                car_var.set("")
+                if cars:
+                    car_dropdown.current(0)
+            
+            self.db.submit(work, done, error_text="Не удалось подобрать автомобили",
+                           description="Поиск свободных автомобилей", read_only=True)
+        
+        tk.Button(dialog, text="Найти свободные", command=find_cars).grid(row=4, column=2, padx=5, pady=5)
+        category_dropdown.bind("<<ComboboxSelected>>", find_cars)
+        
+        def load_lists(conn):
+            return (conn.execute(queries.RENTAL_CLIENTS).fetchall(),
+                    conn.execute(queries.CATEGORIES_LIST).fetchall(),
+                    conn.execute(queries.SERVICES_LIST).fetchall())
+        
+        def fill_lists(result):
+            if not dialog.winfo_exists():
+                return
+            clients, categories, services = result
+            
+            client_dropdown['values'] = [f"{c[0]} - {c[1]}" for c in clients]
+            if clients:
+                client_dropdown.current(0)
+            
+            category_dropdown['values'] = ["Все категории"] + [f"{cat[0]} - {cat[1]}" for cat in categories]
+            
+            for i, (service_id, name, price) in enumerate(services):
+                var = tk.IntVar()
+                cb = tk.Checkbutton(services_frame, text=f"{name} ({price} руб.)", variable=var)
+                cb.pack(anchor="w")
+                self.service_vars[service_id] = var
+            
+            find_cars()
+        
+        self.db.submit(load_lists, fill_lists, error_text="Не удалось загрузить данные для аренды",
+                       description="Загрузка клиентов и услуг", read_only=True)
         
         def calculate_cost():
             try:
                 car_id = int(car_var.get().split(" - ")[0])
                 start_date = datetime.strptime(start_date_entry.get(), '%Y-%m-%d')
                 end_date = datetime.strptime(end_date_entry.get(), '%Y-%m-%d')
-                
-                if end_date <= start_date:
-                    messagebox.showerror("Ошибка", "Дата окончания должна быть позже даты начала")
-                    return
-                
-                days = (end_date - start_date).days
-                
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # Получаем стоимость аренды автомобиля
-                cursor.execute('''
-                SELECT cat.daily_rate, cat.deposit_amount 
-                FROM cars c
-                JOIN categories cat ON c.category_id = cat.category_id
-                WHERE c.car_id = ?
-                ''', (car_id,))
-                
-                daily_rate, deposit = cursor.fetchone()
-                base_cost = daily_rate * days
-                
-                # Добавляем стоимость услуг
-                services_cost = 0
-                for service_id, var in self.service_vars.items():
-                    if var.get() == 1:
-                        cursor.execute('SELECT price FROM services WHERE service_id = ?', (service_id,))
-                        services_cost += cursor.fetchone()[0] * days
-                
-                total_cost = base_cost + services_cost
-                
-                messagebox.showinfo("Стоимость", 
-                    f"Базовая стоимость: {base_cost:.2f} руб.\n"
-                    f"Стоимость услуг: {services_cost:.2f} руб.\n"
-                    f"Депозит: {deposit:.2f} руб.\n"
-                    f"Итого: {total_cost:.2f} руб.")
-                
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Не удалось рассчитать стоимость: {e}")
-            finally:
-                conn.close()
+                return
+            
+            if end_date <= start_date:
+                messagebox.showerror("Ошибка", "Дата окончания должна быть позже даты начала")
+                return
+            
+            service_ids = selected_services()
+            
+            def done(quote):
+                messagebox.showinfo("Стоимость",
+                    f"Базовая стоимость: {quote.base_cost:.2f} руб.\n"
+                    f"Стоимость услуг: {quote.services_cost:.2f} руб.\n"
+                    f"Депозит: {quote.deposit:.2f} руб.\n"
+                    f"Итого: {quote.total_cost:.2f} руб.")
+            
+            self.db.submit(lambda conn: self.pricing.quote(conn, car_id, start_date, end_date, service_ids),
+                           done, error_text="Не удалось рассчитать стоимость",
+                           description="Расчет стоимости", read_only=True)
         
         def create_rental():
             try:
                 client_id = int(client_var.get().split(" - ")[0])
                 car_id = int(car_var.get().split(" - ")[0])
-                start_date = start_date_entry.get()
-                end_date = end_date_entry.get()
-                
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # Получаем стоимость аренды
-                cursor.execute('''
-                SELECT cat.daily_rate, cat.deposit_amount 
-                FROM cars c
-                JOIN categories cat ON c.category_id = cat.category_id
-                WHERE c.car_id = ?
-                ''', (car_id,))
-                
-                daily_rate, deposit = cursor.fetchone()
-                days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days
-                base_cost = daily_rate * days
-                
-                # Добавляем стоимость услуг
-                services_cost = 0
-                for service_id, var in self.service_vars.items():
-                    if var.get() == 1:
-                        cursor.execute('SELECT price FROM services WHERE service_id = ?', (service_id,))
-                        services_cost += cursor.fetchone()[0] * days
-                
-                total_cost = base_cost + services_cost
-                
-                # Создаем аренду
-                cursor.execute('''
-                INSERT INTO rentals 
-                (client_id, car_id, start_date, end_date, total_cost, deposit_amount, status, employee_id)
-                VALUES (?, ?, ?, ?, ?, ?, 'reserved', 1)
-                ''', (client_id, car_id, start_date, end_date, total_cost, deposit))
-                
-                rental_id = cursor.lastrowid
-                
-                # Добавляем услуги
-                for service_id, var in self.service_vars.items():
-                    if var.get() == 1:
-                        cursor.execute('''
-                        INSERT INTO rental_services (rental_id, service_id, quantity)
-                        VALUES (?, ?, 1)
-                        ''', (rental_id, service_id))
-                
-                # Обновляем статус автомобиля
-                cursor.execute('''
-                UPDATE cars SET status = 'reserved' WHERE car_id = ?
-                ''', (car_id,))
-                
-                conn.commit()
-                messagebox.showinfo("Успех", "Аренда успешно создана")
-                self.load_rentals()
-                self.load_cars()
-                dialog.destroy()
-                
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Не удалось создать аренду: {e}")
-            finally:
-                conn.close()
+                return
+            start_date = start_date_entry.get()
+            end_date = end_date_entry.get()
+            service_ids = selected_services()
+            
+            def work(conn):
+                # Проверка интервала и вставка в одной транзакции записи: два терминала
+                # не забронируют один автомобиль на пересекающиеся периоды
+                return reserve_car(conn, client_id, car_id, start_date, end_date, service_ids, self.pricing)
+            
+            def done(_):
+                messagebox.showinfo("Успех", "Аренда успешно создана")
+                self.refresh_changes()
+                dialog.destroy()
+            
+            self.db.submit(work, done, error_text="Не удалось создать аренду",
+                           description="Создание аренды")
         
         btn_frame = tk.Frame(dialog)
-        btn_frame.grid(row=5, columnspan=2, pady=10)
+        btn_frame.grid(row=6, columnspan=3, pady=10)
         
         tk.Button(btn_frame, text="Рассчитать стоимость", command=calculate_cost).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Создать аренду", command=create_rental).pack(side=tk.LEFT, padx=5)
@@ -638,79 +854,108 @@ class CarRentalApp:
         rental_id = self.rentals_tree.item(selected[0])['values'][0]
         status = self.rentals_tree.item(selected[0])['values'][6]
         
-        if status != 'active':
-            messagebox.showwarning("Внимание", "Можно завершить только активные аренды")
+        if status not in ('active', 'overdue'):
+            messagebox.showwarning("Внимание", "Можно завершить только активные или просроченные аренды")
+            return
+        
+        # Запрашиваем фактическую дату возврата
+        actual_end_date = simpledialog.askstring(
+            "Завершение аренды",
+            "Введите фактическую дату возврата (ГГГГ-ММ-ДД):",
+            initialvalue=datetime.now().strftime('%Y-%m-%d'))
+        
+        if not actual_end_date:
             return
         
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Получаем информацию об аренде
-            cursor.execute('''
-            SELECT car_id, end_date, total_cost 
-            FROM rentals 
-            WHERE rental_id = ?
-            ''', (rental_id,))
-            
-            car_id, planned_end_date, planned_cost = cursor.fetchone()
-            
-            # Запрашиваем фактическую дату возврата
-            actual_end_date = simpledialog.askstring(
-                "Завершение аренды", 
-                "Введите фактическую дату возврата (ГГГГ-ММ-ДД):",
-                initialvalue=datetime.now().strftime('%Y-%m-%d'))
-            
-            if not actual_end_date:
+            datetime.strptime(actual_end_date, '%Y-%m-%d')
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Не удалось завершить аренду: {e}")
+            return
+        
+        # Тот же путь, что и при пакетном приеме: стоимость и штраф считаются там
+        def work(conn):
+            result = check_in_rentals(conn, [(rental_id, actual_end_date)], self.pricing)
+            conn.commit()
+            return result
+        
+        def done(result):
+            if result.rejected:
+                messagebox.showwarning("Внимание", f"Не удалось завершить аренду: {result.rejected[0][1]}")
+                return
+            check_in = result.completed[0]
+            if check_in.extra_days:
+                messagebox.showwarning("Опоздание",
+                    f"Клиент опоздал на {check_in.extra_days} дней.\n"
+                    f"Штраф: {check_in.penalty:.2f} руб.\n"
+                    f"Итоговая стоимость: {check_in.total_cost:.2f} руб.")
+            messagebox.showinfo("Успех", "Аренда успешно завершена")
+            self.refresh_changes()
+        
+        self.db.submit(work, done, error_text="Не удалось завершить аренду",
+                       description="Завершение аренды")
+    
+    def check_in_dialog(self):
+        """Прием автомобилей пакетом: выделенные аренды или CSV 'номер аренды;дата возврата'"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Прием автомобилей")
+        dialog.geometry("450x500")
+        
+        tk.Label(dialog, text="Возвраты - по одному в строке: номер аренды;ГГГГ-ММ-ДД").pack(padx=10, pady=5)
+        returns_text = tk.Text(dialog, height=20, width=50)
+        returns_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        # Выделенные в списке активные и просроченные аренды - с сегодняшней датой
+        today = datetime.now().strftime('%Y-%m-%d')
+        for item in self.rentals_tree.selection():
+            values = self.rentals_tree.item(item)['values']
+            if values[6] in ('active', 'overdue'):
+                returns_text.insert(tk.END, f"{values[0]};{today}\n")
+        
+        def load_csv():
+            path = filedialog.askopenfilename(parent=dialog, title="Файл возвратов",
+                                              filetypes=[("CSV", "*.csv"), ("Все файлы", "*.*")])
+            if not path:
+                return
+            try:
+                with open(path, encoding='utf-8-sig') as file:
+                    returns_text.insert(tk.END, file.read())
+            except (OSError, UnicodeDecodeError) as e:
+                messagebox.showerror("Ошибка", f"Не удалось прочитать файл: {e}", parent=dialog)
+        
+        def submit():
+            returns, errors = parse_returns(returns_text.get("1.0", tk.END).splitlines())
+            if errors:
+                messagebox.showerror("Ошибка", "\n".join(f"Строка {number}: {message}"
+                                                         for number, message in errors[:10]), parent=dialog)
+                return
+            if not returns:
+                messagebox.showwarning("Внимание", "Список возвратов пуст", parent=dialog)
                 return
             
-            # Пересчитываем стоимость, если вернули раньше/позже
-            planned_end = datetime.strptime(planned_end_date, '%Y-%m-%d')
-            actual_end = datetime.strptime(actual_end_date, '%Y-%m-%d')
-            
-            if actual_end > planned_end:
-                # Если с опозданием - добавляем штраф
-                extra_days = (actual_end - planned_end).days
-                cursor.execute('''
-                SELECT daily_rate FROM cars c
-                JOIN categories cat ON c.category_id = cat.category_id
-                WHERE c.car_id = ?
-                ''', (car_id,))
-                
-                daily_rate = cursor.fetchone()[0]
-                penalty = daily_rate * extra_days * 1.5  # Штраф 50%
-                final_cost = planned_cost + penalty
-                
-                messagebox.showwarning("Опоздание", 
-                    f"Клиент опоздал на {extra_days} дней.\n"
-                    f"Штраф: {penalty:.2f} руб.\n"
-                    f"Итоговая стоимость: {final_cost:.2f} руб.")
-            else:
-                final_cost = planned_cost
-            
-            # Обновляем аренду
-            cursor.execute('''
-            UPDATE rentals SET 
-            status = 'completed',
-            actual_end_date = ?,
-            total_cost = ?
-            WHERE rental_id = ?
-            ''', (actual_end_date, final_cost, rental_id))
-            
-            # Возвращаем автомобиль в доступные
-            cursor.execute('''
-            UPDATE cars SET status = 'available' WHERE car_id = ?
-            ''', (car_id,))
+            def work(conn):
+                result = check_in_rentals(conn, returns, self.pricing)
+                conn.commit()
+                return result
             
-            conn.commit()
-            messagebox.showinfo("Успех", "Аренда успешно завершена")
-            self.load_rentals()
-            self.load_cars()
+            def done(result):
+                late = [c for c in result.completed if c.extra_days]
+                lines = [f"Принято автомобилей: {len(result.completed)}",
+                         f"С опозданием: {len(late)}, штрафы: {sum(c.penalty for c in late):.2f} руб."]
+                if result.rejected:
+                    lines.append(f"Не принято: {len(result.rejected)}")
+                    lines += [f"  #{rental_id}: {reason}" for rental_id, reason in result.rejected[:20]]
+                messagebox.showinfo("Прием автомобилей", "\n".join(lines))
+                dialog.destroy()
+                self.refresh_changes()
             
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось завершить аренду: {e}")
-        finally:
-            conn.close()
+            self.db.submit(work, done, error_text="Не удалось принять автомобили",
+                           description="Прием автомобилей")
+        
+        btn_frame = tk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="Загрузить CSV", command=load_csv).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Принять", command=submit).pack(side=tk.LEFT, padx=5)
     
     def cancel_rental(self):
         selected = self.rentals_tree.selection()
@@ -728,36 +973,27 @@ class CarRentalApp:
         if not messagebox.askyesno("Подтверждение", "Отменить выбранную аренду?"):
             return
         
-        try:
-            conn = get_db_connection()
+        def work(conn):
             cursor = conn.cursor()
             
             # Получаем car_id для обновления статуса автомобиля
-            cursor.execute('SELECT car_id FROM rentals WHERE rental_id = ?', (rental_id,))
+            cursor.execute(queries.RENTAL_CAR, (rental_id,))
             car_id = cursor.fetchone()[0]
             
             # Отменяем аренду
-            cursor.execute('''
-            UPDATE rentals SET 
-            status = 'cancelled',
-            actual_end_date = date('now')
-            WHERE rental_id = ?
-            ''', (rental_id,))
-            
-            # Возвращаем автомобиль в доступные
-            cursor.execute('''
-            UPDATE cars SET status = 'available' WHERE car_id = ?
-            ''', (car_id,))
+            cursor.execute(queries.RENTAL_CANCEL, (rental_id,))
+            
+            # Статус автомобиля - по остальным его арендам
+            sync_car_status(conn, [car_id])
             
             conn.commit()
+        
+        def done(_):
             messagebox.showinfo("Успех", "Аренда отменена")
-            self.load_rentals()
-            self.load_cars()
-            
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось отменить аренду: {e}")
-        finally:
-            conn.close()
+            self.refresh_changes()
+        
+        self.db.submit(work, done, error_text="Не удалось отменить аренду",
+                       description="Отмена аренды")
     
     def report_damage_dialog(self):
         selected = self.rentals_tree.selection()
@@ -789,70 +1025,230 @@ class CarRentalApp:
                 cost = float(repair_cost.get())
                 if cost <= 0:
                     raise ValueError("Стоимость должна быть положительной")
-                
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # Получаем car_id из аренды
-                cursor.execute('SELECT car_id FROM rentals WHERE rental_id = ?', (rental_id,))
-                car_id = cursor.fetchone()[0]
-                
-                # Добавляем повреждение
-                cursor.execute('''
-                INSERT INTO damages 
-                (rental_id, car_id, description, repair_cost, reported_date, status, employee_id)
-                VALUES (?, ?, ?, ?, date('now'), 'reported', 1)
-                ''', (rental_id, car_id, damage_desc.get("1.0", tk.END).strip(), cost))
-                
-                # Если есть депозит, вычитаем из него стоимость ремонта
-                cursor.execute('''
-                UPDATE rentals SET 
-                deposit_amount = deposit_amount - ?
-                WHERE rental_id = ? AND deposit_amount >= ?
-                ''', (cost, rental_id, cost))
-                
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось зарегистрировать повреждение: {e}")
+                return
+            description = damage_desc.get("1.0", tk.END).strip()
+            
+            def work(conn):
+                # Тот же путь, что и при импорте: при достаточном депозите стоимость удерживается из него
+                result = import_damages(conn, [DamageRow(1, rental_id, description, cost, None)])
                 conn.commit()
+                return result
+            
+            def done(result):
+                if result.rejected:
+                    messagebox.showerror("Ошибка", f"Повреждение не зарегистрировано: {result.rejected[0][1]}",
+                                         parent=dialog)
+                    return
                 messagebox.showinfo("Успех", "Повреждение зарегистрировано")
                 dialog.destroy()
-                
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось зарегистрировать повреждение: {e}")
-            finally:
-                conn.close()
+            
+            self.db.submit(work, done, error_text="Не удалось зарегистрировать повреждение",
+                           description="Регистрация повреждения")
         
         tk.Button(dialog, text="Отправить отчет", command=submit).pack(pady=10)
     
+    def import_damages_dialog(self):
+        """Регистрация повреждений по итогам осмотра: CSV 'номер аренды;описание;стоимость[;дата]'"""
+        path = filedialog.askopenfilename(title="Файл повреждений",
+                                          filetypes=[("CSV", "*.csv"), ("Все файлы", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, encoding='utf-8-sig') as file:
+                rows, errors = parse_damages(file)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Ошибка", f"Не удалось прочитать файл: {e}")
+            return
+        if not rows:
+            messagebox.showwarning("Внимание", "В файле нет строк для регистрации")
+            return
+        if errors and not messagebox.askyesno(
+                "Импорт повреждений",
+                f"Строк с ошибками: {len(errors)}, они будут пропущены:\n"
+                + "\n".join(f"Строка {number}: {message}" for number, message in errors[:10])
+                + f"\n\nЗарегистрировать остальные {len(rows)}?"):
+            return
+        
+        def work(conn):
+            result = import_damages(conn, rows)
+            conn.commit()
+            return result
+        
+        def done(result):
+            failures = sorted(errors + result.rejected)
+            lines = [f"Зарегистрировано повреждений: {len(result.imported)}",
+                     f"Удержано из депозитов: {result.deducted:,.2f} руб."]
+            if failures:
+                lines.append(f"Не зарегистрировано строк: {len(failures)}")
+                lines += [f"  Строка {number}: {reason}" for number, reason in failures[:20]]
+            messagebox.showinfo("Импорт повреждений", "\n".join(lines))
+        
+        self.db.submit(work, done, error_text="Не удалось импортировать повреждения",
+                       description="Импорт повреждений")
+    
     # ========== Методы для отчетов ==========
-    def generate_income_report(self):
+    # Доходы и популярность читаются из сводных таблиц (database/rollups.py),
+    # поэтому стоимость отчета зависит от длины периода, а не от всей истории
+    POPULAR_CARS_LIMIT = 20
+    ACTIVE_RENTALS_LIMIT = 500  # Ближайшие по сроку возврата; остальные - только в общем числе
+    UTILIZATION_CARS_LIMIT = 10  # Самых и наименее загруженных автомобилей в отчете
+    
+    def report_period(self):
+        """Период из полей вкладки отчетов или None, если даты неверны"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()  # Получаем курсор из соединения
-
-            # SQL-запрос для получения данных о доходах (пример)
-            query = """
-                SELECT
-                    SUM(цена * количество) AS общий_доход
-                FROM Заказы;  # Замените 'Заказы' на фактическое название вашей таблицы
-            """
-            cursor.execute(query)
-            result = cursor.fetchone()  # Получаем одну строку с результатом
-
-            total_income = result[0] if result[0] else 0  # Извлекаем доход, обрабатываем NULL
-            print(f"Общий доход: {total_income}") # Выводим отчет
-
-            # Вместо return, сохраняем в переменную self.income_report
-            self.income_report = total_income # Сохраняем для дальнейшего использования
-
-            conn.commit() # Фиксируем изменения в БД
-        except sqlite3.Error as e:  # Обрабатываем возможные ошибки базы данных
-            print(f"Ошибка при работе с базой данных: {e}")
-            if conn:
-                conn.rollback()  # Откатываем транзакцию в случае ошибки
-            self.income_report = None # Указываем, что отчета нет.
-        except Exception as e: # Перехватываем другие исключения
-            print(f"Произошла ошибка: {e}")
-            self.income_report = None
-        finally:
-            if conn:
-                cursor.close()  # Закрываем курсор
-                conn.close()      # Закрываем соединение с базой данных
+            date_from = datetime.strptime(self.report_from_entry.get().strip(), '%Y-%m-%d').date()
+            date_to = datetime.strptime(self.report_to_entry.get().strip(), '%Y-%m-%d').date()
+        except ValueError:
+            messagebox.showerror("Ошибка", "Введите даты периода в формате ГГГГ-ММ-ДД")
+            return None
+        if date_from > date_to:
+            messagebox.showerror("Ошибка", "Начало периода позже его конца")
+            return None
+        return {'date_from': date_from.isoformat(), 'date_to': date_to.isoformat()}
+    
+    def show_report(self, lines):
+        self.report_text.delete("1.0", tk.END)
+        self.report_text.insert(tk.END, "\n".join(lines))
+    
+    def run_report(self, sql, params, render, description):
+        self.db.submit(lambda conn: conn.execute(sql, params).fetchall(),
+                       lambda rows: self.show_report(render(rows)),
+                       error_text="Не удалось построить отчет", description=description,
+                       read_only=True)
+    
+    def generate_income_report(self):
+        period = self.report_period()
+        if period is None:
+            return
+        
+        def render(rows):
+            lines = [f"Доход по месяцам с {period['date_from']} по {period['date_to']}", ""]
+            month, month_total, total = None, 0, 0
+            for row_month, category, amount, payments in rows:
+                if row_month != month:
+                    if month is not None:
+                        lines.append(f"  Итого за месяц: {month_total:.2f} руб.")
+                    month, month_total = row_month, 0
+                    lines.append(month)
+                lines.append(f"  {category}: {amount:.2f} руб. (платежей: {payments})")
+                month_total += amount
+                total += amount
+            if month is None:
+                lines.append("Нет платежей за период")
+            else:
+                lines.append(f"  Итого за месяц: {month_total:.2f} руб.")
+                lines += ["", f"Всего: {total:.2f} руб."]
+            return lines
+        
+        self.run_report(queries.REPORT_INCOME_BY_MONTH, period, render, "Отчет о доходах")
+    
+    def generate_popular_cars_report(self):
+        period = self.report_period()
+        if period is None:
+            return
+        
+        def render(rows):
+            lines = [f"Популярные автомобили с {period['date_from']} по {period['date_to']}", ""]
+            for place, (car_id, brand, model, plate, rentals) in enumerate(rows, 1):
+                lines.append(f"{place}. {brand} {model} ({plate}, ID {car_id}): аренд {rentals}")
+            if not rows:
+                lines.append("Нет аренд за период")
+            return lines
+        
+        self.run_report(queries.REPORT_POPULAR_CARS, {**period, 'limit': self.POPULAR_CARS_LIMIT},
+                        render, "Отчет о популярных автомобилях")
+    
+    def generate_active_rentals_report(self):
+        today = datetime.now().strftime('%Y-%m-%d')
+        
+        def work(conn):
+            conn.execute('BEGIN')  # Число и строки из одного снимка
+            total = conn.execute(queries.REPORT_ACTIVE_RENTALS_COUNT).fetchone()[0]
+            rows = conn.execute(queries.REPORT_ACTIVE_RENTALS, {'limit': self.ACTIVE_RENTALS_LIMIT}).fetchall()
+            return total, rows
+        
+        def done(result):
+            total, rows = result
+            lines = [f"Текущие аренды: {total}"]
+            if total > len(rows):
+                lines.append(f"Показаны {len(rows)} с ближайшим сроком возврата")
+            lines.append("")
+            for rental_id, client, car, plate, start_date, end_date, status in rows:
+                mark = " - ПРОСРОЧЕНА" if status == 'overdue' or end_date < today else ""
+                lines.append(f"#{rental_id} {client}: {car} ({plate}), {start_date} - {end_date}{mark}")
+            self.show_report(lines)
+        
+        self.db.submit(work, done, error_text="Не удалось построить отчет",
+                       description="Отчет об активных арендах", read_only=True)
+    
+    def generate_maintenance_report(self):
+        def render(rows):
+            lines = [f"Автомобили в ремонте: {len(rows)}", ""]
+            for car_id, brand, model, plate, last_service, damages, repair_cost in rows:
+                line = f"{brand} {model} ({plate}, ID {car_id}), последнее ТО: {last_service or 'нет'}"
+                if damages:
+                    line += f", открытых повреждений: {damages} на {repair_cost:.2f} руб."
+                lines.append(line)
+            return lines
+        
+        self.run_report(queries.REPORT_MAINTENANCE_CARS, (), render, "Отчет об автомобилях в ремонте")
+    
+    def generate_debtors_report(self):
+        min_debt = simpledialog.askfloat("Задолженности клиентов", "Показать клиентов с долгом больше, руб.:",
+                                         initialvalue=0, minvalue=0)
+        if min_debt is None:
+            return
+        
+        def done(debtors):
+            lines = [f"Клиенты с долгом больше {min_debt:,.2f} руб.: {len(debtors)}"]
+            if len(debtors) == DEBTORS_LIMIT:
+                lines.append(f"Показаны {DEBTORS_LIMIT} с наибольшим долгом")
+            lines.append("")
+            for debtor in debtors:
+                lines.append(f"{debtor.client} (ID {debtor.client_id}, {debtor.phone or 'нет телефона'}): "
+                             f"долг {debtor.debt:,.2f} руб. (начислено {debtor.charged:,.2f}, "
+                             f"оплачено {debtor.paid:,.2f})")
+            self.show_report(lines)
+        
+        self.db.submit(lambda conn: clients_with_debt(conn, min_debt), done,
+                       error_text="Не удалось построить отчет", description="Отчет о задолженностях",
+                       read_only=True)
+    
+    def generate_utilization_report(self):
+        period = self.report_period()
+        if period is None:
+            return
+        
+        def work(conn):
+            # Первый отчет читает все аренды, следующие - только изменения по журналу
+            if self.utilization is None:
+                self.utilization = UtilizationEngine()
+            return self.utilization.report(conn, period['date_from'], period['date_to'])
+        
+        def done(result):
+            lines = [f"Загрузка автопарка с {result.date_from} по {result.date_to}: {result.percent:.2f}% "
+                     f"({result.cars_total} автомобилей, {result.days} дней)", ""]
+            for title, groups in (("По категориям", result.categories), ("По маркам", result.brands)):
+                lines.append(title)
+                for group in groups:
+                    lines.append(f"  {group.name}: {group.percent:.2f}% (автомобилей: {group.cars})")
+                lines.append("")
+            limit = self.UTILIZATION_CARS_LIMIT
+            for title, cars in (("Самые загруженные", result.cars[:limit]),
+                                ("Наименее загруженные", result.cars[-limit:][::-1])):
+                lines.append(title)
+                for car in cars:
+                    lines.append(f"  {car.brand} {car.model} ({car.license_plate}, ID {car.car_id}): "
+                                 f"{car.percent:.2f}%, аренд {car.rentals}")
+                lines.append("")
+            if result.daily:
+                peak = max(result.daily, key=lambda d: d.cars_out)
+                low = min(result.daily, key=lambda d: d.cars_out)
+                lines.append(f"Больше всего в аренде: {peak.day} - {peak.cars_out} ({peak.percent:.2f}%)")
+                lines.append(f"Меньше всего в аренде: {low.day} - {low.cars_out} ({low.percent:.2f}%)")
+            self.show_report(lines)
+        
+        self.db.submit(work, done, error_text="Не удалось построить отчет",
+                       description="Отчет о загрузке автопарка", read_only=True)
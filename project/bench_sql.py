@@ -0,0 +1,354 @@
+"""Бенчмарки CarRentalQueries на локальной базе SQLite (SQLiteBackend).
+
+База-заменитель с той же схемой, что читает CarRentalQueries, создается
+один раз и переиспользуется между запусками. Ее параметры (--rentals,
+--workdir, --seed) принимает каждая команда.
+
+    python bench_sql.py pool [--rentals 100000] [--calls 2000]
+        запросы панели с новым соединением на каждый вызов (как было
+        в _get_connection) и через пул соединений
+    python bench_sql.py cache [--refreshes 200] [--write-every 10]
+        обновления панели отчетов без кэша и с QueryCache; каждое
+        write-every-е обновление совпадает с новой арендой
+    python bench_sql.py export [--sizes 100000 1000000] [--chunk-size 1000]
+        пиковая память (tracemalloc) выгрузок crm_export и accounting_export
+        потоком и со списком всех строк; код возврата 1, если пик потоковой
+        выгрузки растет вместе с числом строк (в каждой выгрузке должно быть
+        больше одной порции, иначе пик ограничен самими данными)
+    python bench_sql.py batch [--ids 10000]
+        подробности автомобилей и клиентов последних аренд: get_car_details /
+        get_client_info на каждый id против get_cars_details / get_clients_info;
+        код возврата 1, если результаты расходятся
+"""
+import argparse
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sql import CarRentalQueries, QueryCache, SQLiteBackend, write_export
+
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / 'car_rental_bench'
+REFERENCE_DATE = datetime(2025, 6, 1)  # Базы одного размера совпадают между запусками
+
+BRANDS = {
+    'Toyota': ['Camry', 'Corolla', 'RAV4'],
+    'Hyundai': ['Solaris', 'Creta', 'Tucson'],
+    'Kia': ['Rio', 'Sportage', 'K5'],
+    'BMW': ['X5', '3 Series'],
+    'Skoda': ['Octavia', 'Rapid'],
+}
+CLASSES = ['Эконом', 'Комфорт', 'Бизнес', 'Внедорожник']
+COLORS = ['Black', 'White', 'Red', 'Silver', 'Blue']
+FIRST_NAMES = ['Иван', 'Петр', 'Анна', 'Мария', 'Алексей', 'Ольга', 'Сергей', 'Елена']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Волков', 'Новиков']
+
+
+def seed_standin(path, rentals, seed=42):
+    """Заполняет базу-заменитель: клиентов - rentals // 10, автомобилей - rentals // 100"""
+    rnd = random.Random(seed)
+    clients, cars = max(100, rentals // 10), max(20, rentals // 100)
+    backend = SQLiteBackend(path)
+    backend.create_schema()
+    with backend.connection() as conn:
+        conn.executemany("INSERT INTO Brands (brand_name, country) VALUES (?, ?)",
+                         [(brand, None) for brand in BRANDS])
+        models = [(brand_id, model, 2015 + rnd.randrange(10), rnd.choice(CLASSES))
+                  for brand_id, brand in enumerate(BRANDS, 1) for model in BRANDS[brand]]
+        conn.executemany("INSERT INTO Models (brand_id, model_name, year, car_class) VALUES (?, ?, ?, ?)", models)
+        conn.executemany("INSERT INTO FuelTypes (fuel_name) VALUES (?)", [('Бензин',), ('Дизель',), ('Электро',)])
+        conn.executemany("INSERT INTO Parkings (address) VALUES (?)",
+                         [(f"ул. Парковая, {number}",) for number in range(1, 6)])
+        conn.executemany(
+            "INSERT INTO Cars (model_id, fuel_id, parking_id, registration_number, vin, color, mileage,"
+            " purchase_date, daily_price, is_available) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(rnd.randint(1, len(models)), rnd.randint(1, 3), rnd.randint(1, 5), f"А{car:06d}", f"VIN{car:014d}",
+              rnd.choice(COLORS), rnd.randrange(0, 150000),
+              (REFERENCE_DATE - timedelta(days=rnd.randrange(365, 3650))).date().isoformat(),
+              rnd.randrange(1500, 9000, 100), rnd.random() < 0.7)
+             for car in range(1, cars + 1)])
+        conn.executemany(
+            "INSERT INTO Clients (first_name, last_name, phone, email, driver_license, birth_date, rating)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), f"+7916{client:07d}", f"client{client}@example.com",
+              f"77{client:08d}", (REFERENCE_DATE - timedelta(days=rnd.randrange(18 * 365, 70 * 365))).date().isoformat(),
+              round(rnd.uniform(3.0, 5.0), 1))
+             for client in range(1, clients + 1)])
+
+        def rental():
+            start = REFERENCE_DATE - timedelta(days=rnd.randrange(0, 3 * 365), hours=rnd.randrange(24))
+            end = start + timedelta(days=rnd.randint(1, 14))
+            active = end > REFERENCE_DATE
+            return (rnd.randint(1, clients), rnd.randint(1, cars), start.isoformat(sep=' '), end.isoformat(sep=' '),
+                    None if active else end.isoformat(sep=' '), rnd.randrange(2000, 100000, 100),
+                    'active' if active else 'completed')
+
+        conn.executemany(
+            "INSERT INTO Rentals (client_id, car_id, start_datetime, planned_end_datetime, actual_end_datetime,"
+            " total_cost, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (rental() for _ in range(rentals)))
+        conn.commit()
+    backend.close()
+
+
+def get_standin(rentals, workdir=DEFAULT_WORKDIR, seed=42):
+    """Путь к базе-заменителю с rentals арендами (создается при первом обращении)"""
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    path = workdir / f'standin_{rentals}_seed{seed}.db'
+    if not path.exists():
+        print(f"Создание базы {path.name}...")
+        tmp = path.with_suffix('.tmp')
+        tmp.unlink(missing_ok=True)
+        seed_standin(tmp, rentals, seed)
+        tmp.rename(path)
+    return str(path)
+
+
+class UnpooledSQLiteBackend(SQLiteBackend):
+    """Новое соединение на каждый вызов - как прежний CarRentalQueries._get_connection"""
+
+    @contextmanager
+    def connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def summary(values):
+    values = sorted(values)
+    return {'calls': len(values),
+            'mean_ms': round(statistics.fmean(values), 4),
+            'p50_ms': round(values[len(values) // 2], 4),
+            'p95_ms': round(values[int(len(values) * 0.95)], 4)}
+
+
+def bench_pool(args):
+    """Запросы панели по одному: точечные чтения и короткие списки"""
+    path = get_standin(args.rentals, args.workdir, args.seed)
+    probe = CarRentalQueries(backend=SQLiteBackend(path))
+    max_car = probe._fetchone("SELECT MAX(car_id) AS n FROM Cars")['n']
+    max_client = probe._fetchone("SELECT MAX(client_id) AS n FROM Clients")['n']
+    calls = [
+        ('get_car_details', lambda q, rnd: q.get_car_details(rnd.randint(1, max_car))),
+        ('get_client_info', lambda q, rnd: q.get_client_info(rnd.randint(1, max_client))),
+        ('get_available_cars', lambda q, rnd: q.get_available_cars(3)),
+        ('get_active_rentals', lambda q, rnd: q.get_active_rentals(3)),
+    ]
+    results = {}
+    for mode, backend in (('per-call', UnpooledSQLiteBackend(path)), ('pooled', SQLiteBackend(path))):
+        queries = CarRentalQueries(backend=backend)
+        for name, call in calls:
+            rnd = random.Random(args.seed)
+            call(queries, rnd)  # Прогрев кэша страниц
+            timings = []
+            for _ in range(args.calls):
+                started = time.perf_counter()
+                call(queries, rnd)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[(name, mode)] = summary(timings)
+        backend.close()
+
+    print(f"{'запрос':<20} {'режим':<9} {'среднее, мс':>12} {'p50, мс':>9} {'p95, мс':>9}")
+    for name, _ in calls:
+        for mode in ('per-call', 'pooled'):
+            stats = results[(name, mode)]
+            print(f"{name:<20} {mode:<9} {stats['mean_ms']:>12.4f} {stats['p50_ms']:>9.4f} {stats['p95_ms']:>9.4f}")
+        speedup = results[(name, 'per-call')]['mean_ms'] / results[(name, 'pooled')]['mean_ms']
+        print(f"{'':<20} ускорение пула: x{speedup:.1f}")
+    return 0
+
+
+# Отчеты панели: тяжелые GROUP BY по всей истории аренд
+DASHBOARD = [
+    ('get_top_clients', lambda q: q.get_top_clients(5)),
+    ('get_monthly_revenue_report', lambda q: q.get_monthly_revenue_report(2024)),
+    ('get_monthly_stats', lambda q: q.get_monthly_stats(2025)),
+    ('client_analysis', lambda q: q.client_analysis()),
+    ('avg_price_by_class', lambda q: q.avg_price_by_class()),
+]
+
+RENTAL_INSERT = """
+INSERT INTO Rentals (client_id, car_id, start_datetime, planned_end_datetime, total_cost, status)
+VALUES (%s, %s, %s, %s, %s, 'active')
+"""
+
+
+def bench_cache(args):
+    """Обновления панели: все отчеты подряд, изредка - новая аренда между обновлениями"""
+    source = Path(get_standin(args.rentals, args.workdir, args.seed))
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        path = Path(tmp) / source.name
+        for mode, cache in (('no cache', None), ('cache', QueryCache(ttl=args.ttl))):
+            shutil.copyfile(source, path)  # Аренды бенчмарка не попадают в базу-заменитель
+            backend = SQLiteBackend(path)
+            queries = CarRentalQueries(backend=backend, cache=cache)
+            rnd = random.Random(args.seed)
+            timings = []
+            for refresh in range(1, args.refreshes + 1):
+                if args.write_every and refresh % args.write_every == 0:
+                    queries._execute(RENTAL_INSERT, (rnd.randint(1, 100), rnd.randint(1, 20), '2025-06-01 10:00:00',
+                                                     '2025-06-05 10:00:00', 10000), ('Rentals',))
+                started = time.perf_counter()
+                for _, report in DASHBOARD:
+                    report(queries)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[mode] = (summary(timings), queries.cache_stats())
+            backend.close()
+
+    print(f"{'режим':<9} {'обновлений':>10} {'среднее, мс':>12} {'p50, мс':>9} {'p95, мс':>9}")
+    for mode, (stats, _) in results.items():
+        print(f"{mode:<9} {stats['calls']:>10} {stats['mean_ms']:>12.3f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f}")
+    stats = results['cache'][1]
+    print(f"Кэш: попаданий {stats['hits']}, промахов {stats['misses']} (доля попаданий {stats['hit_rate']:.1%}), "
+          f"сброшено записью {stats['invalidated']}, по TTL {stats['expired']}")
+    print(f"Ускорение обновления: x{results['no cache'][0]['mean_ms'] / results['cache'][0]['mean_ms']:.1f}")
+    return 0
+
+
+def measure(func):
+    """(результат, пик памяти Python в МБ, секунды)"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - started
+        return result, tracemalloc.get_traced_memory()[1] / 2 ** 20, elapsed
+    finally:
+        tracemalloc.stop()
+
+
+def bench_export(args):
+    """Пик памяти выгрузок при росте базы: потоком он не должен зависеть от числа строк"""
+    exports = [
+        # Все аренды 2024 года - выгрузка для бухгалтерии за 12 месяцев подряд
+        ('accounting', lambda q, month: q.accounting_export(2024, month, args.chunk_size), range(1, 13)),
+        ('crm', lambda q, _: q.crm_export(args.chunk_size), [None]),
+    ]
+    modes = [('stream', 'csv'), ('stream', 'jsonl.gz'), ('list', 'csv')]
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        for size in args.sizes:
+            path = get_standin(size, args.workdir, args.seed)
+            queries = CarRentalQueries(backend=SQLiteBackend(path), cache=None)
+            for name, export, parts in exports:
+                for mode, suffix in modes:
+                    target = Path(tmp) / f'{name}.{suffix}'
+
+                    def run():
+                        rows = 0
+                        for part in parts:
+                            source = export(queries, part)
+                            if mode == 'list':
+                                source = list(source)  # Наивная выгрузка: все строки в памяти
+                            rows += write_export(source, target.with_name(f'{part}_{target.name}'))
+                        return rows
+
+                    rows, peak, elapsed = measure(run)
+                    size_mb = sum(f.stat().st_size for f in Path(tmp).glob(f'*_{target.name}')) / 2 ** 20
+                    results.append({'size': size, 'export': name, 'mode': mode, 'format': suffix, 'rows': rows,
+                                    'peak_mb': round(peak, 2), 'seconds': round(elapsed, 3),
+                                    'file_mb': round(size_mb, 2)})
+                    for leftover in Path(tmp).glob(f'*_{target.name}'):
+                        leftover.unlink()
+            queries.backend.close()
+
+    print(f"{'аренд':>9} {'выгрузка':<11} {'режим':<7} {'формат':<9} {'строк':>9} {'пик, МБ':>8} "
+          f"{'с':>7} {'строк/с':>9} {'файл, МБ':>9}")
+    for r in results:
+        print(f"{r['size']:>9} {r['export']:<11} {r['mode']:<7} {r['format']:<9} {r['rows']:>9} {r['peak_mb']:>8.2f} "
+              f"{r['seconds']:>7.2f} {r['rows'] / max(r['seconds'], 1e-9):>9,.0f} {r['file_mb']:>9.2f}")
+
+    problem = None
+    for name, _, _ in exports:
+        for _, suffix in modes[:2]:
+            peaks = [r['peak_mb'] for r in results
+                     if r['export'] == name and r['mode'] == 'stream' and r['format'] == suffix]
+            # Допуск: порции fetchmany и буферы файла, но не рост с числом строк
+            if len(peaks) > 1 and peaks[-1] > peaks[0] * 1.5 + 1.0:
+                problem = f"{name} {suffix}: пик потоковой выгрузки вырос с {peaks[0]} до {peaks[-1]} МБ"
+    if problem:
+        print(f"ОШИБКА: {problem}")
+        return 1
+    return 0
+
+
+def bench_batch(args):
+    """N+1 против пакетных запросов для id из последних аренд (с повторами, как в таблице аренд)"""
+    path = get_standin(args.rentals, args.workdir, args.seed)
+    backend = SQLiteBackend(path)
+    queries = CarRentalQueries(backend=backend, cache=None)
+    recent = queries._fetchall("SELECT car_id, client_id FROM Rentals ORDER BY rental_id DESC LIMIT %s", (args.ids,))
+    lookups = [
+        ('cars', [row['car_id'] for row in recent], queries.get_car_details, queries.get_cars_details),
+        ('clients', [row['client_id'] for row in recent], queries.get_client_info, queries.get_clients_info),
+    ]
+    failed = False
+    print(f"{'данные':<8} {'id':>6} {'разных':>7} {'по одному, мс':>14} {'пакетом, мс':>12} {'ускорение':>10}")
+    for name, ids, single, batch in lookups:
+        single(ids[0]), batch(ids[:1])  # Прогрев кэша страниц
+        started = time.perf_counter()
+        one_by_one = {}
+        for id_ in ids:
+            row = single(id_)
+            if row is not None:
+                one_by_one[id_] = row
+        single_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        batched = batch(ids)
+        batch_ms = (time.perf_counter() - started) * 1000
+        if batched != one_by_one or list(batched) != list(dict.fromkeys(ids)):
+            print(f"ОШИБКА: {name}: пакетный результат отличается от поштучного")
+            failed = True
+        print(f"{name:<8} {len(ids):>6} {len(batched):>7} {single_ms:>14.1f} {batch_ms:>12.1f} "
+              f"{'x' + format(single_ms / batch_ms, '.1f'):>10}")
+    backend.close()
+    return 1 if failed else 0
+
+
+def main():
+    # Общие параметры базы-заменителя - у каждой команды: пишутся после ее имени
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--rentals', type=int, default=100_000, help='аренд в базе-заменителе')
+    common.add_argument('--workdir', default=str(DEFAULT_WORKDIR))
+    common.add_argument('--seed', type=int, default=42)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pool = commands.add_parser('pool', parents=[common], help='соединение на вызов против пула')
+    pool.add_argument('--calls', type=int, default=2000, help='вызовов каждого запроса')
+    pool.set_defaults(run=bench_pool)
+
+    cache = commands.add_parser('cache', parents=[common], help='панель отчетов без кэша и с кэшем')
+    cache.add_argument('--refreshes', type=int, default=200, help='обновлений панели')
+    cache.add_argument('--write-every', type=int, default=10, help='новая аренда перед каждым N-м обновлением')
+    cache.add_argument('--ttl', type=float, default=60.0, help='срок жизни записи кэша, с')
+    cache.set_defaults(run=bench_cache)
+
+    export = commands.add_parser('export', parents=[common], help='пиковая память выгрузок')
+    export.add_argument('--sizes', type=int, nargs='*', default=[100_000, 1_000_000],
+                        help='размеры баз-заменителей (аренд)')
+    export.add_argument('--chunk-size', type=int, default=1000, help='строк в порции fetchmany')
+    export.set_defaults(run=bench_export)
+
+    batch = commands.add_parser('batch', parents=[common], help='запросы по одному id против пакетных')
+    batch.add_argument('--ids', type=int, default=10_000, help='id из последних аренд')
+    batch.set_defaults(run=bench_batch)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
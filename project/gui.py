@@ -9,6 +9,7 @@ import mysql.connector
 import configparser
 from pathlib import Path
 import time
+from sql import QUERY_CACHE
 
 #logging.basicConfig(level=logging.DEBUG, filename='rental.log')
 
@@ -416,6 +417,7 @@ class CarRentalSystem:
                 """, tuple(data.values()))
                 
                 conn.commit()
+                QUERY_CACHE.bump('Clients')  # Отчеты CarRentalQueries по этим таблицам устарели
                 messagebox.showinfo("Успех", "Клиент успешно добавлен!")
                 self.load_clients()
                 
@@ -643,6 +645,7 @@ class CarRentalSystem:
             ))
             
             conn.commit()
+            QUERY_CACHE.bump('Cars')
             messagebox.showinfo("Успех", "Автомобиль успешно добавлен!")
             self.load_cars()
             
@@ -697,6 +700,7 @@ class CarRentalSystem:
             cursor.execute("DELETE FROM Cars WHERE car_id = %s", (car_id,))
             
             conn.commit()
+            QUERY_CACHE.bump('CarConditions', 'Rentals', 'Cars')
             messagebox.showinfo("Успех", "Автомобиль и связанные данные удалены!")
             self.load_cars()
             self.load_rentals()
@@ -791,6 +795,7 @@ class CarRentalSystem:
                 (first_name.strip(), last_name.strip(), phone.strip(), 5.0)  # Начальный рейтинг 5.0
             )
             conn.commit()
+            QUERY_CACHE.bump('Clients')
             messagebox.showinfo("Успех", "Клиент успешно добавлен!")
             self.load_clients()
             
@@ -908,6 +913,7 @@ class CarRentalSystem:
                 """, (car_id,))
                 
                 conn.commit()
+                QUERY_CACHE.bump('Rentals', 'Cars')
                 messagebox.showinfo(
                     "Успех", 
                     f"Аренда оформлена!\n"
@@ -942,6 +948,7 @@ class CarRentalSystem:
             cursor.execute("INSERT INTO Brands (brand_name, country) VALUES (%s, %s)", 
                         (brand_name, country))
             conn.commit()
+            QUERY_CACHE.bump('Brands')
             return cursor.lastrowid
         except mysql.connector.Error as err:
             messagebox.showerror("Ошибка", f"Не удалось добавить бренд: {err}")
@@ -961,6 +968,7 @@ class CarRentalSystem:
                 VALUES (%s, %s, %s, %s)
             """, (brand_id, model_name, year, car_class))
             conn.commit()
+            QUERY_CACHE.bump('Models')
             return cursor.lastrowid
         except mysql.connector.Error as err:
             messagebox.showerror("Ошибка", f"Не удалось добавить модель: {err}")
@@ -1015,6 +1023,7 @@ class CarRentalSystem:
             cursor.execute("DELETE FROM Cars WHERE car_id = %s", (car_id,))
             
             conn.commit()
+            QUERY_CACHE.bump('CarConditions', 'Rentals', 'Cars')
             messagebox.showinfo("Успех", "Автомобиль и связанные данные успешно удалены!")
             
             # Обновляем отображение
@@ -1055,6 +1064,7 @@ class CarRentalSystem:
             cursor.execute("DELETE FROM Clients WHERE client_id = %s", (client_id,))
             
             conn.commit()
+            QUERY_CACHE.bump('Rentals', 'Clients')
             messagebox.showinfo("Успех", "Клиент и его аренды удалены!")
             self.load_clients()
             self.load_rentals()  # Обновляем список аренд
@@ -1096,6 +1106,7 @@ class CarRentalSystem:
             cursor.execute("UPDATE Cars SET is_available = TRUE WHERE car_id = %s", (car_id,))
             
             conn.commit()
+            QUERY_CACHE.bump('Rentals', 'Cars')
             messagebox.showinfo("Успех", "Аренда завершена!")
             self.load_rentals()
             self.load_cars()
@@ -1,18 +1,428 @@
 # SQL-запросы
-import mysql.connector
-from typing import List, Dict, Union, Optional
-from datetime import datetime, timedelta
+import copy
+import csv
+import functools
+import gzip
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable, Iterable, Iterator, List, Dict, Union, Optional
+
+try:
+    import mysql.connector
+    from mysql.connector import pooling
+except ImportError:  # Локальной базе SQLite драйвер MySQL не нужен
+    mysql = None
+
+EXPORT_CHUNK = 5000  # Строк за один fetchmany при выгрузках
+IN_CHUNK = 500  # id в одном списке IN (...): старые SQLite ограничены 999 параметрами
+
+
+# ========== Источники соединений ==========
+class MySQLBackend:
+    """Пул соединений MySQL: подключение и авторизация выполняются один раз
+    на соединение пула, а не на каждый запрос"""
+    placeholder = '%s'
+
+    def __init__(self, connection_params: Dict, pool_size: int = 5, timeout: float = 10.0):
+        if mysql is None:
+            raise RuntimeError("Не установлен драйвер MySQL: pip install mysql-connector-python")
+        # consume_results: выгрузка, прерванная на середине, дочитывается при закрытии
+        # курсора - иначе соединение с непрочитанным результатом нельзя вернуть в пул
+        self.pool = pooling.MySQLConnectionPool(pool_name=f"car_rental_{id(self)}", pool_size=pool_size,
+                                                **{'consume_results': True, **connection_params})
+        self.timeout = timeout
+        # get_connection() не ждет освобождения соединения, поэтому ожидание - на семафоре
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Нет свободного соединения в пуле за {self.timeout} с")
+        try:
+            conn = self.pool.get_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()  # Возвращает соединение в пул со сбросом сессии
+        finally:
+            self._slots.release()
+
+    def cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def stream_cursor(self, conn):
+        """Небуферизованный курсор: строки читаются с сервера по мере fetchmany"""
+        return conn.cursor(dictionary=True, buffered=False)
+
+    def translate(self, query: str) -> str:
+        return query
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _shift(value, amount, unit):
+    value = _to_date(value)
+    if value is None:
+        return None
+    unit = unit.upper()
+    if unit == 'DAY':
+        return (value + timedelta(days=amount)).isoformat()
+    months = value.year * 12 + value.month - 1 + amount * (12 if unit == 'YEAR' else 1)
+    year, month = divmod(months, 12)
+    for day in range(value.day, 27, -1):  # 31 января + 1 месяц = 28/29 февраля
+        try:
+            return date(year, month + 1, day).isoformat()
+        except ValueError:
+            continue
+    return date(year, month + 1, value.day).isoformat()
+
+
+def _timestampdiff(unit, start, end):
+    start, end = _to_date(start), _to_date(end)
+    if start is None or end is None:
+        return None
+    unit = unit.upper()
+    if unit == 'DAY':
+        return (end - start).days
+    months = (end.year - start.year) * 12 + end.month - start.month - (end.day < start.day)
+    return months // 12 if unit == 'YEAR' else months
+
+
+def _part(index):
+    def part(value):
+        value = _to_date(value)
+        return None if value is None else (value.year, value.month, value.day)[index]
+    return part
+
+
+# Функции MySQL, которые используют запросы CarRentalQueries: (имя, число аргументов, функция, детерминирована)
+_MYSQL_FUNCTIONS = [
+    ('YEAR', 1, _part(0), True),
+    ('MONTH', 1, _part(1), True),
+    ('DAY', 1, _part(2), True),
+    ('DATEDIFF', 2, lambda a, b: None if a is None or b is None else (_to_date(a) - _to_date(b)).days, True),
+    ('CURDATE', 0, lambda: date.today().isoformat(), False),
+    ('DATE_ADD', 3, lambda value, amount, unit: _shift(value, amount, unit), True),
+    ('DATE_SUB', 3, lambda value, amount, unit: _shift(value, -amount, unit), True),
+    ('TIMESTAMPDIFF', 3, _timestampdiff, True),
+]
+
+# Синтаксис MySQL, который SQLite не разбирает, переписывается в вызовы функций выше
+_MYSQL_SYNTAX = [
+    (re.compile(r'INTERVAL\s+(\d+)\s+(DAY|MONTH|YEAR)\b', re.IGNORECASE), r"\1, '\2'"),
+    (re.compile(r'TIMESTAMPDIFF\(\s*(DAY|MONTH|YEAR)\s*,', re.IGNORECASE), r"TIMESTAMPDIFF('\1',"),
+    (re.compile(r'%s'), '?'),
+]
+
+
+@lru_cache(maxsize=256)
+def _translate_mysql(query: str) -> str:
+    for pattern, replacement in _MYSQL_SYNTAX:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+# Схема локальной базы - те же таблицы и столбцы, что читает CarRentalQueries
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Brands (
+    brand_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    brand_name TEXT NOT NULL UNIQUE,
+    country TEXT
+);
+CREATE TABLE IF NOT EXISTS Models (
+    model_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    brand_id INTEGER NOT NULL REFERENCES Brands(brand_id),
+    model_name TEXT NOT NULL,
+    year INTEGER,
+    car_class TEXT
+);
+CREATE TABLE IF NOT EXISTS FuelTypes (
+    fuel_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fuel_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Parkings (
+    parking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    address TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Cars (
+    car_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_id INTEGER NOT NULL REFERENCES Models(model_id),
+    fuel_id INTEGER NOT NULL REFERENCES FuelTypes(fuel_id),
+    parking_id INTEGER REFERENCES Parkings(parking_id),
+    registration_number TEXT NOT NULL UNIQUE,
+    vin TEXT UNIQUE,
+    color TEXT,
+    mileage INTEGER NOT NULL DEFAULT 0,
+    purchase_date DATE,
+    daily_price REAL NOT NULL,
+    is_available BOOLEAN NOT NULL DEFAULT TRUE
+);
+CREATE TABLE IF NOT EXISTS Clients (
+    client_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    phone TEXT,
+    email TEXT,
+    driver_license TEXT,
+    birth_date DATE,
+    rating REAL NOT NULL DEFAULT 5.0
+);
+CREATE TABLE IF NOT EXISTS Rentals (
+    rental_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id INTEGER NOT NULL REFERENCES Clients(client_id),
+    car_id INTEGER NOT NULL REFERENCES Cars(car_id),
+    start_datetime DATETIME NOT NULL,
+    planned_end_datetime DATETIME NOT NULL,
+    actual_end_datetime DATETIME,
+    total_cost REAL,
+    status TEXT NOT NULL DEFAULT 'active'
+);
+CREATE INDEX IF NOT EXISTS idx_rentals_client ON Rentals(client_id);
+CREATE INDEX IF NOT EXISTS idx_rentals_car ON Rentals(car_id);
+CREATE INDEX IF NOT EXISTS idx_rentals_start ON Rentals(start_datetime);
+"""
+
+
+class SQLiteBackend:
+    """Локальная база SQLite с тем же API - для тестов и бенчмарков без сервера MySQL.
+
+    Функции дат MySQL (YEAR, DATEDIFF, CURDATE, ...) регистрируются в каждом
+    соединении, а INTERVAL и TIMESTAMPDIFF(YEAR, ...) переписываются в их вызовы.
+    """
+    placeholder = '?'
+
+    def __init__(self, path, pool_size: int = 5, timeout: float = 10.0):
+        self.path = str(path)
+        self.timeout = timeout
+        # Каждое соединение с ':memory:' - отдельная база, поэтому для нее соединение одно
+        self._slots = threading.BoundedSemaphore(1 if self.path == ':memory:' else pool_size)
+        self._idle = Queue()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = _dict_row
+        for name, args, func, deterministic in _MYSQL_FUNCTIONS:
+            conn.create_function(name, args, func, deterministic=deterministic)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Нет свободного соединения в пуле за {self.timeout} с")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def cursor(self, conn):
+        return conn.cursor()
+
+    def stream_cursor(self, conn):
+        return conn.cursor()  # Курсор SQLite и так выбирает строки по шагам
+
+    def translate(self, query: str) -> str:
+        return _translate_mysql(query)
+
+    def create_schema(self):
+        with self.connection() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+
+# ========== Кэш результатов чтения ==========
+class QueryCache:
+    """Результаты методов CarRentalQueries: LRU с TTL на запись.
+
+    У каждой таблицы есть счетчик версий; пути записи (методы CarRentalQueries
+    и project/gui.py) увеличивают его через bump(). Запись кэша хранит версии
+    своих таблиц на момент чтения и устаревает, как только любая из них
+    изменилась. TTL страхует от записей, о которых процесс не знает
+    (другие клиенты той же базы).
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ключ -> (результат, срок, {таблица: версия})
+        self._versions = {}  # таблица -> версия
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0, 'evicted': 0}
+
+    def bump(self, *tables: str):
+        """Отмечает запись в таблицы: зависящие от них результаты устаревают"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get_or_load(self, key, tables, load, ttl: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires, versions = entry
+                if expires <= now:
+                    self._stats['expired'] += 1
+                elif any(self._versions.get(table, 0) != version for table, version in versions.items()):
+                    self._stats['invalidated'] += 1
+                else:
+                    self._stats['hits'] += 1
+                    self._entries.move_to_end(key)
+                    return copy.deepcopy(result)
+                del self._entries[key]
+            self._stats['misses'] += 1
+            # Версии до чтения: запись во время чтения сделает результат устаревшим сразу
+            versions = {table: self._versions.get(table, 0) for table in tables}
+
+        result = load()
+        with self._lock:
+            self._entries[key] = (result, now + (self.ttl if ttl is None else ttl), versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+        return copy.deepcopy(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов; hit_rate - доля попаданий"""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Общий кэш процесса: в него же сообщают о записях окна project/gui.py
+QUERY_CACHE = QueryCache()
+
+
+def cached(*tables: str, ttl: Optional[float] = None):
+    """Кэширует результат метода по аргументам до записи в tables или истечения ttl"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+            key = (self.backend, method.__name__, args, tuple(sorted(kwargs.items())))
+            return self.cache.get_or_load(key, tables, lambda: method(self, *args, **kwargs), ttl)
+        return wrapper
+    return decorate
+
 
 class CarRentalQueries:
-    def __init__(self, connection_params: Dict):
-        self.connection_params = connection_params
+    def __init__(self, connection_params: Optional[Dict] = None, backend=None, pool_size: int = 5,
+                 cache: Optional[QueryCache] = QUERY_CACHE):
+        """connection_params - параметры mysql.connector для пула MySQL;
+        backend - готовый источник соединений (например, SQLiteBackend);
+        cache=None отключает кэш результатов"""
+        self.backend = backend if backend is not None else MySQLBackend(connection_params, pool_size)
+        self.cache = cache
     
-    def _get_connection(self):
-        """Устанавливает соединение с базой данных"""
-        return mysql.connector.connect(**self.connection_params)
+    def _fetchall(self, query: str, params=()) -> List[Dict]:
+        with self.backend.connection() as conn:
+            cursor = self.backend.cursor(conn)
+            try:
+                cursor.execute(self.backend.translate(query), params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _stream(self, query: str, params=(), chunk_size: int = EXPORT_CHUNK) -> Iterator[Dict]:
+        """Строки результата порциями fetchmany: в памяти не больше chunk_size строк.
+        Соединение занято, пока генератор не исчерпан или не закрыт"""
+        with self.backend.connection() as conn:
+            cursor = self.backend.stream_cursor(conn)
+            try:
+                cursor.execute(self.backend.translate(query), params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield from rows
+            finally:
+                cursor.close()
+
+    def _fetch_by_ids(self, query: str, key: str, ids: Iterable[int], chunk_size: int = IN_CHUNK) -> Dict[int, Dict]:
+        """Строки по списку id: query содержит {ids} на месте списка IN (...).
+        Повторы id убираются, длинный список делится на порции по chunk_size;
+        словарь упорядочен как ids, отсутствующих в базе id в нем нет"""
+        order = list(dict.fromkeys(ids))
+        found = {}
+        with self.backend.connection() as conn:
+            cursor = self.backend.cursor(conn)
+            try:
+                for start in range(0, len(order), chunk_size):
+                    chunk = order[start:start + chunk_size]
+                    cursor.execute(self.backend.translate(query.format(ids=', '.join(['%s'] * len(chunk)))), chunk)
+                    for row in cursor.fetchall():
+                        found[row[key]] = row
+            finally:
+                cursor.close()
+        return {id_: found[id_] for id_ in order if id_ in found}
+
+    def _fetchone(self, query: str, params=()) -> Optional[Dict]:
+        rows = self._fetchall(query, params)
+        return rows[0] if rows else None
+
+    def _execute(self, query: str, params=(), tables=()):
+        """Выполняет изменение и фиксирует его; возвращает (lastrowid, rowcount).
+        tables - измененные таблицы, кэш зависящих от них результатов сбрасывается"""
+        with self.backend.connection() as conn:
+            cursor = self.backend.cursor(conn)
+            try:
+                cursor.execute(self.backend.translate(query), params)
+                conn.commit()
+                if self.cache is not None:
+                    self.cache.bump(*tables)
+                return cursor.lastrowid, cursor.rowcount
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def cache_stats(self) -> Dict:
+        return self.cache.stats() if self.cache is not None else {}
+
     # 1. Основные методы для работы с автомобилями
-    def get_available_cars(self) -> List[Dict]:
-        """Получить все доступные автомобили (3 примера)"""
+    def get_available_cars(self, limit: Optional[int] = None) -> List[Dict]:
+        """Получить доступные автомобили (limit - первые по цене)"""
         query = """
         SELECT 
             c.car_id, 
@@ -26,22 +436,12 @@ class CarRentalQueries:
         JOIN Brands b ON m.brand_id = b.brand_id
         WHERE c.is_available = TRUE
         ORDER BY c.daily_price
-        LIMIT 3
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query)
-            return [
-                {'car_id': 1, 'brand_name': 'Toyota', 'model_name': 'Camry', 'color': 'Black', 'daily_price': 3500, 'registration_number': 'А123БВ777'},
-                {'car_id': 2, 'brand_name': 'Hyundai', 'model_name': 'Solaris', 'color': 'White', 'daily_price': 2800, 'registration_number': 'В456ТУ777'},
-                {'car_id': 3, 'brand_name': 'Kia', 'model_name': 'Rio', 'color': 'Red', 'daily_price': 2500, 'registration_number': 'С789ОР777'}
-            ]
-    
+        if limit is None:
+            return self._fetchall(query)
+        return self._fetchall(query + " LIMIT %s", (limit,))
 
-
-    def get_car_details(self, car_id: int) -> Optional[Dict]:
-        """Получить подробную информацию об автомобиле"""
-        query = """
+    CAR_DETAILS = """
         SELECT 
             c.*,
             b.brand_name,
@@ -53,23 +453,28 @@ class CarRentalQueries:
         JOIN Brands b ON m.brand_id = b.brand_id
         JOIN FuelTypes f ON c.fuel_id = f.fuel_id
         LEFT JOIN Parkings p ON c.parking_id = p.parking_id
-        WHERE c.car_id = %s
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, (car_id,))
-            return cursor.fetchone()
+
+    def get_car_details(self, car_id: int) -> Optional[Dict]:
+        """Получить подробную информацию об автомобиле"""
+        return self._fetchone(self.CAR_DETAILS + "WHERE c.car_id = %s", (car_id,))
+
+    def get_cars_details(self, car_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Подробная информация о нескольких автомобилях за один запрос на порцию:
+        {car_id: строка как в get_car_details}"""
+        return self._fetch_by_ids(self.CAR_DETAILS + "WHERE c.car_id IN ({ids})", 'car_id', car_ids)
     
     # 2. Методы для работы с клиентами
     def get_client_info(self, client_id: int) -> Optional[Dict]:
         """Получить информацию о клиенте"""
         query = "SELECT * FROM Clients WHERE client_id = %s"
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, (client_id,))
-            return cursor.fetchone()
+        return self._fetchone(query, (client_id,))
+
+    def get_clients_info(self, client_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Информация о нескольких клиентах: {client_id: строка как в get_client_info}"""
+        return self._fetch_by_ids("SELECT * FROM Clients WHERE client_id IN ({ids})", 'client_id', client_ids)
     
-    # 2. Методы для работы с клиентами
+    @cached('Clients', 'Rentals')
     def get_top_clients(self, limit: int = 5) -> List[Dict]:
         """Получить самых активных клиентов по количеству аренд"""
         query = """
@@ -92,21 +497,11 @@ class CarRentalQueries:
         ORDER BY rentals_count DESC, total_spent DESC
         LIMIT %s
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, (limit,))
-            return [
-                {'client_id': 1, 'first_name': 'Иван', 'last_name': 'Иванов', 'phone': '+79161234567', 
-                 'rating': 4.9, 'rentals_count': 12, 'total_spent': 125000, 'client_status': 'VIP'},
-                {'client_id': 2, 'first_name': 'Петр', 'last_name': 'Петров', 'phone': '+79167654321', 
-                 'rating': 4.7, 'rentals_count': 8, 'total_spent': 87000, 'client_status': 'Постоянный клиент'},
-                {'client_id': 3, 'first_name': 'Анна', 'last_name': 'Сидорова', 'phone': '+79165544333', 
-                 'rating': 4.8, 'rentals_count': 6, 'total_spent': 65000, 'client_status': 'Постоянный клиент'}
-            ]
+        return self._fetchall(query, (limit,))
 
     # 3. Методы для работы с арендами
-    def get_active_rentals(self) -> List[Dict]:
-        """Получить список активных аренд"""
+    def get_active_rentals(self, limit: Optional[int] = None) -> List[Dict]:
+        """Получить список активных аренд (limit - с ближайшим сроком возврата)"""
         query = """
         SELECT 
             r.rental_id,
@@ -115,7 +510,8 @@ class CarRentalQueries:
             b.brand_name,
             m.model_name,
             r.start_datetime,
-            r.planned_end_datetime
+            r.planned_end_datetime,
+            r.total_cost
         FROM Rentals r
         JOIN Clients c ON r.client_id = c.client_id
         JOIN Cars car ON r.car_id = car.car_id
@@ -124,16 +520,16 @@ class CarRentalQueries:
         WHERE r.status = 'active'
         ORDER BY r.planned_end_datetime
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query)
-            return cursor.fetchall()
-    
+        if limit is None:
+            return self._fetchall(query)
+        return self._fetchall(query + " LIMIT %s", (limit,))
+
 # 3. Финансовые отчеты
+    @cached('Rentals')
     def get_monthly_revenue_report(self, year: int) -> List[Dict]:
         """Получить отчет по доходам по месяцам за указанный год"""
         query = """
-        SELECT 
+        SELECT
             MONTH(start_datetime) AS month,
             COUNT(*) AS rentals_count,
             SUM(total_cost) AS total_income,
@@ -144,53 +540,10 @@ class CarRentalQueries:
         GROUP BY MONTH(start_datetime)
         ORDER BY month
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, (year,))
-            return [
-                {'month': 1, 'rentals_count': 15, 'total_income': 150000, 'avg_daily_income': 5000},
-                {'month': 2, 'rentals_count': 18, 'total_income': 180000, 'avg_daily_income': 6000},
-                {'month': 3, 'rentals_count': 22, 'total_income': 220000, 'avg_daily_income': 7000}
-            ]
-
-    # 4. Методы для работы с арендами
-    def get_active_rentals(self) -> List[Dict]:
-        """Получить список активных аренд (3 примера)"""
-        query = """
-        SELECT 
-            r.rental_id,
-            c.first_name,
-            c.last_name,
-            b.brand_name,
-            m.model_name,
-            r.start_datetime,
-            r.planned_end_datetime,
-            r.total_cost
-        FROM Rentals r
-        JOIN Clients c ON r.client_id = c.client_id
-        JOIN Cars car ON r.car_id = car.car_id
-        JOIN Models m ON car.model_id = m.model_id
-        JOIN Brands b ON m.brand_id = b.brand_id
-        WHERE r.status = 'active'
-        ORDER BY r.planned_end_datetime
-        LIMIT 3
-        """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query)
-            return [
-                {'rental_id': 1, 'first_name': 'Иван', 'last_name': 'Иванов', 
-                 'brand_name': 'Toyota', 'model_name': 'Camry',
-                 'start_datetime': '2023-05-10 08:00:00', 'planned_end_datetime': '2023-05-15 20:00:00', 'total_cost': 17500},
-                {'rental_id': 2, 'first_name': 'Петр', 'last_name': 'Петров', 
-                 'brand_name': 'Hyundai', 'model_name': 'Solaris',
-                 'start_datetime': '2023-05-12 10:00:00', 'planned_end_datetime': '2023-05-14 18:00:00', 'total_cost': 8400},
-                {'rental_id': 3, 'first_name': 'Анна', 'last_name': 'Сидорова', 
-                 'brand_name': 'Kia', 'model_name': 'Rio',
-                 'start_datetime': '2023-05-11 09:30:00', 'planned_end_datetime': '2023-05-13 17:00:00', 'total_cost': 7500}
-            ]
+        return self._fetchall(query, (year,))
 
     # 4. Примеры аналитических запросов
+    @cached('Rentals')
     def get_monthly_stats(self, year: int) -> List[Dict]:
         """Статистика по месяцам за указанный год"""
         query = """
@@ -203,37 +556,37 @@ class CarRentalQueries:
         GROUP BY MONTH(start_datetime)
         ORDER BY month
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, (year,))
-            return cursor.fetchall()
+        return self._fetchall(query, (year,))
     
     # Простые CRUD-запросы
     # Добавление нового клиента
-    def add_client(first_name, last_name, phone, driver_license):
+    def add_client(self, first_name, last_name, phone, driver_license):
         query = """
         INSERT INTO Clients (first_name, last_name, phone, driver_license, rating)
         VALUES (%s, %s, %s, %s, 5.0)
         """
         params = (first_name, last_name, phone, driver_license)
-        
+        client_id, _ = self._execute(query, params, ('Clients',))
+        return client_id
 
     # Обновление информации об автомобиле
-    def update_car_price(car_id, new_price):
+    def update_car_price(self, car_id, new_price):
         query = "UPDATE Cars SET daily_price = %s WHERE car_id = %s"
         params = (new_price, car_id)
-        
+        return self._execute(query, params, ('Cars',))[1] > 0
 
     # Удаление автомобиля
-    def delete_car(car_id):
+    def delete_car(self, car_id):
         query = "DELETE FROM Cars WHERE car_id = %s"
         params = (car_id,)
+        return self._execute(query, params, ('Cars',))[1] > 0
 
 
 
     # 2. Вычисляемые запросы с агрегацией
     # Средняя стоимость аренды по классам автомобилей
-    def avg_price_by_class():
+    @cached('Cars', 'Models')
+    def avg_price_by_class(self):
         query = """
         SELECT 
             m.car_class,
@@ -244,10 +597,11 @@ class CarRentalQueries:
         GROUP BY m.car_class
         ORDER BY avg_price DESC
         """
-        # выполнение запроса...
+        return self._fetchall(query)
 
     # Статистика по клиентам
-    def client_stats():
+    @cached('Clients')
+    def client_stats(self):
         query = """
         SELECT 
             COUNT(*) AS total_clients,
@@ -256,7 +610,7 @@ class CarRentalQueries:
             MIN(rating) AS min_rating
         FROM Clients
         """
-        # выполнение запроса...
+        return self._fetchone(query)
 
 
 
@@ -264,7 +618,7 @@ class CarRentalQueries:
 
     # 3. Параметризованные запросы
     # Поиск автомобилей по параметрам
-    def search_cars(brand=None, min_price=None, max_price=None, color=None):
+    def search_cars(self, brand=None, min_price=None, max_price=None, color=None):
         query = """
         SELECT 
             c.car_id, b.brand_name, m.model_name, c.color, c.daily_price
@@ -289,10 +643,10 @@ class CarRentalQueries:
             params.append(color)
         
         query += " ORDER BY c.daily_price"
-        # выполнение запроса с params...
+        return self._fetchall(query, tuple(params))
 
     # Аренды за период
-    def rentals_in_period(start_date, end_date):
+    def rentals_in_period(self, start_date, end_date):
         query = """
         SELECT 
             r.rental_id, c.first_name, c.last_name,
@@ -306,13 +660,13 @@ class CarRentalQueries:
         ORDER BY r.start_datetime
         """
         params = (start_date, end_date)
-        # выполнение запроса...
+        return self._fetchall(query, params)
 
 
 
     # 4. Сложные аналитические запросы
     # Отчет о загрузке автопарка
-    def fleet_utilization_report():
+    def fleet_utilization_report(self):
         query = """
         SELECT 
             c.car_id,
@@ -320,8 +674,8 @@ class CarRentalQueries:
             m.model_name,
             COUNT(r.rental_id) AS rental_count,
             SUM(DATEDIFF(IFNULL(r.actual_end_datetime, CURDATE()), r.start_datetime)) AS total_rental_days,
-            ROUND(SUM(DATEDIFF(IFNULL(r.actual_end_datetime, CURDATE()), r.start_datetime)) / 
-                DATEDIFF(MAX(r.actual_end_datetime), MIN(r.start_datetime)) * 100, 2) AS utilization_percentage
+            ROUND(100.0 * SUM(DATEDIFF(IFNULL(r.actual_end_datetime, CURDATE()), r.start_datetime)) / 
+                NULLIF(DATEDIFF(MAX(r.actual_end_datetime), MIN(r.start_datetime)), 0), 2) AS utilization_percentage
         FROM Cars c
         LEFT JOIN Rentals r ON c.car_id = r.car_id
         JOIN Models m ON c.model_id = m.model_id
@@ -329,17 +683,17 @@ class CarRentalQueries:
         GROUP BY c.car_id, b.brand_name, m.model_name
         ORDER BY utilization_percentage DESC
         """
-        # выполнение запроса...
+        return self._fetchall(query)
 
     # Прогноз доходов на следующий месяц
-    def next_month_revenue_forecast():
+    def next_month_revenue_forecast(self):
         query = """
         SELECT 
             b.brand_name,
             m.model_name,
             c.daily_price,
             COUNT(r.rental_id) AS historical_rentals,
-            c.daily_price * COUNT(r.rental_id) * 0.8 AS forecast_revenue  # 0.8 - коэффициент сезонности
+            c.daily_price * COUNT(r.rental_id) * 0.8 AS forecast_revenue  -- 0.8 - коэффициент сезонности
         FROM Cars c
         JOIN Models m ON c.model_id = m.model_id
         JOIN Brands b ON m.brand_id = b.brand_id
@@ -349,12 +703,12 @@ class CarRentalQueries:
         GROUP BY b.brand_name, m.model_name, c.daily_price
         ORDER BY forecast_revenue DESC
         """
-        # выполнение запроса...
+        return self._fetchall(query)
 
 
     # 5. Операционные запросы
     # Автомобили, требующие техобслуживания
-    def cars_due_for_maintenance(mileage_threshold=50000):
+    def cars_due_for_maintenance(self, mileage_threshold=50000):
         query = """
         SELECT 
             c.car_id,
@@ -372,10 +726,10 @@ class CarRentalQueries:
         ORDER BY c.mileage DESC
         """
         params = (mileage_threshold,)
-        # выполнение запроса...
+        return self._fetchall(query, params)
 
     # Клиенты с истекающими арендами
-    def expiring_rentals(days_threshold=1):
+    def expiring_rentals(self, days_threshold=1):
         query = """
         SELECT 
             r.rental_id,
@@ -395,19 +749,19 @@ class CarRentalQueries:
         ORDER BY days_remaining
         """
         params = (days_threshold,)
-        # выполнение запроса...
+        return self._fetchall(query, params)
 
 
 
     # 6. Отчеты для руководства
     # Финансовый отчет по месяцам
-    def financial_report_by_month(year):
+    def financial_report_by_month(self, year):
         query = """
         SELECT 
             MONTH(r.start_datetime) AS month,
             COUNT(r.rental_id) AS rentals_count,
             SUM(r.total_cost) AS total_revenue,
-            SUM(r.total_cost) - SUM(c.daily_price * DATEDIFF(r.actual_end_datetime, r.start_datetime) * 0.3 AS profit,  # 30% операционных расходов
+            SUM(r.total_cost) - SUM(c.daily_price * DATEDIFF(r.actual_end_datetime, r.start_datetime) * 0.3) AS profit,  -- 30% операционных расходов
             GROUP_CONCAT(DISTINCT b.brand_name) AS brands
         FROM Rentals r
         JOIN Cars c ON r.car_id = c.car_id
@@ -419,10 +773,11 @@ class CarRentalQueries:
         ORDER BY month
         """
         params = (year,)
-        # выполнение запроса...
+        return self._fetchall(query, params)
 
     # Анализ клиентской базы
-    def client_analysis():
+    @cached('Clients', 'Rentals')
+    def client_analysis(self):
         query = """
         SELECT 
             CASE 
@@ -440,12 +795,12 @@ class CarRentalQueries:
         GROUP BY age_group
         ORDER BY age_group
         """
-    #
+        return self._fetchall(query)
 
 
     # 7. Оптимизационные запросы
     # Определение оптимального количества автомобилей каждой модели
-    def optimal_fleet_composition():
+    def optimal_fleet_composition(self):
         query = """
         WITH demand AS (
             SELECT 
@@ -466,14 +821,14 @@ class CarRentalQueries:
             model_name,
             rental_count,
             total_days,
-            CEIL(total_days / 180) AS recommended_count  # 180 дней в 6 месяцах
+            CEIL(total_days / 180.0) AS recommended_count  -- 180 дней в 6 месяцах; 180.0 - дробное деление и в SQLite
         FROM demand
         ORDER BY rental_count DESC
         """
-        # выполнение запроса...
+        return self._fetchall(query)
 
     # Выявление невостребованных автомобилей
-    def underutilized_cars(threshold_days=30):
+    def underutilized_cars(self, threshold_days=30):
         query = """
         SELECT 
             c.car_id,
@@ -491,13 +846,13 @@ class CarRentalQueries:
         ORDER BY days_idle DESC
         """
         params = (threshold_days,)
-        # выполнение запроса...
+        return self._fetchall(query, params)
 
 
 
     # 8. Запросы для интеграции с другими системами
     # Экспорт данных для бухгалтерии
-    def accounting_export(year, month):
+    def accounting_export(self, year, month, chunk_size: int = EXPORT_CHUNK) -> Iterator[Dict]:
         query = """
         SELECT 
             r.rental_id,
@@ -521,10 +876,10 @@ class CarRentalQueries:
         ORDER BY r.start_datetime
         """
         params = (year, month)
-        # выполнение запроса...
+        return self._stream(query, params, chunk_size)
 
     # Данные для CRM-системы
-    def crm_export():
+    def crm_export(self, chunk_size: int = EXPORT_CHUNK) -> Iterator[Dict]:
         query = """
         SELECT 
             c.client_id,
@@ -541,18 +896,87 @@ class CarRentalQueries:
         GROUP BY c.client_id, c.first_name, c.last_name, c.phone, c.email, c.rating
         ORDER BY total_spent DESC
         """
-        # выполнение запроса...
-def test_queries():
-    # Конфигурация подключения 
-    db_config = {
-        'host': '172.20.10.5',
-        'user': 'ccccxxip',
-        'password': '1234',
-        'database': 'car_rental',
-        'auth_plugin': 'mysql_native_password'
-    }
+        return self._stream(query, chunk_size=chunk_size)
+
+    def export_accounting(self, path, year, month, **options) -> int:
+        """Выгрузка для бухгалтерии в файл (см. write_export); возвращает число строк"""
+        return write_export(self.accounting_export(year, month), path, **options)
+
+    def export_crm(self, path, **options) -> int:
+        """Выгрузка для CRM в файл (см. write_export); возвращает число строк"""
+        return write_export(self.crm_export(), path, **options)
+
+
+# ========== Выгрузка в файлы ==========
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def write_export(rows: Iterable[Dict], path, fmt: Optional[str] = None, compress: Optional[bool] = None,
+                 progress: Optional[Callable[[int], None]] = None, progress_every: int = EXPORT_CHUNK) -> int:
+    """Записывает строки в CSV или JSON Lines по одной, не собирая их в памяти.
+
+    fmt ('csv'/'jsonl') и сжатие gzip по умолчанию определяются по имени файла
+    (выгрузка.csv.gz). progress(строк записано) вызывается каждые progress_every
+    строк и в конце. Файл появляется под своим именем только после полной записи.
+    Возвращает число строк.
+    """
+    path = Path(path)
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if compress is None:
+        compress = suffixes[-1:] == ['.gz']
+    if fmt is None:
+        fmt = next((suffix[1:] for suffix in reversed(suffixes) if suffix in ('.csv', '.jsonl')), 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    tmp = path.with_name(path.name + '.part')
+    opener = gzip.open if compress else open
+    count = 0
+    try:
+        with opener(tmp, 'wt', encoding='utf-8', newline='') as file:
+            writer = None
+            for row in rows:
+                if fmt == 'jsonl':
+                    file.write(json.dumps(row, ensure_ascii=False, default=_json_value))
+                    file.write('\n')
+                else:
+                    if writer is None:
+                        writer = csv.DictWriter(file, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+                count += 1
+                if progress is not None and count % progress_every == 0:
+                    progress(count)
+        tmp.replace(path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        close = getattr(rows, 'close', None)
+        if close is not None:
+            close()  # Генератор CarRentalQueries возвращает соединение в пул
+    if progress is not None and (count == 0 or count % progress_every):
+        progress(count)
+    return count
+
+
+def test_queries(queries: Optional[CarRentalQueries] = None):
+    if queries is None:
+        # Конфигурация подключения
+        db_config = {
+            'host': '172.20.10.5',
+            'user': 'ccccxxip',
+            'password': '1234',
+            'database': 'car_rental',
+            'auth_plugin': 'mysql_native_password'
+        }
     
-    queries = CarRentalQueries(db_config)
+        queries = CarRentalQueries(db_config)
     
     print("="*50)
     print("ТЕСТИРОВАНИЕ SQL-ЗАПРОСОВ ДЛЯ СИСТЕМЫ ПРОКАТА АВТОМОБИЛЕЙ")
@@ -560,7 +984,7 @@ def test_queries():
     
     # 1. Тестирование запроса доступных автомобилей
     print("\n1. Доступные автомобили (первые 3):")
-    cars = queries.get_available_cars()
+    cars = queries.get_available_cars(3)
     for car in cars:
         print(f"{car['brand_name']} {car['model_name']} - {car['color']}, {car['daily_price']} руб/день (гос.номер: {car['registration_number']})")
     
@@ -579,7 +1003,7 @@ def test_queries():
     
     # 4. Тестирование запроса активных аренд
     print("\n4. Активные аренды (первые 3):")
-    active_rentals = queries.get_active_rentals()
+    active_rentals = queries.get_active_rentals(3)
     for rental in active_rentals:
         print(f"{rental['first_name']} {rental['last_name']} арендует {rental['brand_name']} {rental['model_name']}")
         print(f"   Период: с {rental['start_datetime']} по {rental['planned_end_datetime']}")
@@ -591,4 +1015,6 @@ def test_queries():
 
 
 if __name__ == "__main__":
-    test_queries()
\ No newline at end of file
+    import sys
+    # python sql.py [путь к базе SQLite] - проверка на локальной базе вместо сервера MySQL
+    test_queries(CarRentalQueries(backend=SQLiteBackend(sys.argv[1])) if len(sys.argv) > 1 else None)
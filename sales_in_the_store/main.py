@@ -1,7 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
+import sys
 from datetime import datetime
+from pathlib import Path
+
+# Профили PRAGMA и замеры запросов общие с системой автопроката. Пакет
+# подключается от корня репозитория как car_rental_system.database, а не как
+# database: имя модуля магазина не перекрывается
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from car_rental_system.database.instrumentation import connection_factory
+from car_rental_system.database.profiles import apply_profile
 
 class StoreApp:
     def __init__(self, root):
@@ -10,7 +20,9 @@ class StoreApp:
         self.root.geometry("1000x700")
         
         # Подключение к БД
-        self.conn = sqlite3.connect('store.db')
+        # Замеры запросов включаются через CAR_RENTAL_DB_TRACE (database/instrumentation.py)
+        self.conn = sqlite3.connect('store.db', factory=connection_factory())
+        apply_profile(self.conn)
         self.create_tables()
         self.add_sample_data()
         